@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import subprocess
+import sys
+
+from mfba.benchmark import (
+    SCENARIOS,
+    format_report,
+    load_report,
+    new_report,
+    run_isolated,
+    run_scenario,
+    save_report,
+)
+from mfba.common import (
+    log,
+)
+
+
+# the options, which replace the settings of the scenarios
+OVERRIDES = (
+    ('nodes', 'nodes'),
+    ('trs', 'threshold'),
+    ('messages', 'messages'),
+    ('payload', 'payload_size'),
+    ('rate', 'rate'),
+    ('arrival', 'arrival'),
+    ('burst', 'burst'),
+    ('proposers', 'proposers'),
+    ('transport', 'transport'),
+    ('codec', 'codec'),
+    ('timeout', 'timeout'),
+    ('window', 'window'),
+    ('batch', 'max_batch_size'),
+)
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            'git rev-parse --short HEAD'.split(),
+            stderr=subprocess.DEVNULL,
+        ).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('scenarios', nargs='*', help='names of the scenarios; default all')
+parser.add_argument('-list', action='store_true', help='print the scenarios and exit')
+parser.add_argument('-repeat', type=int, default=1, help='number of the runs of every scenario, the summary is the median; default 1')
+parser.add_argument('-o', dest='output', default=None, help='write the report as JSON to the file')
+parser.add_argument('-compare', default=None, help='JSON report of the previous run to compare with')
+parser.add_argument('-inline', action='store_true', help='run the scenarios in this process, the peak memory is shared by the runs')
+parser.add_argument('-nodes', type=int, default=None, help='number of validator nodes')
+parser.add_argument('-trs', type=int, default=None, help='threshold; 0 < trs <= 100')
+parser.add_argument('-messages', type=int, default=None, help='number of messages to send')
+parser.add_argument('-payload', type=int, default=None, help='bytes of the message data')
+parser.add_argument('-rate', type=float, default=None, help='messages sent in a second; by default all at once')
+parser.add_argument('-arrival', choices=('constant', 'poisson', 'bursty'), default=None, help='schedule of the messages of `-rate`')
+parser.add_argument('-burst', type=int, default=None, help='number of the messages sent at once by `-arrival bursty`')
+parser.add_argument('-proposers', type=int, default=None, help='number of the nodes, which get the messages in turn')
+parser.add_argument('-transport', choices=('local', 'tcp', 'memory', 'shm'), default=None, help='transport between the nodes')
+parser.add_argument('-codec', choices=('json', 'binary', 'object'), default=None, help='wire format of the messages')
+parser.add_argument('-timeout', type=float, default=None, help='seconds to wait for the messages to be committed')
+parser.add_argument('-window', type=int, default=None, help='number of slots in consensus at the same time')
+parser.add_argument('-batch', type=int, default=None, help='maximum number of messages in a ballot')
+
+
+if __name__ == '__main__':
+    log.set_level(logging.ERROR)
+
+    options = parser.parse_args()
+
+    if options.list:
+        for scenario in SCENARIOS.values():
+            print('%s: %s' % (scenario.name, scenario.to_dict()))
+
+        sys.exit(0)
+
+    names = options.scenarios if len(options.scenarios) > 0 else list(SCENARIOS.keys())
+    unknown = list(filter(lambda x: x not in SCENARIOS, names))
+    if len(unknown) > 0:
+        parser.error('unknown scenarios: %s' % ', '.join(unknown))
+
+    overrides = dict()
+    for option, name in OVERRIDES:
+        value = getattr(options, option)
+        if value is not None:
+            overrides[name] = value
+
+    base = load_report(options.compare) if options.compare is not None else None
+
+    run = run_scenario if options.inline else run_isolated
+    results = list()
+    for name in names:
+        scenario = SCENARIOS[name].replace(**overrides)
+
+        runs = list()
+        for i in range(options.repeat):
+            print('run %s, %d/%d' % (name, i + 1, options.repeat), file=sys.stderr)
+            runs.append(run(scenario))
+
+        results.append((scenario, runs))
+
+    report = new_report(results, commit=get_commit())
+    if options.output is not None:
+        save_report(report, options.output)
+
+    print(format_report(report, base=base))
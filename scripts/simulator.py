@@ -1,24 +1,48 @@
 #!/usr/bin/env python3
 
-import json  # noqa
+import json
 import time  # noqa
 import argparse
 import asyncio
+import concurrent.futures
 import signal
 import collections
 import logging
 import sys
 
-from mfba.network import (    
+from mfba.network import (
+    LocalTransport,
+    MemoryTransport,
     Message,
     Node,
+    ShmTransport,
+    TcpTransport,
+    get_codec,
 )
 from mfba.common import (
     log,
+    Metrics,
+)
+from mfba.benchmark import (
+    LoadGenerator,
+    get_arrival,
 )
 from mfba.blockchain import (
     Blockchain,
 )
+from mfba.simulation import (
+    ShardedSimulation,
+    Simulation,
+    get_latency,
+)
+
+
+TRANSPORTS = dict(
+    local=(LocalTransport, 'sock://memory:%d'),
+    tcp=(TcpTransport, 'tcp://127.0.0.1:%d'),
+    memory=(MemoryTransport, 'mem://memory:%d'),
+    shm=(ShmTransport, 'shm://memory:%d'),
+)
 
 
 NodeConfig = collections.namedtuple(
@@ -31,9 +55,9 @@ NodeConfig = collections.namedtuple(
 )
 
 
-def cancel_task_handler():    
-    for task in asyncio.Task.all_tasks():
-        task.cancel()    
+def cancel_task_handler():
+    for task in asyncio.all_tasks():
+        task.cancel()
     sys.exit(1)
 
 def check_threshold(v):
@@ -50,6 +74,39 @@ parser = argparse.ArgumentParser()
 parser.add_argument('-s', dest='silent', action='store_true', help='turn off the debug messages')
 parser.add_argument('-nodes', type=int, default=4, help='number of validator nodes in the same quorum; default 4')
 parser.add_argument('-trs', type=check_threshold, default=80, help='threshold; 0 < trs <= 100')
+parser.add_argument('-window', type=int, default=4, help='number of slots in consensus at the same time; default 4')
+parser.add_argument('-messages', type=int, default=1, help='number of messages to send; default 1')
+parser.add_argument('-transport', choices=tuple(TRANSPORTS.keys()), default='local', help='transport between the nodes, `shm` is the shared memory rings, which also connects the processes of `-shards`; default local')
+parser.add_argument('-port', type=int, default=5000, help='port of the first node; default 5000')
+parser.add_argument('-codec', choices=('json', 'binary', 'object'), default='json', help='wire format of the messages, `object` works only with the memory transport or `-virtual`; default json')
+parser.add_argument('-coalesce-delay', dest='coalesce_delay', type=int, default=0, help='microseconds to collect the frames to the same node before write, `-1` to write every frame at once; default 0, until the end of the loop iteration')
+parser.add_argument('-batch', type=int, default=1, help='maximum number of messages in a ballot; default 1')
+parser.add_argument('-batch-bytes', dest='batch_bytes', type=int, default=None, help='maximum bytes of messages in a ballot')
+parser.add_argument('-batch-delay', dest='batch_delay', type=float, default=None, help='milliseconds to wait for the batch to be full')
+parser.add_argument('-aggregate', action='store_true', help='send the votes to the aggregator of the slot, which broadcasts the certificate')
+parser.add_argument('-state-timeout', dest='state_timeout', type=int, default=1000, help='milliseconds to wait for the next state before the vote is sent again, `0` to turn off; default 1000')
+parser.add_argument('-max-state-timeout', dest='max_state_timeout', type=int, default=16000, help='maximum milliseconds of the doubled wait; default 16000')
+parser.add_argument('-max-retries', dest='max_retries', type=int, default=3, help='number of the resends in a state before the next round; default 3')
+parser.add_argument('-validate-workers', dest='validate_workers', type=int, default=0, help='number of the workers to validate the messages, `0` to validate in the loop; default 0')
+parser.add_argument('-validate-pool', dest='validate_pool', choices=('thread', 'process'), default='thread', help='pool of the validation workers; default thread')
+parser.add_argument('-metrics', action='store_true', help='print the metrics of the nodes and the sum of them at exit')
+parser.add_argument('-virtual', action='store_true', help='run the nodes by the virtual clock until the messages are committed, without socket')
+parser.add_argument('-seed', type=int, default=0, help='seed of the latencies, the losses and the message ids of `-virtual`; default 0')
+parser.add_argument('-latency', type=float, default=50, help='usual milliseconds of a frame between the nodes of `-virtual`; default 50')
+parser.add_argument('-jitter', type=float, default=20, help='spread of the milliseconds of `-latency`; default 20')
+parser.add_argument('-latency-model', dest='latency_model', choices=('fixed', 'uniform', 'lognormal'), default='lognormal', help='distribution of the latency of `-virtual`; default lognormal')
+parser.add_argument('-loss', type=float, default=0, help='percent of the frames lost between the nodes of `-virtual`; default 0')
+parser.add_argument('-rate', type=float, default=None, help='messages sent in a second; by default all at once')
+parser.add_argument('-arrival', choices=('constant', 'poisson', 'bursty'), default='constant', help='schedule of the messages of `-rate`; default constant')
+parser.add_argument('-burst', type=int, default=10, help='number of the messages sent at once by `-arrival bursty`; default 10')
+parser.add_argument('-proposers', type=int, default=1, help='number of the nodes, which get the messages in turn; default 1')
+parser.add_argument('-payload', type=int, default=32, help='bytes of the message data; default 32')
+parser.add_argument('-until', choices=('all', 'quorum'), default='all', help='the message is done, when it is committed by all the nodes or the minimum quorum; default all')
+parser.add_argument('-duration', type=float, default=None, help='maximum seconds of the virtual clock of `-virtual`, or of the run of `-shards`')
+parser.add_argument('-shards', type=int, default=0, help='number of the processes to run the nodes, connected by the socket pairs, until the messages are committed; default 0, all the nodes in this process')
+parser.add_argument('-log-dir', dest='log_dir', default=None, help='directory of the append-only logs of the committed ballots, a directory for each node; by default the committed ballots are kept in the memory')
+parser.add_argument('-log-sync', dest='log_sync', type=int, default=10, help='milliseconds to collect the committed ballots of `-log-dir` before they are fsync\'ed at once; default 10')
+parser.add_argument('-snapshot-interval', dest='snapshot_interval', type=int, default=1000, help='milliseconds between the snapshots of the ballots in consensus and the pending messages of `-log-dir`, the node restarts from the latest snapshot; default 1000')
 
 
 if __name__ == '__main__':
@@ -60,8 +117,106 @@ if __name__ == '__main__':
     log.set_level(log_level)
 
     options = parser.parse_args()
+    if options.codec == 'object' and options.transport != 'memory' and not options.virtual:
+        parser.error('`-codec object` works only with `-transport memory` or `-virtual`')
+
+    if options.virtual and options.validate_workers > 0:
+        parser.error('`-virtual` does not work with `-validate-workers`')
+
+    if options.proposers < 1 or options.proposers > options.nodes:
+        parser.error('`-proposers` must be between 1 and `-nodes`')
+
+    if options.shards > 0:
+        if options.virtual or options.validate_workers > 0:
+            parser.error('`-shards` does not work with `-virtual` or `-validate-workers`')
+
+        if options.codec == 'object':
+            parser.error('`-shards` does not work with `-codec object`')
+
+        if options.shards > options.nodes:
+            parser.error('`-shards` must not be more than `-nodes`')
+
     log.main.debug('options: %s', options)
 
+    consensus_options = dict(
+        window=options.window,
+        max_batch_size=options.batch,
+        max_batch_bytes=options.batch_bytes,
+        max_batch_delay=options.batch_delay / 1000 if options.batch_delay is not None else None,
+        aggregate=options.aggregate,
+        state_timeout=options.state_timeout / 1000 if options.state_timeout > 0 else None,
+        max_state_timeout=options.max_state_timeout / 1000,
+        max_retries=options.max_retries,
+        log_directory=options.log_dir,
+        log_sync_interval=options.log_sync / 1000,
+        snapshot_interval=options.snapshot_interval / 1000,
+    )
+
+    # the discrete event simulation ends, when the messages are committed
+    if options.virtual:
+        simulation = Simulation(
+            nodes=options.nodes,
+            threshold=options.trs,
+            latency=get_latency(options.latency_model, options.latency / 1000, options.jitter / 1000),
+            loss=options.loss / 100,
+            seed=options.seed,
+            codec=options.codec,
+            **consensus_options
+        )
+        simulation.send(
+            options.messages,
+            rate=options.rate,
+            proposers=options.proposers,
+            payload_size=options.payload,
+            arrival=options.arrival,
+            burst=options.burst,
+        )
+        result = simulation.run(until=options.duration)
+        simulation.stop()
+
+        if options.metrics:
+            for blockchain in simulation.blockchains:
+                log.main.info('metrics of %s:\n%s', blockchain.node.name, blockchain.metrics.format())
+
+            log.main.info('metrics of all the nodes:\n%s', simulation.get_metrics().format())
+
+        log.main.info('simulation result: %s', json.dumps(result, indent=2, sort_keys=True))
+
+        sys.exit(0 if result['completed'] else 1)
+
+    # the nodes are partitioned over the processes, which end when the
+    # messages are committed
+    if options.shards > 0:
+        simulation = ShardedSimulation(
+            nodes=options.nodes,
+            threshold=options.trs,
+            workers=options.shards,
+            codec=options.codec,
+            transport='shm' if options.transport == 'shm' else 'socket',
+            **consensus_options
+        )
+        result = simulation.run(
+            options.messages,
+            rate=options.rate,
+            proposers=options.proposers,
+            payload_size=options.payload,
+            arrival=options.arrival,
+            burst=options.burst,
+            timeout=options.duration,
+            log_level=log_level,
+        )
+
+        if options.metrics:
+            for name, metrics in sorted(result['node_metrics'].items()):
+                log.main.info('metrics of %s:\n%s', name, metrics.format())
+
+            log.main.info('metrics of all the nodes:\n%s', result['metrics'].format())
+
+        del result['metrics'], result['node_metrics']
+        log.main.info('sharded simulation result: %s', json.dumps(result, indent=2, sort_keys=True))
+
+        sys.exit(0 if result['completed'] and result['consistent'] else 1)
+
     client0_config = NodeConfig('client0', None, None)
     client0_node = Node(client0_config.name, client0_config.endpoint, None)
     log.main.debug('client node created: %s', client0_node)
@@ -71,9 +226,10 @@ if __name__ == '__main__':
 
     nodes_config = dict()
     validators_config = dict()
+    transport_class, endpoint_format = TRANSPORTS[options.transport]
     for i in range(options.nodes):
         name = 'n%d' % i
-        endpoint = 'sock://memory:%d' % i
+        endpoint = endpoint_format % (options.port + i)
         nodes_config[name] = NodeConfig(name, endpoint, options.trs)
 
     for name, config in nodes_config.items():
@@ -88,19 +244,72 @@ if __name__ == '__main__':
     loop = asyncio.get_event_loop()
     # add handler when receive stop signal
     loop.add_signal_handler(signal.SIGINT, cancel_task_handler)
+    loop.add_signal_handler(signal.SIGTERM, cancel_task_handler)
+
+    # the validation workers are shared by the nodes
+    executor = None
+    if options.validate_workers > 0:
+        if options.validate_pool == 'process':
+            executor = concurrent.futures.ProcessPoolExecutor(options.validate_workers)
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(options.validate_workers)
 
     # these blockchains can be add and remove as well as nodes inside quorum
     for name, node_config in nodes_config.items():        
-        blockchains[name] = Blockchain(node_config, validators_config[name], loop)        
+        blockchains[name] = Blockchain(
+            node_config,
+            validators_config[name],
+            loop,
+            codec=get_codec(options.codec),
+            transport_class=transport_class,
+            transport_options=dict(
+                coalesce=options.coalesce_delay >= 0,
+                coalesce_delay=max(options.coalesce_delay, 0) / 1000000,
+            ),
+            executor=executor,
+            **consensus_options
+        )
         blockchains[name].start()
         
-    # send message to `server0`    
-    blockchains['n0'].send(client0_node)    
+    # the messages are sent to the proposers from `n0` by the open loop; the
+    # result is printed, when the messages are committed
+    def load_completed(load):
+        log.main.info('load result: %s', json.dumps(load.to_dict(), indent=2, sort_keys=True))
+
+        return
+
+    load = LoadGenerator(
+        loop,
+        blockchains.values(),
+        arrival=get_arrival(options.arrival, options.rate, options.burst) if options.rate is not None else None,
+        entries=options.proposers,
+        payload_size=options.payload,
+        until=options.until,
+        on_complete=load_completed,
+    )
+    load.start(messages=options.messages)
 
     try:
         loop.run_forever()        
     except (KeyboardInterrupt, SystemExit, asyncio.CancelledError):
         log.main.debug('Tasks has been canceled')
     finally:
+        if options.metrics:
+            for name, blockchain in blockchains.items():
+                log.main.info('metrics of %s:\n%s', name, blockchain.metrics.format())
+
+            metrics = Metrics.aggregate(map(lambda x: x.metrics, blockchains.values()), name='all')
+            log.main.info('metrics of all the nodes:\n%s', metrics.format())
+
+        load.stop()
+
+        # the shared memory rings and the pipes of `-transport shm` are
+        # removed by the transports
+        for blockchain in blockchains.values():
+            blockchain.stop()
+
+        if executor is not None:
+            executor.shutdown(wait=False)
+
         loop.close()
         log.main.info('goodbye~')
\ No newline at end of file
@@ -0,0 +1,4 @@
+from .load import Arrival, BurstyArrival, ConstantArrival, LoadGenerator, PoissonArrival, get_arrival
+from .report import format_report, load_report, new_report, save_report, summarize
+from .runner import run_isolated, run_scenario
+from .scenario import SCENARIOS, Scenario
@@ -0,0 +1,366 @@
+import random
+
+from ..common import (
+    log,
+    Metrics,
+)
+from ..network import (
+    Node,
+)
+
+
+# number of the messages sent at once by `BurstyArrival`
+DEFAULT_BURST = 10
+
+
+class Arrival:
+    '''
+    the intervals between the messages of the open loop in seconds, `rate`
+    messages in a second on average; the random intervals are taken from
+    `rng`
+    '''
+    rate = None
+
+    def get(self, rng):
+        raise NotImplementedError()
+
+    def to_dict(self):
+        raise NotImplementedError()
+
+
+class ConstantArrival(Arrival):
+    def __init__(self, rate):
+        assert rate > 0
+
+        self.rate = rate
+
+    def __repr__(self):
+        return '<ConstantArrival: rate=%(rate)f>' % self.__dict__
+
+    def get(self, rng):
+        return 1 / self.rate
+
+    def to_dict(self):
+        return dict(model='constant', rate=self.rate)
+
+
+class PoissonArrival(Arrival):
+    '''
+    the messages of the many independent clients; the intervals are
+    exponential
+    '''
+    def __init__(self, rate):
+        assert rate > 0
+
+        self.rate = rate
+
+    def __repr__(self):
+        return '<PoissonArrival: rate=%(rate)f>' % self.__dict__
+
+    def get(self, rng):
+        return rng.expovariate(self.rate)
+
+    def to_dict(self):
+        return dict(model='poisson', rate=self.rate)
+
+
+class BurstyArrival(Arrival):
+    '''
+    `burst` messages are sent at once, and the bursts are apart to keep the
+    rate on average
+    '''
+    burst = None
+    sent = None
+
+    def __init__(self, rate, burst=DEFAULT_BURST):
+        assert rate > 0
+        assert type(burst) is int and burst > 0
+
+        self.rate = rate
+        self.burst = burst
+        self.sent = 0
+
+    def __repr__(self):
+        return '<BurstyArrival: rate=%(rate)f burst=%(burst)d>' % self.__dict__
+
+    def get(self, rng):
+        self.sent += 1
+        if self.sent % self.burst != 0:
+            return 0
+
+        return self.burst / self.rate
+
+    def to_dict(self):
+        return dict(model='bursty', rate=self.rate, burst=self.burst)
+
+
+ARRIVALS = dict(
+    constant=ConstantArrival,
+    poisson=PoissonArrival,
+    bursty=BurstyArrival,
+)
+
+
+def get_arrival(name, rate, burst=DEFAULT_BURST):
+    if name == 'bursty':
+        return BurstyArrival(rate, burst)
+
+    if name in ARRIVALS:
+        return ARRIVALS[name](rate)
+
+    raise ValueError('unknown arrival: %s' % name)
+
+
+class LoadGenerator:
+    '''
+    the open loop load: the messages are sent on the schedule of `arrival`,
+    whether the previous messages were committed or not, to the first
+    `entries` nodes in turn or at random. `arrival` of `None` sends all the
+    messages at once. The size of the data is `payload_size`, or random
+    between the pair of the sizes.
+
+    every message is tracked until it is committed by all the nodes,
+    `until='all'`, or by the minimum quorum, `until='quorum'`. The latency is
+    measured from the time, when the message was due by the schedule, not
+    when it was actually sent; the messages delayed by the busy loop count
+    the delay, so the latency is corrected for the coordinated omission.
+    '''
+    class AlreadyStartedError(Exception):
+        pass
+
+    UNTIL = ('all', 'quorum')
+    ENTRY = ('round-robin', 'random')
+
+    loop = None
+    blockchains = None
+    entries = None
+    arrival = None
+    entry = None
+    payload_size = None
+    until = None
+    target = None
+    rng = None
+    client = None
+    on_complete = None
+    metrics = None
+
+    # the due time, the sent time and the number of the nodes, which
+    # committed it, of the message by `message_id`
+    tracked = None
+
+    messages = None
+    duration = None
+    started_at = None
+    due_at = None
+    last_sent_at = None
+    completed_at = None
+    handle = None
+
+    def __init__(
+        self,
+        loop,
+        blockchains,
+        arrival=None,
+        entries=1,
+        entry='round-robin',
+        payload_size=32,
+        until='all',
+        seed=None,
+        on_complete=None,
+    ):
+        assert arrival is None or isinstance(arrival, Arrival)
+        assert type(entries) is int and 0 < entries <= len(blockchains)
+        assert entry in self.ENTRY
+        assert type(payload_size) is int and payload_size > 0 or type(payload_size) is tuple and len(payload_size) == 2
+        assert until in self.UNTIL
+
+        self.loop = loop
+        self.blockchains = list(blockchains)
+        self.entries = self.blockchains[:entries]
+        self.arrival = arrival
+        self.entry = entry
+        self.payload_size = payload_size
+        self.until = until
+        self.on_complete = on_complete
+
+        # the same seed gives the same schedule, the same entry nodes and the
+        # same message ids
+        self.rng = random.Random(seed)
+        self.client = Node('client0', None, None)
+
+        if until == 'all':
+            self.target = len(self.blockchains)
+        else:
+            self.target = self.entries[0].consensus.quorum.minimum_quorum
+
+        self.metrics = Metrics('load', clock=loop.time)
+        self.sent = self.metrics.counter('load.sent')
+        self.committed = self.metrics.counter('load.committed')
+        self.in_flight = self.metrics.gauge('load.in_flight')
+        self.latency = self.metrics.histogram('load.latency')
+        self.uncorrected_latency = self.metrics.histogram('load.latency_uncorrected')
+        self.send_lag = self.metrics.histogram('load.send_lag')
+
+        self.tracked = dict()
+
+        for blockchain in self.blockchains:
+            blockchain.consensus.register_commit_callback(self.observe_commit)
+
+    def __repr__(self):
+        return '<LoadGenerator: arrival=%s entries=%d until=%s sent=%d committed=%d>' % (
+            self.arrival,
+            len(self.entries),
+            self.until,
+            self.sent.value,
+            self.committed.value,
+        )
+
+    def start(self, messages=None, duration=None):
+        '''
+        send `messages` messages, or for `duration` seconds from now
+        '''
+        assert messages is not None or duration is not None
+        assert messages is None or type(messages) is int and messages > 0
+        assert duration is None or duration > 0 and self.arrival is not None
+
+        if self.started_at is not None:
+            raise self.AlreadyStartedError()
+
+        self.messages = messages
+        self.duration = duration
+        self.started_at = self.due_at = self.loop.time()
+
+        self.inject()
+
+        return
+
+    def stop(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+        for blockchain in self.blockchains:
+            blockchain.consensus.unregister_commit_callback(self.observe_commit)
+
+        return
+
+    @property
+    def is_sending(self):
+        if self.started_at is None:
+            return False
+
+        if self.messages is not None and self.sent.value >= self.messages:
+            return False
+
+        if self.duration is not None and self.due_at > self.started_at + self.duration:
+            return False
+
+        return True
+
+    @property
+    def is_completed(self):
+        return self.completed_at is not None
+
+    def inject(self):
+        '''
+        send the messages due by now; the loop may be late, then the overdue
+        messages are sent at once, so the offered load does not drop
+        '''
+        self.handle = None
+
+        now = self.loop.time()
+        while self.is_sending and self.due_at <= now:
+            self.send(self.due_at, now)
+
+            if self.arrival is not None:
+                self.due_at += self.arrival.get(self.rng)
+
+        if self.is_sending:
+            self.handle = self.loop.call_at(self.due_at, self.inject)
+
+        return
+
+    def get_payload(self, index):
+        if type(self.payload_size) is int:
+            size = self.payload_size
+        else:
+            size = self.rng.randint(*self.payload_size)
+
+        return ('%d:' % index).ljust(size, '.')
+
+    def send(self, due_at, now):
+        index = self.sent.value
+        if self.entry == 'random':
+            blockchain = self.rng.choice(self.entries)
+        else:
+            blockchain = self.entries[index % len(self.entries)]
+
+        message = blockchain.send(
+            self.client,
+            data=self.get_payload(index),
+            message_id='%032x' % self.rng.getrandbits(128),
+        )
+
+        self.tracked[message.message_id] = [due_at, now, 0]
+        self.last_sent_at = now
+        self.sent.inc()
+        self.send_lag.observe(now - due_at)
+        self.in_flight.set(len(self.tracked))
+
+        return
+
+    def observe_commit(self, consensus, ballot):
+        now = self.loop.time()
+        for m in ballot.message.get_messages():
+            tracked = self.tracked.get(m.message_id)
+            if tracked is None:
+                continue
+
+            tracked[2] += 1
+            if tracked[2] < self.target:
+                continue
+
+            del self.tracked[m.message_id]
+            self.latency.observe(now - tracked[0])
+            self.uncorrected_latency.observe(now - tracked[1])
+            self.committed.inc()
+
+        self.in_flight.set(len(self.tracked))
+
+        if not self.is_sending and len(self.tracked) < 1 and not self.is_completed and self.started_at is not None:
+            self.completed_at = now
+            log.main.debug('load completed: %s', self)
+
+            if self.on_complete is not None:
+                self.on_complete(self)
+
+        return
+
+    def to_dict(self):
+        '''
+        the result of the load; the latencies are in seconds
+        '''
+        ended_at = self.completed_at if self.completed_at is not None else self.loop.time()
+        elapsed = ended_at - self.started_at if self.started_at is not None else 0
+        sending = self.last_sent_at - self.started_at if self.last_sent_at is not None else 0
+
+        return dict(
+            completed=self.is_completed,
+            sent=self.sent.value,
+            committed=self.committed.value,
+            in_flight=len(self.tracked),
+            elapsed=elapsed,
+            offered_rate=self.sent.value / sending if sending > 0 else None,
+            throughput=self.committed.value / elapsed if elapsed > 0 else None,
+            latency_mean=self.latency.mean,
+            latency_p50=self.latency.percentile(0.5),
+            latency_p90=self.latency.percentile(0.9),
+            latency_p99=self.latency.percentile(0.99),
+            latency_max=self.latency.max,
+            uncorrected_p50=self.uncorrected_latency.percentile(0.5),
+            uncorrected_p99=self.uncorrected_latency.percentile(0.99),
+            send_lag_max=self.send_lag.max,
+            arrival=self.arrival.to_dict() if self.arrival is not None else None,
+            entries=len(self.entries),
+            until=self.until,
+        )
@@ -0,0 +1,124 @@
+import datetime
+import json
+import platform
+import statistics
+
+
+# the values of the summary and the better direction of them, `1` is higher
+SUMMARY_KEYS = (
+    ('throughput', 1),
+    ('latency_p50', -1),
+    ('latency_p99', -1),
+    ('frames_per_commit', -1),
+    ('bytes_per_commit', -1),
+    ('cpu_time', -1),
+    ('peak_rss_kb', -1),
+)
+
+REPORT_VERSION = 1
+
+
+def summarize(runs):
+    '''
+    the median of the runs by value; `None` if a run did not complete
+    '''
+    summary = dict(runs=len(runs), completed=all(map(lambda x: x['completed'], runs)))
+    for key, _ in SUMMARY_KEYS:
+        values = list(filter(lambda x: x is not None, map(lambda x: x[key], runs)))
+        summary[key] = statistics.median(values) if len(values) > 0 else None
+
+    return summary
+
+
+def new_report(results, commit=None):
+    '''
+    the machine readable report of the scenarios; `results` is the list of
+    `(scenario, runs)`
+    '''
+    return dict(
+        version=REPORT_VERSION,
+        created=datetime.datetime.now().isoformat(),
+        commit=commit,
+        python=platform.python_version(),
+        platform=platform.platform(),
+        scenarios=list(map(
+            lambda x: dict(scenario=x[0].to_dict(), summary=summarize(x[1]), runs=x[1]),
+            results,
+        )),
+    )
+
+
+def load_report(path):
+    with open(path) as f:
+        report = json.load(f)
+
+    if report.get('version') != REPORT_VERSION:
+        raise ValueError('unknown report version: %s' % report.get('version'))
+
+    return report
+
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    return
+
+
+def format_value(key, value):
+    if value is None:
+        return '-'
+
+    if key.startswith('latency'):
+        return '%.1fms' % (value * 1000)
+
+    if key == 'cpu_time':
+        return '%.2fs' % value
+
+    if key == 'peak_rss_kb':
+        return '%dKB' % value
+
+    if type(value) is float:
+        return '%.1f' % value
+
+    return '%d' % value
+
+
+def format_report(report, base=None):
+    '''
+    the summary table of the scenarios; with `base`, the report of the
+    previous run, the change of every value is shown by the scenario name
+    '''
+    base_summaries = dict()
+    if base is not None:
+        base_summaries = dict(map(lambda x: (x['scenario']['name'], x['summary']), base['scenarios']))
+
+    header = ['scenario'] + list(map(lambda x: x[0], SUMMARY_KEYS))
+    rows = list()
+    for s in report['scenarios']:
+        name = s['scenario']['name']
+        summary = s['summary']
+        row = [name if summary['completed'] else name + ' (timeout)']
+
+        for key, direction in SUMMARY_KEYS:
+            value = format_value(key, summary[key])
+
+            previous = base_summaries.get(name, dict()).get(key)
+            if previous and summary[key] is not None:
+                change = summary[key] / previous - 1
+                mark = ''
+                if abs(change) >= 0.05:
+                    mark = '+' if change * direction > 0 else '-'
+
+                value = '%s (%+.0f%%%s)' % (value, change * 100, mark)
+
+            row.append(value)
+
+        rows.append(row)
+
+    widths = list(map(lambda x: max(map(len, x)), zip(header, *rows)))
+
+    return '\n'.join(map(
+        lambda x: '  '.join(map(lambda y: y[0].ljust(y[1]), zip(x, widths))),
+        [header] + rows,
+    ))
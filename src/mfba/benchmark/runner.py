@@ -0,0 +1,137 @@
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import resource
+import sys
+import time
+
+from ..blockchain import (
+    Blockchain,
+)
+from ..common import (
+    log,
+    Metrics,
+)
+from ..network import (
+    get_codec,
+)
+
+from .load import LoadGenerator
+from .scenario import TRANSPORTS, Scenario
+
+
+def get_peak_rss():
+    '''
+    the peak resident set size of the process in kilobytes
+    '''
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # macOS reports it in bytes
+    if sys.platform == 'darwin':
+        rss //= 1024
+
+    return rss
+
+
+def run_scenario(scenario, log_level=logging.ERROR):
+    '''
+    run the scenario in a new loop until every node committed all the
+    messages or `timeout`; the result has the throughput, the latency until
+    every node committed the message, from the time it was due by the
+    schedule, the frames and the bytes by the committed message, the cpu time
+    and the peak memory of the process
+    '''
+    assert isinstance(scenario, Scenario)
+
+    log.set_level(log_level)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    node_configs = scenario.get_node_configs()
+    transport_class, _ = TRANSPORTS[scenario.transport]
+
+    blockchains = list()
+    for node_config in node_configs:
+        blockchain = Blockchain(
+            node_config,
+            list(filter(lambda x: x.name != node_config.name, node_configs)),
+            loop,
+            codec=get_codec(scenario.codec),
+            transport_class=transport_class,
+            **scenario.options
+        )
+        blockchain.start()
+        blockchains.append(blockchain)
+
+    done = loop.create_future()
+    load = LoadGenerator(
+        loop,
+        blockchains,
+        arrival=scenario.get_arrival(),
+        entries=scenario.proposers,
+        payload_size=scenario.payload_size,
+        seed=0,
+        on_complete=lambda x: done.set_result(True),
+    )
+
+    cpu_time = time.process_time()
+    started = loop.time()
+
+    load.start(messages=scenario.messages)
+
+    completed = True
+    try:
+        loop.run_until_complete(asyncio.wait_for(done, scenario.timeout))
+    except asyncio.TimeoutError:
+        completed = False
+
+    elapsed = loop.time() - started
+    cpu_time = time.process_time() - cpu_time
+
+    load.stop()
+    for blockchain in blockchains:
+        blockchain.stop()
+
+    tasks = asyncio.all_tasks(loop)
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    loop.close()
+
+    metrics = Metrics.aggregate(map(lambda x: x.metrics, blockchains), name='all')
+    result = load.to_dict()
+
+    # every node commits every message
+    committed = min(map(lambda x: len(x.consensus.storage), blockchains))
+    frames = metrics.counter('transport.frames_out').value
+    sent_bytes = metrics.counter('transport.bytes_out').value
+
+    return dict(
+        completed=completed,
+        committed=committed,
+        elapsed=elapsed,
+        throughput=committed / elapsed if elapsed > 0 else None,
+        latency_mean=result['latency_mean'],
+        latency_p50=result['latency_p50'],
+        latency_p99=result['latency_p99'],
+        latency_max=result['latency_max'],
+        uncorrected_p99=result['uncorrected_p99'],
+        send_lag_max=result['send_lag_max'],
+        frames_per_commit=frames / committed if committed > 0 else None,
+        bytes_per_commit=sent_bytes / committed if committed > 0 else None,
+        cpu_time=cpu_time,
+        peak_rss_kb=get_peak_rss(),
+        metrics=metrics.to_dict(),
+    )
+
+
+def run_isolated(scenario, log_level=logging.ERROR):
+    '''
+    run the scenario in a new process, so the peak memory and the transports
+    of the previous runs are not shared
+    '''
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as executor:
+        return executor.submit(run_scenario, scenario, log_level).result()
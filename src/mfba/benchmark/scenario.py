@@ -0,0 +1,158 @@
+import collections
+
+from ..blockchain import (
+    NodeConfig,
+)
+from ..network import (
+    LocalTransport,
+    MemoryTransport,
+    ShmTransport,
+    TcpTransport,
+)
+
+from .load import ARRIVALS, DEFAULT_BURST, get_arrival
+
+
+TRANSPORTS = dict(
+    local=(LocalTransport, 'sock://memory:%d'),
+    tcp=(TcpTransport, 'tcp://127.0.0.1:%d'),
+    memory=(MemoryTransport, 'mem://memory:%d'),
+    shm=(ShmTransport, 'shm://memory:%d'),
+)
+
+# seconds to wait for all the messages to be committed by every node
+DEFAULT_TIMEOUT = 300
+
+# port of the first node with the tcp transport
+DEFAULT_PORT = 5000
+
+
+class Scenario:
+    '''
+    the repeatable setup of the benchmark: the quorum, the transport and the
+    messages sent by the client. `rate` is the number of the messages sent in
+    a second by the schedule of `arrival`, `None` sends all of them at once;
+    the messages go to the first `proposers` nodes in turn. `options` are
+    passed to the consensus, like `window` and `max_batch_size`.
+    '''
+    name = None
+    nodes = None
+    threshold = None
+    messages = None
+    payload_size = None
+    rate = None
+    arrival = None
+    burst = None
+    proposers = None
+    transport = None
+    codec = None
+    port = None
+    timeout = None
+    options = None
+
+    def __init__(
+        self,
+        name,
+        nodes=4,
+        threshold=80,
+        messages=100,
+        payload_size=32,
+        rate=None,
+        arrival='constant',
+        burst=DEFAULT_BURST,
+        proposers=1,
+        transport='local',
+        codec='json',
+        port=DEFAULT_PORT,
+        timeout=DEFAULT_TIMEOUT,
+        **options
+    ):
+        assert type(nodes) is int and nodes > 0
+        assert type(threshold) is int and 0 < threshold <= 100
+        assert type(messages) is int and messages > 0
+        assert type(payload_size) is int and payload_size > 0
+        assert rate is None or rate > 0
+        assert arrival in ARRIVALS
+        assert type(proposers) is int and 0 < proposers <= nodes
+        assert transport in TRANSPORTS
+        assert codec != 'object' or transport == 'memory'
+        assert timeout > 0
+
+        self.name = name
+        self.nodes = nodes
+        self.threshold = threshold
+        self.messages = messages
+        self.payload_size = payload_size
+        self.rate = rate
+        self.arrival = arrival
+        self.burst = burst
+        self.proposers = proposers
+        self.transport = transport
+        self.codec = codec
+        self.port = port
+        self.timeout = timeout
+        self.options = options
+
+    def __repr__(self):
+        return '<Scenario: name=%(name)s nodes=%(nodes)d threshold=%(threshold)d messages=%(messages)d>' % self.__dict__
+
+    def to_dict(self):
+        return dict(
+            name=self.name,
+            nodes=self.nodes,
+            threshold=self.threshold,
+            messages=self.messages,
+            payload_size=self.payload_size,
+            rate=self.rate,
+            arrival=self.arrival,
+            burst=self.burst,
+            proposers=self.proposers,
+            transport=self.transport,
+            codec=self.codec,
+            timeout=self.timeout,
+            options=self.options,
+        )
+
+    def replace(self, **kw):
+        '''
+        the copy of the scenario with the other settings
+        '''
+        d = self.to_dict()
+        options = d.pop('options')
+        d['port'] = self.port
+        d.update(options)
+        d.update(kw)
+
+        return self.__class__(**d)
+
+    def get_node_configs(self):
+        _, endpoint_format = TRANSPORTS[self.transport]
+
+        return list(map(
+            lambda x: NodeConfig('n%d' % x, endpoint_format % (self.port + x), self.threshold),
+            range(self.nodes),
+        ))
+
+    def get_arrival(self):
+        if self.rate is None:
+            return None
+
+        return get_arrival(self.arrival, self.rate, self.burst)
+
+
+SCENARIOS = collections.OrderedDict(map(
+    lambda x: (x.name, x),
+    (
+        Scenario('baseline'),
+        Scenario('nodes-10', nodes=10),
+        Scenario('nodes-25', nodes=25, messages=50),
+        Scenario('threshold-60', nodes=10, threshold=60),
+        Scenario('payload-4k', payload_size=4096),
+        Scenario('messages-1000', messages=1000),
+        Scenario('rate-200', messages=500, rate=200),
+        Scenario('poisson-200', messages=500, rate=200, arrival='poisson'),
+        Scenario('bursty-200', messages=500, rate=200, arrival='bursty', burst=50),
+        Scenario('proposers-4', messages=200, proposers=4),
+        Scenario('batch-binary', nodes=10, messages=1000, codec='binary', window=8, max_batch_size=50),
+    ),
+))
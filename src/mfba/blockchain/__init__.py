@@ -1 +1 @@
-from .blockchain import Blockchain
\ No newline at end of file
+from .blockchain import Blockchain, NodeConfig
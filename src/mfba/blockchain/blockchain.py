@@ -1,13 +1,15 @@
 import asyncio
+import collections
 from uuid import uuid1
 
 from ..common import (
     log,
+    Metrics,
 )
 from ..consensus import (
     FBAConsensus as Consensus,
     Ballot,
-)    
+)
 from ..network import (
     BaseServer,
     LocalTransport,
@@ -17,8 +19,18 @@ from ..network import (
 )
 
 
+NodeConfig = collections.namedtuple(
+    'NodeConfig',
+    (
+        'name',
+        'endpoint',
+        'threshold',
+    ),
+)
+
+
 class TestConsensus(Consensus):
-    def reached_all_confirm(self, ballot_message):
+    def reached_all_confirm(self, ballot):
         log.blockchain.info("Waiting for next message or Ctrl+C to exit.")
 
 class Server(BaseServer):
@@ -47,8 +59,18 @@ class Server(BaseServer):
 
 class Blockchain():    
 
-    def __init__(self, node_config, validator_config, loop):
-        
+    def __init__(
+        self,
+        node_config,
+        validator_config,
+        loop,
+        codec=None,
+        transport_class=LocalTransport,
+        transport_options=None,
+        consensus_class=TestConsensus,
+        **consensus_options
+    ):
+
         self.quorum = Quorum(
             node_config.threshold,
             list(map(lambda x: Node(x.name, x.endpoint, None), validator_config)),
@@ -57,11 +79,28 @@ class Blockchain():
         self.node = Node(node_config.name, node_config.endpoint, self.quorum)
         log.blockchain.debug('node created: %s', self.node)
 
-
-        self.transport = LocalTransport(node_config.name, node_config.endpoint, loop)
+        # the metrics of the node are shared by the transport and the
+        # consensus
+        self.metrics = Metrics(node_config.name, clock=loop.time)
+
+        self.transport = transport_class(
+            node_config.name,
+            node_config.endpoint,
+            loop,
+            codec=codec,
+            metrics=self.metrics,
+            **(transport_options if transport_options is not None else dict())
+        )
         log.blockchain.debug('transport created: %s', self.transport)
         # final consensus among a certain number of quorums
-        self.consensus = TestConsensus(self.node, self.quorum, self.transport)
+        self.consensus = consensus_class(
+            self.node,
+            self.quorum,
+            self.transport,
+            loop=loop,
+            metrics=self.metrics,
+            **consensus_options
+        )
         log.blockchain.debug('consensus created: %s', self.consensus)
 
         self.server = Server(self.node, self.consensus, node_config.name, transport=self.transport)
@@ -73,14 +112,30 @@ class Blockchain():
             consensus=self.consensus.to_dict(),
             quorum=self.quorum.to_dict(),
             transport=self.transport.to_dict(),
+            metrics=self.metrics.to_dict(),
         )
 
     def start(self):
         self.server.start()
 
-    def send(self, client):
-        MESSAGE = Message.new(uuid1().hex)
-        self.transport.send(self.node.endpoint, MESSAGE.serialize(client))
-        log.blockchain.info('inject message %s -> n0: %s', client.name, MESSAGE)
+    def stop(self):
+        self.consensus.stop()
+        self.transport.stop()
+
+    def send(self, client, data=None, message_id=None):
+        '''
+        inject the message of the client to the node; the data is random by
+        default
+        '''
+        MESSAGE = Message.new(
+            data if data is not None else uuid1().hex,
+            node=client.name,
+            message_id=message_id,
+        )
+        self.consensus.track(MESSAGE)
+        self.transport.send(self.node.endpoint, self.transport.codec.encode(MESSAGE))
+        log.blockchain.info('inject message %s -> %s: %s', client.name, self.node.name, MESSAGE)
+
+        return MESSAGE
 
     
\ No newline at end of file
@@ -1,2 +1,4 @@
 from .base_enum import BaseEnum
-from .log import log, Log
\ No newline at end of file
+from .bits import iter_bits, popcount
+from .log import log, Log
+from .metrics import Counter, Gauge, Histogram, Metrics
@@ -0,0 +1,19 @@
+if hasattr(int, 'bit_count'):
+    def popcount(mask):
+        return mask.bit_count()
+else:
+    def popcount(mask):
+        return bin(mask).count('1')
+
+
+def iter_bits(mask):
+    '''
+    the indices of the set bits, from the lowest
+    '''
+    index = 0
+    while mask:
+        if mask & 1:
+            yield index
+
+        mask >>= 1
+        index += 1
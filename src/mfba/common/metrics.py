@@ -0,0 +1,293 @@
+import math
+import time
+
+
+# the upper bound of the first bucket of the histogram, in seconds
+DEFAULT_RESOLUTION = 0.000001
+
+# the number of the buckets in a doubling of the value, the percentiles are
+# off by less than 2 ** (1 / 4), about 19%
+DEFAULT_BUCKETS_PER_DOUBLING = 4
+
+# the percentiles in the summary
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class Counter:
+    '''
+    the number of the events, like the sent frames
+    '''
+    value = None
+
+    def __init__(self):
+        self.value = 0
+
+    def __repr__(self):
+        return '<Counter: value=%(value)d>' % self.__dict__
+
+    def inc(self, n=1):
+        self.value += n
+
+        return
+
+    def merge(self, other):
+        self.value += other.value
+
+        return
+
+    def to_dict(self):
+        return self.value
+
+    def format(self):
+        return '%d' % self.value
+
+
+class Gauge:
+    '''
+    the current level, like the pending messages, and it's highest level
+    '''
+    value = None
+    max = None
+
+    def __init__(self):
+        self.value = 0
+        self.max = 0
+
+    def __repr__(self):
+        return '<Gauge: value=%(value)d max=%(max)d>' % self.__dict__
+
+    def set(self, value):
+        self.value = value
+        if value > self.max:
+            self.max = value
+
+        return
+
+    def inc(self, n=1):
+        self.set(self.value + n)
+
+        return
+
+    def dec(self, n=1):
+        self.set(self.value - n)
+
+        return
+
+    def merge(self, other):
+        self.value += other.value
+        self.max = max(self.max, other.max)
+
+        return
+
+    def to_dict(self):
+        return dict(value=self.value, max=self.max)
+
+    def format(self):
+        return '%d max=%d' % (self.value, self.max)
+
+
+class Histogram:
+    '''
+    the distribution of the values, like the latencies in seconds; the values
+    are counted in the log-scale buckets from `resolution`, so the
+    percentiles are the upper bounds of the buckets
+    '''
+    resolution = None
+    buckets_per_doubling = None
+    buckets = None
+    count = None
+    total = None
+    min = None
+    max = None
+
+    def __init__(self, resolution=DEFAULT_RESOLUTION, buckets_per_doubling=DEFAULT_BUCKETS_PER_DOUBLING):
+        assert resolution > 0
+        assert type(buckets_per_doubling) is int and buckets_per_doubling > 0
+
+        self.resolution = resolution
+        self.buckets_per_doubling = buckets_per_doubling
+
+        # the index of the bucket to the number of the values; the upper
+        # bound of the bucket is `resolution * 2 ** (index / buckets_per_doubling)`
+        self.buckets = dict()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def __repr__(self):
+        return '<Histogram: count=%(count)d total=%(total)f min=%(min)s max=%(max)s>' % self.__dict__
+
+    def observe(self, value):
+        value = max(value, 0)
+
+        index = 0
+        if value > self.resolution:
+            index = math.ceil(math.log2(value / self.resolution) * self.buckets_per_doubling)
+
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+        return
+
+    @property
+    def mean(self):
+        if self.count < 1:
+            return None
+
+        return self.total / self.count
+
+    def percentile(self, q):
+        assert 0 <= q <= 1
+
+        if self.count < 1:
+            return None
+
+        rank = max(math.ceil(q * self.count), 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                break
+
+        # the bucket is narrowed by the observed values
+        upper = self.resolution * 2 ** (index / self.buckets_per_doubling)
+
+        return min(max(upper, self.min), self.max)
+
+    def merge(self, other):
+        assert self.resolution == other.resolution
+        assert self.buckets_per_doubling == other.buckets_per_doubling
+
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+        return
+
+    def to_dict(self):
+        d = dict(
+            count=self.count,
+            total=self.total,
+            mean=self.mean,
+            min=self.min,
+            max=self.max,
+        )
+        for q in PERCENTILES:
+            d['p%d' % (q * 100)] = self.percentile(q)
+
+        return d
+
+    def format(self):
+        if self.count < 1:
+            return 'count=0'
+
+        values = ['count=%d' % self.count, 'mean=%.3fms' % (self.mean * 1000)]
+        for q in PERCENTILES:
+            values.append('p%d=%.3fms' % (q * 100, self.percentile(q) * 1000))
+        values.append('max=%.3fms' % (self.max * 1000))
+
+        return ' '.join(values)
+
+
+class Metrics:
+    '''
+    the counters, the gauges and the histograms of the node by name; the
+    metric is created at the first use. `clock` is the time in seconds of the
+    latencies, like `loop.time`.
+    '''
+    name = None
+    clock = None
+    counters = None
+    gauges = None
+    histograms = None
+
+    def __init__(self, name=None, clock=time.monotonic):
+        self.name = name
+        self.clock = clock
+        self.counters = dict()
+        self.gauges = dict()
+        self.histograms = dict()
+
+    def __repr__(self):
+        return '<Metrics: name=%(name)s>' % self.__dict__
+
+    def now(self):
+        return self.clock()
+
+    def counter(self, name):
+        counter = self.counters.get(name)
+        if counter is None:
+            counter = self.counters[name] = Counter()
+
+        return counter
+
+    def gauge(self, name):
+        gauge = self.gauges.get(name)
+        if gauge is None:
+            gauge = self.gauges[name] = Gauge()
+
+        return gauge
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+
+        return histogram
+
+    def merge(self, other):
+        '''
+        add the metrics of the other node; the gauges are summed up with the
+        highest of the levels
+        '''
+        assert isinstance(other, Metrics)
+
+        for kind in ('counters', 'gauges', 'histograms'):
+            create = getattr(self, kind[:-1])
+            for name, metric in getattr(other, kind).items():
+                create(name).merge(metric)
+
+        return
+
+    @classmethod
+    def aggregate(cls, metrics_list, name=None):
+        aggregated = cls(name)
+        for metrics in metrics_list:
+            aggregated.merge(metrics)
+
+        return aggregated
+
+    def to_dict(self):
+        return dict(
+            name=self.name,
+            counters=dict(map(lambda x: (x[0], x[1].to_dict()), self.counters.items())),
+            gauges=dict(map(lambda x: (x[0], x[1].to_dict()), self.gauges.items())),
+            histograms=dict(map(lambda x: (x[0], x[1].to_dict()), self.histograms.items())),
+        )
+
+    def format(self):
+        '''
+        the summary in lines, sorted by name
+        '''
+        metrics = dict()
+        for kind in ('counters', 'gauges', 'histograms'):
+            metrics.update(getattr(self, kind))
+
+        width = max(map(len, metrics.keys())) if len(metrics) > 0 else 0
+
+        return '\n'.join(map(
+            lambda x: '%s %s' % (x.ljust(width), metrics[x].format()),
+            sorted(metrics),
+        ))
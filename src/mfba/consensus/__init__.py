@@ -1,4 +1,10 @@
 from .ballot import Ballot, BallotMessage, BallotVoteResult
+from .certificate import VoteCertificate
+from .commit_log import CommitLog, CommitRecord, OffsetIndex
 from .fba import FBAConsensus
+from .fetch import MessageRequest, MessageResponse, SlotRequest
+from .message_cache import MessageCache
+from .snapshot import BallotSnapshot, Snapshot
 from .state import State
-from .storage import Storage
\ No newline at end of file
+from .storage import Storage
+from .validator import ValidationPool, Validator
@@ -1,14 +1,21 @@
 import json
 import datetime
 import enum
+import logging
 
 from ..common import (
     BaseEnum,
+    iter_bits,
     log,
+    Metrics,
+    popcount,
 )
 
 from ..network import (
+    BaseCodec,
+    Batch,
     Message,
+    MessageDigest,
     Node,
     Quorum,
 )
@@ -20,6 +27,59 @@ class BallotVoteResult(BaseEnum):
     disagree = 'N'        
     none = enum.auto()  
 
+
+# fixed-width codes of the binary codec
+RESULT_CODES = {
+    BallotVoteResult.none: 0,
+    BallotVoteResult.agree: 1,
+    BallotVoteResult.disagree: 2,
+}
+RESULTS_BY_CODE = dict(map(lambda x: (x[1], x[0]), RESULT_CODES.items()))
+
+PROPOSAL_CODES = {
+    Message: 0,
+    Batch: 1,
+    MessageDigest: 2,
+}
+PROPOSALS_BY_CODE = dict(map(lambda x: (x[1], x[0]), PROPOSAL_CODES.items()))
+
+
+def proposal_key(message):
+    '''
+    the order of the proposals for the same slot; the lowest one wins
+    '''
+    return (message.hash_id, message.message_id)
+
+
+def load_proposal(o):
+    '''
+    the message, batch or digest from the parsed JSON object
+    '''
+    if 'messages' in o['message']:
+        return Batch.from_dict(o)
+
+    if 'data' in o['message']:
+        return Message.from_dict(o)
+
+    return MessageDigest.from_dict(o)
+
+def put_vote(votes, bit, result):
+    '''
+    set the vote of the validator bit to `[seen, agreed, disagreed]`; the
+    previous vote is overrided
+    '''
+    votes[0] |= bit
+    votes[1] &= ~bit
+    votes[2] &= ~bit
+
+    if result == BallotVoteResult.agree:
+        votes[1] |= bit
+    elif result == BallotVoteResult.disagree:
+        votes[2] |= bit
+
+    return
+
+
 class Ballot:
     # class AlreadyVotedError(Exception):
     #     pass
@@ -31,26 +91,76 @@ class Ballot:
         pass
 
     timestamp = None
+    slot = None
+    round = None
     state = None
     name = None
     message = None
-    voted = None
+    votes = None
     is_broadcasted = None
     node_result = None
 
-    def __init__(self, node, state, node_result=BallotVoteResult.none, timestamp=None):
+    # the message proposed by the node itself
+    proposal = None
+
+    # the other messages voted in the same round, by `message_id`, with their
+    # votes
+    others = None
+
+    # the validators, which confirmed the message in the round, by
+    # `(round, message_id)`
+    confirmed = None
+
+    # the liveness timer of the current state and the number of the resends;
+    # `received` counts the new votes of the current state, the timer resends
+    # only when nothing new was received from `received_at` in the wait;
+    # `timer_at` is the time, when the timer was started
+    timer = None
+    timer_state = None
+    timer_received = None
+    timer_at = None
+    retries = None
+    received = None
+    received_at = None
+
+    # with `metrics`, the time in the state is observed at every transition;
+    # `started_at` is the time of the ballot and `state_at` of the state
+    metrics = None
+    started_at = None
+    state_at = None
+
+    def __init__(self, node, state, node_result=BallotVoteResult.none, timestamp=None, slot=0, metrics=None):
         assert isinstance(node, Node)
         assert isinstance(node.quorum, Quorum)
         assert isinstance(state, State)
+        assert type(slot) is int
+        assert metrics is None or isinstance(metrics, Metrics)
 
         self.node = node
+        self.slot = slot
+        self.round = 0
         self.state = state
         self.state_history = [State.none]
         self.message = None
-        self.voted = dict()
+
+        # the votes of the state are the bitmasks of the validator indices,
+        # `[seen, agreed, disagreed]`
+        self.votes = dict()
         self.vote_history = dict()
         self.is_broadcasted = False
         self.node_result = node_result
+        self.proposal = None
+        self.others = dict()
+        self.confirmed = dict()
+        self.timer = None
+        self.timer_state = None
+        self.timer_received = 0
+        self.retries = 0
+        self.received = 0
+
+        self.metrics = metrics
+        if metrics is not None:
+            self.started_at = self.state_at = metrics.now()
 
         if timestamp is None: 
             self.timestamp = str(datetime.datetime.now())
@@ -58,23 +168,37 @@ class Ballot:
             self.timestamp = timestamp
 
     def __repr__(self):
-        return '<Ballot: timestamp=%(timestamp)s node=%(node)s state=%(state)s voted=%(voted)s node_result=%(node_result)s is_broadcasted=%(is_broadcasted)s>' % self.__dict__
+        d = self.__dict__.copy()
+        d['tallies'] = self.get_tallies()
+        return '<Ballot: timestamp=%(timestamp)s slot=%(slot)d round=%(round)d node=%(node)s state=%(state)s tallies=%(tallies)s node_result=%(node_result)s is_broadcasted=%(is_broadcasted)s>' % d
+
+    def get_voted(self, votes):
+        '''
+        the validator name to the result
+        '''
+        voted = dict()
+        for result, mask in ((BallotVoteResult.agree, votes[1]), (BallotVoteResult.disagree, votes[2])):
+            for index in iter_bits(mask):
+                voted[self.node.quorum.name_of(index)] = result
+
+        for index in iter_bits(votes[0] & ~(votes[1] | votes[2])):
+            voted[self.node.quorum.name_of(index)] = BallotVoteResult.none
+
+        return voted
 
     def to_dict(self):
         vh = dict()
-        for state, voted in self.vote_history.items():
-            copied = dict()
-            for node_name, result in voted.items():
-                copied[node_name] = result.name
-
-            vh[state] = copied
+        for state, votes in self.vote_history.items():
+            vh[state] = dict(map(lambda x: (x[0], x[1].name), self.get_voted(votes).items()))
 
         return dict(
             timestamp=self.timestamp,
+            slot=self.slot,
+            round=self.round,
             node=self.node.to_dict(simple=True),
             state=self.state.name,
             state_history=list(map(lambda x: x.name, self.state_history)),
-            node_result=self.node_result.name,
+            node_result=self.node_result.name if self.node_result is not None else None,
             message=self.message.to_dict(),
             vote_history=vh,
         )
@@ -86,6 +210,12 @@ class Ballot:
         if ballot_message.message is None:
             return False
 
+        if self.slot != ballot_message.slot:
+            return False
+
+        if self.round != ballot_message.round:
+            return False
+
         if self.message != ballot_message.message:
             return False
 
@@ -94,7 +224,7 @@ class Ballot:
     def initialize_state(self):
         self.state = State.init
         self.message = None
-        self.voted = dict()
+        self.votes = dict()
         self.is_broadcasted = False
         self.node_result = None
 
@@ -109,93 +239,306 @@ class Ballot:
             '%s: state changed `%s` -> `%s`',
             self.node.name, self.state.name, state.name,
         )
+        self.observe_state('%s.%s' % (self.state.name, state.name))
+        if state == State.all_confirm and self.metrics is not None:
+            self.metrics.histogram('ballot.all_confirm').observe(self.state_at - self.started_at)
+
         self.state_history.append(state)
-        if self.state.value in self.voted:
-            self.vote_history[self.state.name] = self.voted[self.state.value]
+        if self.state.value in self.votes:
+            self.vote_history[self.state.name] = self.votes[self.state.value]
+
+        # the votes of the previous states are not needed anymore, but the
+        # votes of the next states are kept
+        for state_value in list(self.votes.keys()):
+            if state_value < state.value:
+                del self.votes[state_value]
 
         self.state = state
-        self.voted = dict()
         self.is_broadcasted = False
 
         return
 
-    def serialize_ballot_message(self):
+    def observe_state(self, transition):
+        '''
+        the time in the current state, by the transition; the creation of the
+        ballot is not counted
+        '''
+        if self.metrics is None:
+            return
+
+        now = self.metrics.now()
+        if self.state != State.none:
+            self.metrics.histogram('ballot.%s' % transition).observe(now - self.state_at)
+
+        self.state_at = now
+
+        return
+
+    def get_ballot_message(self, digest=False, resent=False):
+        '''
+        with `digest`, the message is referenced only by it's digest
+        '''
         return BallotMessage(
             self.node,
             self.state,
-            self.message,
+            MessageDigest.of(self.message) if digest else self.message,
             self.node_result,
-        ).serialize()
+            slot=self.slot,
+            round=self.round,
+            resent=resent,
+        )
+
+    def serialize_ballot_message(self):
+        return self.get_ballot_message().serialize()
 
     def set_message(self, message):
-        assert isinstance(message, Message)
+        assert isinstance(message, (Message, Batch))
 
         self.message = message
-        self.voted = dict()
+        self.votes = dict()
 
         return
 
+    def switch_message(self, message):
+        '''
+        take the other message in the same round; the votes are kept by the
+        message, so the votes are back when the message is taken again
+        '''
+        assert isinstance(message, (Message, Batch))
+
+        if self.message is not None:
+            self.others[self.message.message_id] = (self.message, self.votes)
+
+        _, self.votes = self.others.pop(message.message_id, (message, dict()))
+        self.message = message
+        self.is_broadcasted = False
+        self.node_result = None
+
+        return
+
+    def change_round(self, round, message):
+        '''
+        start over from `init` with the message; the lower round is taken
+        only by the confirmed ballot of the other validators
+        '''
+        assert round != self.round
+
+        log.ballot.warning(
+            '%s: slot %d: round changed %d -> %d: %s',
+            self.node.name, self.slot, self.round, round, message,
+        )
+
+        self.observe_state('%s.round' % self.state.name)
+
+        self.round = round
+        self.state = State.init
+        self.state_history.append(State.init)
+        self.set_message(message)
+        self.is_broadcasted = False
+        self.node_result = None
+        self.others = dict()
+
+        return
+
+    def vote_other(self, node, message, result, state):
+        '''
+        the vote for the other message in the same round
+        '''
+        index = self.node.quorum.index_of(node)
+        if index is None:
+            return
+
+        _, votes = self.others.setdefault(message.message_id, (message, dict()))
+        votes = votes.setdefault(state.value, [0, 0, 0])
+        if state == self.state and not votes[0] & (1 << index):
+            self.received += 1
+
+        put_vote(votes, 1 << index, result)
+
+        return
+
+    def check_others(self):
+        '''
+        the other message and it's state, which passed the threshold in the
+        current or the later states
+        '''
+        minimum_quorum = self.node.quorum.minimum_quorum
+        member_mask = self.node.quorum.member_mask
+
+        passed = (None, None)
+        for message, votes in self.others.values():
+            for state_value, (_, agreed, _) in votes.items():
+                if state_value < self.state.value:
+                    continue
+
+                if popcount(agreed & member_mask) < minimum_quorum:
+                    continue
+
+                if passed[1] is None or state_value > passed[1].value:
+                    passed = (message, State.from_value(state_value))
+
+        return passed
+
+    def confirm(self, node, message, round):
+        '''
+        the validator confirmed the message in the round; return `True` when
+        the message is confirmed by more validators than the faulty ones
+        '''
+        index = self.node.quorum.index_of(node)
+        if index is None:
+            return False
+
+        key = (round, message.message_id)
+        _, mask = self.confirmed.get(key, (message, 0))
+        mask |= 1 << index
+        self.confirmed[key] = (message, mask)
+
+        return popcount(mask & self.node.quorum.member_mask) >= self.node.quorum.minimum_blocking
+
+    def is_reachable(self):
+        '''
+        any of the messages can pass the threshold of the current state by
+        the validators, which did not vote for the others yet; the validator,
+        which voted for a message after `init`, does not vote for the others
+        '''
+        def get_voters(votes):
+            voters = 0
+            for state_value, (seen, _, _) in votes.items():
+                if state_value > State.init.value:
+                    voters |= seen
+
+            return voters
+
+        voters = [get_voters(self.votes)] + list(map(lambda x: get_voters(x[1]), self.others.values()))
+        for i in range(len(voters)):
+            against = 0
+            for j, v in enumerate(voters):
+                if j != i:
+                    against |= v
+
+            if i == 0:
+                against |= self.votes.get(self.state.value, (0, 0, 0))[2]
+
+            if popcount(self.node.quorum.member_mask & ~against) >= self.node.quorum.minimum_quorum:
+                return True
+
+        return False
+
+    def get_lowest_message(self):
+        return min(
+            [self.message] + list(map(lambda x: x[0], self.others.values())),
+            key=proposal_key,
+        )
+
     def is_empty(self):
         return self.message is None
 
-    def is_voted(self, node):
-        return node.name in self.voted
+    def is_voted(self, node, state=None):
+        state = self.state if state is None else state
+        index = self.node.quorum.index_of(node)
+        if index is None or state.value not in self.votes:
+            return False
+
+        return bool((self.votes[state.value][0] >> index) & 1)
+
+    def get_tally(self, state):
+        '''
+        the number of (agreed, disagreed) votes of the state by the current
+        members
+        '''
+        if state.value not in self.votes:
+            return (0, 0)
+
+        member_mask = self.node.quorum.member_mask
+        _, agreed, disagreed = self.votes[state.value]
+
+        return (popcount(agreed & member_mask), popcount(disagreed & member_mask))
+
+    def get_tallies(self):
+        return dict(map(
+            lambda x: (State.from_value(x).name, dict(zip(('agree', 'disagree'), self.get_tally(State.from_value(x))))),
+            self.votes.keys(),
+        ))
 
     def vote(self, node, result, state):
         assert isinstance(node, Node)
 
         if self.state > state:
             log.ballot.debug(
-                '%s: same message and previous state: %s: %s',
+                '%s: same message and previous state: %s',
                 self.node.name,
                 state,
             )
 
             return
 
-        self.voted.setdefault(state.value, dict())
+        index = self.node.quorum.index_of(node)
+        if index is None:
+            log.ballot.debug('%s: vote from outside quorum: %s', self.node.name, node)
+
+            return
+
+        bit = 1 << index
+        votes = self.votes.setdefault(state.value, [0, 0, 0])
 
         # if node.name in self.voted:
         #     raise Ballot.AlreadyVotedError('node, %s already voted' % node_name)
         #     return
-        if node.name in self.voted[state.value]:
+        if votes[0] & bit:
             # existing vote will be overrided
-            log.ballot.debug('%s: already voted?: %s', self.node.name)
+            log.ballot.debug('%s: already voted?: %s', self.node.name, node)
+        elif state == self.state:
+            self.received += 1
+
+        put_vote(votes, bit, result)
 
-        self.voted[state.value][node.name] = result
         log.ballot.info('%s: %s voted for %s', self.node.name, node, self.message)
 
         return
 
 
+    def merge_votes(self, state, agreed, disagreed):
+        '''
+        add the votes of the certificate, the bitmasks of the validator indices
+        '''
+        if self.state > state:
+            return
+
+        votes = self.votes.setdefault(state.value, [0, 0, 0])
+        if state == self.state and (agreed | disagreed) & ~votes[0]:
+            self.received += 1
+
+        votes[0] |= agreed | disagreed
+        votes[1] = (votes[1] & ~disagreed) | agreed
+        votes[2] = (votes[2] & ~agreed) | disagreed
+
+        return
+
     # if above the threshold then the consensus of the quorum is finalizied
     def check_threshold(self):
-        voted = self.voted.copy()
-
-        states = sorted(voted.keys(), reverse=True)
-        if len(states) < 1:
+        if len(self.votes) < 1:
             return (self.state, False)
 
-        for state_value in states:
-            if state_value < self.state.value:
-                del self.voted[state_value]
-                continue
+        minimum_quorum = self.node.quorum.minimum_quorum
+        member_mask = self.node.quorum.member_mask
 
-            target = voted[state_value]
-
-            agreed_votes = list(filter(lambda x: x == BallotVoteResult.agree, target.values()))
+        # the votes have only the current and the next states
+        is_passed = False
+        for state_value in sorted(self.votes.keys(), reverse=True):
+            agreed = popcount(self.votes[state_value][1] & member_mask)
 
             # agreed votes is above the minimum quorum defined by the threshold
-            is_passed = len(agreed_votes) >= self.node.quorum.minimum_quorum
-            log.ballot.info(
-                '%s: threshold checked: threshold=%s voted=%s minimum_quorum=%s agreed=%d is_passed=%s',
-                self.node.name,
-                self.node.quorum.threshold,
-                sorted(map(lambda x: (x[0], x[1].value), target.items())),
-                self.node.quorum.minimum_quorum,
-                len(agreed_votes),
-                is_passed,
-            )
+            is_passed = agreed >= minimum_quorum
+            if log.ballot.isEnabledFor(logging.INFO):
+                log.ballot.info(
+                    '%s: threshold checked: threshold=%s voted=%s minimum_quorum=%s agreed=%d is_passed=%s',
+                    self.node.name,
+                    self.node.quorum.threshold,
+                    sorted(map(lambda x: (x[0], x[1].value), self.get_voted(self.votes[state_value]).items())),
+                    minimum_quorum,
+                    agreed,
+                    is_passed,
+                )
 
             if is_passed:
                 return (State.from_value(state_value), is_passed)
@@ -204,34 +547,52 @@ class Ballot:
 
 
 class BallotMessage:
-    class InvalidBallotMessageError(Exception):
+    class InvalidBallotMessageError(Message.InvalidMessageError):
         pass
 
+    type_name = 'ballot-message'
+    type_code = 2
+
+    slot = None
+    round = None
     state = None
     message = None
     result = None
 
-    def __init__(self, node, state, message, result):
+    # sent again by the liveness timer, the validators which are not behind
+    # answer with their votes
+    resent = None
+
+    def __init__(self, node, state, message, result, slot=0, round=0, resent=False):
         assert isinstance(node, Node)
         assert isinstance(state, State)
-        assert isinstance(message, Message)
+        assert isinstance(message, (Message, Batch, MessageDigest))
         assert isinstance(result, BallotVoteResult)
+        assert type(slot) is int
+        assert type(round) is int
+        assert type(resent) is bool
 
         self.node = node
+        self.slot = slot
+        self.round = round
         self.state = state
         self.message = message
         self.result = result
+        self.resent = resent
 
     def __repr__(self):
-        return '<BallotMessage: node=%(node)s state=%(state)s result=%(result)s message=%(message)s>' % self.__dict__
+        return '<BallotMessage: node=%(node)s slot=%(slot)d round=%(round)d state=%(state)s result=%(result)s resent=%(resent)s message=%(message)s>' % self.__dict__
 
     def serialize(self):
         return json.dumps(dict(
-            type_name='ballot-message',
+            type_name=self.type_name,
             node=self.node.name,
+            slot=self.slot,
+            round=self.round,
             state=self.state.name,
             message=self.message.to_message_dict(),
             result=self.result.name,
+            resent=self.resent,
         )) + '\r\n\r\n'
 
     @classmethod
@@ -241,23 +602,90 @@ class BallotMessage:
         except json.decoder.JSONDecodeError as e:
             raise cls.InvalidBallotMessageError(e)
 
-        if 'type_name' not in o or o['type_name'] != 'ballot-message':
+        if not isinstance(o, dict) or o.get('type_name') != 'ballot-message':
             raise cls.InvalidBallotMessageError('`type_name` is not "ballot-message"')
 
-        message = None
+        return cls.from_dict(o)
+
+    @classmethod
+    def from_dict(cls, o):
         try:
-            message = Message.from_dict(o)
-        except Message.InvalidMessageError as e:
+            return cls(
+                Node(o['node'], None, None),
+                State.from_name(o['state']),
+                load_proposal(o),
+                BallotVoteResult.from_name(o['result']),
+                slot=o.get('slot', 0),
+                round=o.get('round', 0),
+                resent=o.get('resent', False),
+            )
+        except (AssertionError, AttributeError, KeyError, TypeError, Message.InvalidMessageError) as e:
             raise cls.InvalidBallotMessageError(e)
 
+    def pack(self, writer):
+        writer.string(self.node.name)
+        writer.u64(self.slot)
+        writer.u32(self.round)
+        writer.u8(self.state.value)
+        writer.u8(RESULT_CODES[self.result])
+        writer.u8(1 if self.resent else 0)
+        writer.u8(PROPOSAL_CODES[self.message.__class__])
+        self.message.pack_body(writer)
+
+        return
+
+    @classmethod
+    def unpack(cls, reader):
+        node = reader.string()
+        slot = reader.u64()
+        round = reader.u32()
+        state = State.from_value(reader.u8())
+        result = RESULTS_BY_CODE.get(reader.u8())
+        resent = reader.u8() == 1
+        proposal_class = PROPOSALS_BY_CODE.get(reader.u8())
+
+        if state is None or result is None or proposal_class is None:
+            raise cls.InvalidBallotMessageError('invalid state, result or proposal code')
+
         return cls(
-            Node(o['node'], None, None),
-            State.from_name(o['state']),
-            message,
-            BallotVoteResult.from_name(o['result']),
+            Node(node, None, None),
+            state,
+            proposal_class.unpack_body(reader, node),
+            result,
+            slot=slot,
+            round=round,
+            resent=resent,
         )
 
     def get_message(self):
         return self.message
 
+    def is_digest(self):
+        return isinstance(self.message, MessageDigest)
+
+    def resolve(self, message):
+        '''
+        the ballot message with the message of the digest
+        '''
+        assert isinstance(message, (Message, Batch))
+        assert self.message.is_digest_of(message)
+
+        return self.__class__(
+            self.node,
+            self.state,
+            message,
+            self.result,
+            slot=self.slot,
+            round=self.round,
+            resent=self.resent,
+        )
+
+    def verify(self, verified_hashes=None):
+        self.message.verify(verified_hashes)
+
+        return
+
+
+BaseCodec.register(BallotMessage)
+
 
@@ -0,0 +1,164 @@
+import json
+
+from ..network import (
+    BaseCodec,
+    Batch,
+    Message,
+    MessageDigest,
+    Node,
+)
+
+from .ballot import PROPOSAL_CODES, PROPOSALS_BY_CODE, load_proposal
+from .state import State
+
+
+def mask_to_bytes(mask):
+    return mask.to_bytes((mask.bit_length() + 7) // 8, 'big')
+
+
+class VoteCertificate:
+    '''
+    the votes of the state collected by the aggregator of the slot; the voters
+    are the bits of the validator indices in `agreed` and `disagreed`. The
+    indices are of the quorum of the aggregator, `membership` is the digest of
+    it, so the certificate is taken only by the nodes of the same quorum.
+    '''
+    class InvalidVoteCertificateError(Message.InvalidMessageError):
+        pass
+
+    type_name = 'vote-certificate'
+    type_code = 5
+
+    slot = None
+    round = None
+    state = None
+    message = None
+    agreed = None
+    disagreed = None
+    membership = None
+
+    def __init__(self, node, state, message, agreed, disagreed, membership, slot=0, round=0):
+        assert isinstance(node, Node)
+        assert isinstance(state, State)
+        assert isinstance(message, (Message, Batch, MessageDigest))
+        assert type(agreed) is int and agreed >= 0
+        assert type(disagreed) is int and disagreed >= 0
+        assert type(membership) is int and membership >= 0
+        assert type(slot) is int
+        assert type(round) is int
+
+        self.node = node
+        self.slot = slot
+        self.round = round
+        self.state = state
+        self.message = message
+        self.agreed = agreed
+        self.disagreed = disagreed
+        self.membership = membership
+
+    def __repr__(self):
+        return '<VoteCertificate: node=%s slot=%d round=%d state=%s agreed=%x disagreed=%x message=%s>' % (
+            self.node,
+            self.slot,
+            self.round,
+            self.state,
+            self.agreed,
+            self.disagreed,
+            self.message,
+        )
+
+    def serialize(self):
+        return json.dumps(dict(
+            type_name=self.type_name,
+            node=self.node.name,
+            slot=self.slot,
+            round=self.round,
+            state=self.state.name,
+            message=self.message.to_message_dict(),
+            agreed=self.agreed,
+            disagreed=self.disagreed,
+            membership=self.membership,
+        )) + '\r\n\r\n'
+
+    @classmethod
+    def from_dict(cls, o):
+        try:
+            return cls(
+                Node(o['node'], None, None),
+                State.from_name(o['state']),
+                load_proposal(o),
+                o['agreed'],
+                o['disagreed'],
+                o['membership'],
+                slot=o.get('slot', 0),
+                round=o.get('round', 0),
+            )
+        except (AssertionError, AttributeError, KeyError, TypeError, Message.InvalidMessageError) as e:
+            raise cls.InvalidVoteCertificateError(e)
+
+    def pack(self, writer):
+        writer.string(self.node.name)
+        writer.u64(self.slot)
+        writer.u32(self.round)
+        writer.u8(self.state.value)
+        writer.blob(mask_to_bytes(self.agreed))
+        writer.blob(mask_to_bytes(self.disagreed))
+        writer.u64(self.membership)
+        writer.u8(PROPOSAL_CODES[self.message.__class__])
+        self.message.pack_body(writer)
+
+        return
+
+    @classmethod
+    def unpack(cls, reader):
+        node = reader.string()
+        slot = reader.u64()
+        round = reader.u32()
+        state = State.from_value(reader.u8())
+        agreed = int.from_bytes(reader.blob(), 'big')
+        disagreed = int.from_bytes(reader.blob(), 'big')
+        membership = reader.u64()
+        proposal_class = PROPOSALS_BY_CODE.get(reader.u8())
+
+        if state is None or proposal_class is None:
+            raise cls.InvalidVoteCertificateError('invalid state or proposal code')
+
+        return cls(
+            Node(node, None, None),
+            state,
+            proposal_class.unpack_body(reader, node),
+            agreed,
+            disagreed,
+            membership,
+            slot=slot,
+            round=round,
+        )
+
+    def get_message(self):
+        return self.message
+
+    def is_digest(self):
+        return isinstance(self.message, MessageDigest)
+
+    def resolve(self, message):
+        assert isinstance(message, (Message, Batch))
+        assert self.message.is_digest_of(message)
+
+        return self.__class__(
+            self.node,
+            self.state,
+            message,
+            self.agreed,
+            self.disagreed,
+            self.membership,
+            slot=self.slot,
+            round=self.round,
+        )
+
+    def verify(self, verified_hashes=None):
+        self.message.verify(verified_hashes)
+
+        return
+
+
+BaseCodec.register(VoteCertificate)
@@ -0,0 +1,897 @@
+import collections
+import hashlib
+import mmap
+import os
+import struct
+import zlib
+
+from ..common import (
+    log,
+    Metrics,
+)
+
+from ..network import (
+    Batch,
+    Message,
+)
+from ..network.codec import BinaryReader, BinaryWriter, InvalidFrameError
+
+from .ballot import BallotVoteResult, RESULT_CODES, RESULTS_BY_CODE
+from .state import State
+
+
+# bytes of a segment file; the next record goes to the new segment
+DEFAULT_SEGMENT_SIZE = 1 << 26
+
+# the appended records are fsync'ed together after `DEFAULT_SYNC_INTERVAL`
+# seconds, or at once when `DEFAULT_SYNC_BYTES` bytes are not synced yet
+DEFAULT_SYNC_INTERVAL = 0.01
+DEFAULT_SYNC_BYTES = 1 << 20
+
+# number of the records kept in the memory
+DEFAULT_RECORD_CACHE_SIZE = 1024
+
+# initial number of the entries of the offset index
+DEFAULT_INDEX_CAPACITY = 1 << 16
+
+
+def get_index_key(name):
+    # `0` marks the empty entry
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), 'big') or 1
+
+
+def pack_proposal(writer, message):
+    writer.u8(1 if isinstance(message, Batch) else 0)
+    writer.string(message.node)
+    message.pack_body(writer)
+
+    return
+
+
+def unpack_proposal(reader):
+    message_class = Batch if reader.u8() == 1 else Message
+    node = reader.string()
+    message = message_class.unpack_body(reader, node)
+
+    # the message was checked by the checksum of the file
+    for m in message.get_messages():
+        m.is_verified = True
+
+    return message
+
+
+def pack_voted(writer, voted):
+    writer.u32(len(voted))
+    for name, result in voted.items():
+        writer.string(name)
+        writer.u8(RESULT_CODES[result])
+
+    return
+
+
+def unpack_voted(reader):
+    voted = dict()
+    for _ in range(reader.u32()):
+        name = reader.string()
+        voted[name] = RESULTS_BY_CODE[reader.u8()]
+
+    return voted
+
+
+class CommitRecord:
+    '''
+    the committed ballot in the log; the votes are kept by the validator
+    names, so the record does not depend on the order of the quorum
+    '''
+    slot = None
+    round = None
+    timestamp = None
+    message = None
+    state_history = None
+    node_result = None
+    vote_history = None
+
+    def __init__(self, slot, round, timestamp, message, state_history, node_result, vote_history):
+        self.slot = slot
+        self.round = round
+        self.timestamp = timestamp
+        self.message = message
+        self.state_history = state_history
+        self.node_result = node_result
+        self.vote_history = vote_history
+
+    def __repr__(self):
+        return '<CommitRecord: slot=%(slot)d round=%(round)d message=%(message)s>' % self.__dict__
+
+    @classmethod
+    def from_ballot(cls, ballot):
+        vote_history = dict()
+        for state, votes in ballot.vote_history.items():
+            vote_history[state] = ballot.get_voted(votes)
+
+        return cls(
+            ballot.slot,
+            ballot.round,
+            ballot.timestamp,
+            ballot.message,
+            list(ballot.state_history),
+            ballot.node_result,
+            vote_history,
+        )
+
+    def get_messages(self):
+        return self.message.get_messages()
+
+    def get_names(self):
+        '''
+        the keys of the offset index, which point to the record
+        '''
+        names = ['s%d' % self.slot, 'm%s' % self.message.message_id]
+        for message in self.get_messages():
+            if message.message_id != self.message.message_id:
+                names.append('m%s' % message.message_id)
+            names.append('h%s' % message.hash_id)
+
+        return names
+
+    def pack(self):
+        writer = BinaryWriter()
+        writer.u64(self.slot)
+        writer.u32(self.round)
+        writer.string(self.timestamp)
+        writer.string(self.node_result.name if self.node_result is not None else None)
+
+        writer.u8(len(self.state_history))
+        for state in self.state_history:
+            writer.string(state.name)
+
+        writer.u8(len(self.vote_history))
+        for state, voted in self.vote_history.items():
+            writer.string(state)
+            pack_voted(writer, voted)
+
+        pack_proposal(writer, self.message)
+
+        return writer.getvalue()
+
+    @classmethod
+    def unpack(cls, data):
+        reader = BinaryReader(data)
+        slot = reader.u64()
+        round = reader.u32()
+        timestamp = reader.string()
+        node_result = reader.string()
+
+        state_history = list(map(lambda x: State.from_name(reader.string()), range(reader.u8())))
+
+        vote_history = dict()
+        for _ in range(reader.u8()):
+            state = reader.string()
+            vote_history[state] = unpack_voted(reader)
+
+        message = unpack_proposal(reader)
+
+        return cls(
+            slot,
+            round,
+            timestamp,
+            message,
+            state_history,
+            BallotVoteResult.from_name(node_result) if node_result is not None else None,
+            vote_history,
+        )
+
+    def to_dict(self, node):
+        '''
+        the same as `Ballot.to_dict` of the committed ballot
+        '''
+        vh = dict()
+        for state, voted in self.vote_history.items():
+            vh[state] = dict(map(lambda x: (x[0], x[1].name), voted.items()))
+
+        return dict(
+            timestamp=self.timestamp,
+            slot=self.slot,
+            round=self.round,
+            node=node.to_dict(simple=True),
+            state=State.all_confirm.name,
+            state_history=list(map(lambda x: x.name, self.state_history)),
+            node_result=self.node_result.name if self.node_result is not None else None,
+            message=self.message.to_dict(),
+            vote_history=vh,
+        )
+
+
+class OffsetIndex:
+    '''
+    the hash table of the record offsets in the memory-mapped file; the entry
+    is the 8 bytes key of the name and the position of the record, `segment`
+    and `offset`. The table is open addressed, the same key can be put many
+    times, and it is built again with the double capacity, when it is half
+    full.
+
+        index = header + entry * capacity
+        entry = key(u64) + segment(u32) + offset(u32)
+
+    the header keeps the position of the log, up to which the records are
+    indexed and synced.
+    '''
+    class InvalidIndexError(Exception):
+        pass
+
+    MAGIC = b'MFBAIDX1'
+
+    header = struct.Struct('>8sQQIQQQQ')
+    header_size = 64
+    entry = struct.Struct('>QII')
+
+    path = None
+    file = None
+    buf = None
+    capacity = None
+    count = None
+
+    # the log position covered by the index, the number of the records, of
+    # the messages and the last slot
+    end_segment = None
+    end_offset = None
+    records = None
+    messages = None
+    last_slot = None
+
+    def __init__(self, path, capacity=DEFAULT_INDEX_CAPACITY):
+        assert capacity > 0 and capacity & (capacity - 1) == 0
+
+        self.path = path
+
+        if os.path.exists(path):
+            self.open()
+        else:
+            self.create(path, capacity)
+            self.open()
+
+    def __repr__(self):
+        return '<OffsetIndex: path=%(path)s capacity=%(capacity)d count=%(count)d records=%(records)d>' % self.__dict__
+
+    @classmethod
+    def create(cls, path, capacity, **header):
+        with open(path, 'wb') as f:
+            f.truncate(cls.header_size + capacity * cls.entry.size)
+            f.write(cls.pack_header(capacity, **header))
+
+        return
+
+    @classmethod
+    def pack_header(cls, capacity, count=0, end_segment=0, end_offset=0, records=0, messages=0, last_slot=0):
+        return cls.header.pack(cls.MAGIC, capacity, count, end_segment, end_offset, records, messages, last_slot)
+
+    def open(self):
+        self.file = open(self.path, 'r+b')
+        self.buf = mmap.mmap(self.file.fileno(), 0)
+
+        magic, capacity, count, end_segment, end_offset, records, messages, last_slot = self.header.unpack_from(self.buf, 0)
+        if magic != self.MAGIC or len(self.buf) != self.header_size + capacity * self.entry.size:
+            raise self.InvalidIndexError('broken index: %s' % self.path)
+
+        self.capacity = capacity
+        self.count = count
+        self.end_segment = end_segment
+        self.end_offset = end_offset
+        self.records = records
+        self.messages = messages
+        self.last_slot = last_slot
+
+        return
+
+    def write_header(self):
+        self.buf[:self.header.size] = self.pack_header(
+            self.capacity,
+            self.count,
+            self.end_segment,
+            self.end_offset,
+            self.records,
+            self.messages,
+            self.last_slot,
+        )
+
+        return
+
+    def get_entry(self, position):
+        return self.entry.unpack_from(self.buf, self.header_size + position * self.entry.size)
+
+    def iter_entries(self):
+        for position in range(self.capacity):
+            key, segment, offset = self.get_entry(position)
+            if key != 0:
+                yield key, segment, offset
+
+    def put(self, name, segment, offset):
+        if (self.count + 1) * 2 > self.capacity:
+            self.rebuild(self.capacity * 2)
+
+        self.put_key(get_index_key(name), segment, offset)
+
+        return
+
+    def put_key(self, key, segment, offset):
+        mask = self.capacity - 1
+        position = key & mask
+        while self.get_entry(position)[0] != 0:
+            position = (position + 1) & mask
+
+        self.entry.pack_into(self.buf, self.header_size + position * self.entry.size, key, segment, offset)
+        self.count += 1
+
+        return
+
+    def find(self, name):
+        '''
+        the positions of the records put by the name; the other name of the
+        same key also matches, so the record must be checked
+        '''
+        key = get_index_key(name)
+        mask = self.capacity - 1
+        position = key & mask
+        while True:
+            k, segment, offset = self.get_entry(position)
+            if k == 0:
+                break
+
+            if k == key:
+                yield segment, offset
+
+            position = (position + 1) & mask
+
+    def contains(self, name):
+        for _ in self.find(name):
+            return True
+
+        return False
+
+    def rebuild(self, capacity, keep=None):
+        '''
+        copy the entries to the new table; with `keep`, only the entries
+        which `keep(segment, offset)` returns true for
+        '''
+        entries = list(self.iter_entries())
+        if keep is not None:
+            entries = list(filter(lambda x: keep(x[1], x[2]), entries))
+
+        path = self.path + '.new'
+        self.create(
+            path,
+            capacity,
+            end_segment=self.end_segment,
+            end_offset=self.end_offset,
+            records=self.records,
+            messages=self.messages,
+            last_slot=self.last_slot,
+        )
+
+        self.close()
+        os.replace(path, self.path)
+        self.open()
+
+        for key, segment, offset in entries:
+            self.put_key(key, segment, offset)
+
+        # the new table was created with no entries
+        self.write_header()
+
+        log.storage.debug('index was rebuilt: %s', self)
+
+        return
+
+    def flush(self):
+        self.buf.flush()
+
+        return
+
+    def close(self):
+        if self.buf is not None:
+            self.buf.close()
+            self.buf = None
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        return
+
+
+class CommitLog:
+    '''
+    the append-only log of the committed ballots in `directory`; the log is
+    split into the segment files of `segment_size` bytes, and every record is
+    prefixed by it's length and checksum:
+
+        <directory>/<segment:08d>.log
+        record = length(u32) + crc32(u32) + body
+
+    the records are written to the file at once, so they survive the crash
+    of the process, but fsync'ed together, the group commit, after
+    `sync_interval` seconds by the timer of `loop`, or when `sync_bytes` are
+    not synced yet; the crash of the host loses the records, which were not
+    synced. The records are found by the slot,
+    `message_id` or `hash_id` in `OffsetIndex`, <directory>/index, and the
+    last `cache_size` records are kept in the memory.
+
+    at open, the records after the position of the index are indexed again,
+    and the broken record at the end of the last segment, which was written
+    partly, is cut off.
+    '''
+    class CorruptedLogError(Exception):
+        pass
+
+    record_header = struct.Struct('>II')
+
+    name = None
+    directory = None
+    loop = None
+    segment_size = None
+    sync_interval = None
+    sync_bytes = None
+    cache_size = None
+
+    index = None
+    segment = None
+    offset = None
+    file = None
+
+    # the entries of the records, which are not synced yet, by the name
+    unindexed = None
+    readers = None
+    cache = None
+
+    # bytes, records and messages, and the last slot of them, which are not
+    # fsync'ed yet; the header of the index counts only the synced records
+    unsynced = None
+    unsynced_records = None
+    unsynced_messages = None
+    unsynced_slot = None
+    sync_handle = None
+
+    metrics = None
+
+    def __init__(
+        self,
+        directory,
+        loop=None,
+        segment_size=DEFAULT_SEGMENT_SIZE,
+        sync_interval=DEFAULT_SYNC_INTERVAL,
+        sync_bytes=DEFAULT_SYNC_BYTES,
+        cache_size=DEFAULT_RECORD_CACHE_SIZE,
+        index_capacity=DEFAULT_INDEX_CAPACITY,
+        metrics=None,
+        name=None,
+    ):
+        assert segment_size > 0 and segment_size < 1 << 32
+        assert sync_interval is None or sync_interval >= 0
+        assert sync_bytes > 0
+        assert type(cache_size) is int and cache_size >= 0
+        assert metrics is None or isinstance(metrics, Metrics)
+
+        self.directory = directory
+        self.loop = loop
+        self.segment_size = segment_size
+        self.sync_interval = sync_interval
+        self.sync_bytes = sync_bytes
+        self.cache_size = cache_size
+        self.name = name if name is not None else os.path.basename(directory)
+
+        # the appended records and bytes, the fsyncs with the time of them
+        self.metrics = metrics if metrics is not None else Metrics(self.name)
+        self.appended_records = self.metrics.counter('log.records')
+        self.appended_bytes = self.metrics.counter('log.bytes')
+        self.syncs = self.metrics.counter('log.syncs')
+        self.sync_time = self.metrics.histogram('log.sync')
+        self.cache_hits = self.metrics.counter('log.cache_hits')
+        self.cache_misses = self.metrics.counter('log.cache_misses')
+
+        self.readers = dict()
+        self.cache = collections.OrderedDict()
+        self.unindexed = dict()
+        self.unsynced = 0
+        self.unsynced_records = 0
+        self.unsynced_messages = 0
+        self.unsynced_slot = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.index = OffsetIndex(os.path.join(directory, 'index'), capacity=index_capacity)
+        self.recover()
+
+    def __repr__(self):
+        return '<CommitLog: directory=%s segment=%d offset=%d records=%d>' % (
+            self.directory,
+            self.segment,
+            self.offset,
+            self.records,
+        )
+
+    def __len__(self):
+        return self.records
+
+    @property
+    def records(self):
+        return self.index.records + self.unsynced_records
+
+    @property
+    def messages(self):
+        return self.index.messages + self.unsynced_messages
+
+    @property
+    def last_slot(self):
+        return max(self.index.last_slot, self.unsynced_slot)
+
+    def get_segment_path(self, segment):
+        return os.path.join(self.directory, '%08d.log' % segment)
+
+    def get_segments(self):
+        segments = list()
+        for name in os.listdir(self.directory):
+            if name.endswith('.log') and name[:-4].isdigit():
+                segments.append(int(name[:-4]))
+
+        return sorted(segments)
+
+    def recover(self):
+        '''
+        index the records after the position of the index, the tail, which
+        was written after the last sync; the time does not depend on the
+        length of the log.
+
+        the entries of the records are put to the index only after the
+        records are synced, so the index never points to the records, which
+        were lost by the crash
+        '''
+        segments = self.get_segments()
+        if len(segments) < 1:
+            segments = [0]
+
+        end = (self.index.end_segment, self.index.end_offset)
+        path = self.get_segment_path(end[0])
+        if end != (0, 0) and (not os.path.exists(path) or os.path.getsize(path) < end[1]):
+            log.storage.error('%s: log is shorter than the index, index is built again', self.name)
+
+            end = (0, 0)
+            self.index.end_segment, self.index.end_offset = end
+            self.index.records = self.index.messages = self.index.last_slot = 0
+            self.index.rebuild(self.index.capacity, keep=lambda segment, offset: False)
+
+        last = segments[-1]
+        tail = 0
+        for segment, offset, record in self.iter_tail(end, truncate=True):
+            self.index_record(record, segment, offset, replay=True)
+            tail += 1
+
+        if tail > 0:
+            log.storage.debug('%s: %d records after the last sync were indexed', self.name, tail)
+
+        self.segment = last
+        self.file = open(self.get_segment_path(last), 'ab', buffering=0)
+        self.offset = self.file.tell()
+
+        self.index.end_segment = self.segment
+        self.index.end_offset = self.offset
+
+        # the tail is synced, so it is not indexed again at the next open
+        if tail > 0:
+            os.fsync(self.file.fileno())
+            self.index.write_header()
+            self.index.flush()
+
+        log.storage.debug('%s: log was opened: %s', self.name, self)
+
+        return
+
+    def scan(self, segment, offset=0, truncate=False):
+        '''
+        the records of the segment from `offset` with their offsets; with
+        `truncate`, the broken record at the end is cut off, otherwise it
+        raises `CorruptedLogError`
+        '''
+        path = self.get_segment_path(segment)
+        if not os.path.exists(path):
+            return
+
+        with open(path, 'r+b') as f:
+            size = os.fstat(f.fileno()).st_size
+            f.seek(offset)
+            while offset < size:
+                body = self.read_record(f, size - offset)
+                if body is None:
+                    if not truncate:
+                        raise self.CorruptedLogError('broken record: %s at %d' % (path, offset))
+
+                    log.storage.error('%s: broken record at the end of %s is cut off at %d', self.name, path, offset)
+                    f.truncate(offset)
+                    os.fsync(f.fileno())
+
+                    break
+
+                yield offset, body
+                offset += self.record_header.size + len(body)
+
+    def read_record(self, f, available):
+        '''
+        the body of the record at the position of `f`; `None` if the record is
+        not whole or the checksum does not match
+        '''
+        if available < self.record_header.size:
+            return None
+
+        length, checksum = self.record_header.unpack(f.read(self.record_header.size))
+        if length > available - self.record_header.size:
+            return None
+
+        body = f.read(length)
+        if zlib.crc32(body) != checksum:
+            return None
+
+        return body
+
+    def index_record(self, record, segment, offset, replay=False):
+        '''
+        the entries and the counts of the appended record wait in the memory
+        until the record is synced; the replayed record is already synced
+        '''
+        if not replay:
+            for name in record.get_names():
+                self.unindexed.setdefault(name, list()).append((segment, offset))
+
+            self.unsynced_messages += len(record.get_messages())
+            self.unsynced_slot = max(self.unsynced_slot, record.slot)
+
+            return
+
+        for name in record.get_names():
+            # the entry of the tail may be already put before the crash
+            if (segment, offset) in self.index.find(name):
+                continue
+
+            self.index.put(name, segment, offset)
+
+        self.index.records += 1
+        self.index.messages += len(record.get_messages())
+        self.index.last_slot = max(self.index.last_slot, record.slot)
+
+        return
+
+    def append(self, ballot):
+        '''
+        append the committed ballot; the record is durable after the next
+        `sync`
+        '''
+        record = CommitRecord.from_ballot(ballot)
+        body = record.pack()
+        size = self.record_header.size + len(body)
+
+        if self.offset > 0 and self.offset + size > self.segment_size:
+            self.roll()
+
+        self.write(self.record_header.pack(len(body), zlib.crc32(body)) + body)
+
+        segment, offset = self.segment, self.offset
+        self.offset += size
+        self.index_record(record, segment, offset)
+        self.cache_record((segment, offset), record)
+
+        self.appended_records.inc()
+        self.appended_bytes.inc(size)
+        self.unsynced += size
+        self.unsynced_records += 1
+
+        if self.unsynced >= self.sync_bytes:
+            self.sync()
+        elif self.sync_handle is None and self.loop is not None and self.sync_interval is not None:
+            self.sync_handle = self.loop.call_later(self.sync_interval, self.sync)
+
+        return record
+
+    def write(self, data):
+        '''
+        the segment file is not buffered, so the record survives the crash of
+        the process; the raw file may write only the part of the data
+        '''
+        view = memoryview(data)
+        while len(view) > 0:
+            view = view[self.file.write(view):]
+
+        return
+
+    def roll(self):
+        '''
+        seal the current segment and start the next one
+        '''
+        self.sync()
+        self.file.close()
+
+        self.segment += 1
+        self.file = open(self.get_segment_path(self.segment), 'ab', buffering=0)
+        self.offset = 0
+
+        log.storage.debug('%s: new segment: %s', self.name, self)
+
+        return
+
+    def sync(self):
+        '''
+        fsync the appended records at once, and then the index, which covers
+        them
+        '''
+        if self.sync_handle is not None:
+            self.sync_handle.cancel()
+            self.sync_handle = None
+
+        if self.unsynced_records < 1:
+            return
+
+        started_at = self.metrics.now()
+        os.fsync(self.file.fileno())
+
+        self.index.records += self.unsynced_records
+        self.index.messages += self.unsynced_messages
+        self.index.last_slot = max(self.index.last_slot, self.unsynced_slot)
+
+        for name, positions in self.unindexed.items():
+            for segment, offset in positions:
+                self.index.put(name, segment, offset)
+        self.unindexed = dict()
+
+        self.index.end_segment = self.segment
+        self.index.end_offset = self.offset
+        self.index.write_header()
+        self.index.flush()
+
+        self.sync_time.observe(self.metrics.now() - started_at)
+        self.syncs.inc()
+
+        log.storage.debug('%s: %d records were synced', self.name, self.unsynced_records)
+        self.unsynced = 0
+        self.unsynced_records = 0
+        self.unsynced_messages = 0
+        self.unsynced_slot = 0
+
+        return
+
+    def cache_record(self, position, record):
+        if self.cache_size < 1:
+            return
+
+        self.cache[position] = record
+        self.cache.move_to_end(position)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return
+
+    def get_reader(self, segment):
+        reader = self.readers.get(segment)
+        if reader is None:
+            # a few segments are kept open to read
+            while len(self.readers) >= 4:
+                self.readers.pop(next(iter(self.readers))).close()
+
+            reader = self.readers[segment] = open(self.get_segment_path(segment), 'rb')
+
+        return reader
+
+    def read(self, segment, offset):
+        position = (segment, offset)
+        record = self.cache.get(position)
+        if record is not None:
+            self.cache.move_to_end(position)
+            self.cache_hits.inc()
+
+            return record
+
+        self.cache_misses.inc()
+
+        reader = self.get_reader(segment)
+        reader.seek(offset)
+        body = self.read_record(reader, os.fstat(reader.fileno()).st_size - offset)
+        if body is None:
+            raise self.CorruptedLogError('broken record: %s at %d' % (self.get_segment_path(segment), offset))
+
+        try:
+            record = CommitRecord.unpack(body)
+        except (InvalidFrameError, AttributeError, KeyError, ValueError) as e:
+            raise self.CorruptedLogError('broken record: %s at %d: %s' % (self.get_segment_path(segment), offset, e))
+
+        self.cache_record(position, record)
+
+        return record
+
+    def find(self, name, match):
+        '''
+        the records put by the name in the index, which `match` returns true
+        for
+        '''
+        for segment, offset in self.find_positions(name):
+            record = self.read(segment, offset)
+            if match(record):
+                yield record
+
+    def find_positions(self, name):
+        yield from self.index.find(name)
+        yield from self.unindexed.get(name, ())
+
+    def get_slot(self, slot):
+        for record in self.find('s%d' % slot, lambda x: x.slot == slot):
+            return record
+
+        return None
+
+    def get_message(self, message_id):
+        '''
+        the record of the message, or of the batch of it
+        '''
+        match = lambda x: x.message.message_id == message_id or any(map(
+            lambda m: m.message_id == message_id,
+            x.get_messages(),
+        ))
+        for record in self.find('m%s' % message_id, match):
+            return record
+
+        return None
+
+    def get_by_hash(self, hash_id):
+        match = lambda x: any(map(lambda m: m.hash_id == hash_id, x.get_messages()))
+
+        return list(self.find('h%s' % hash_id, match))
+
+    def contains(self, name):
+        '''
+        only the key of the name is compared in the index, so the other name
+        of the same 8 bytes key matches
+        '''
+        return name in self.unindexed or self.index.contains(name)
+
+    def iter_records(self):
+        '''
+        every record in the order of the log
+        '''
+        for _, _, record in self.iter_tail((0, 0)):
+            yield record
+
+    def iter_tail(self, position, truncate=False):
+        '''
+        the records from the position, `(segment, offset)`, with their
+        positions; with `truncate`, the broken record at the end of the last
+        segment is cut off
+        '''
+        segments = self.get_segments()
+        for segment in filter(lambda x: x >= position[0], segments):
+            offset = position[1] if segment == position[0] else 0
+            for offset, body in self.scan(segment, offset, truncate=truncate and segment == segments[-1]):
+                yield segment, offset, CommitRecord.unpack(body)
+
+    @property
+    def is_closed(self):
+        return self.file is None
+
+    @property
+    def position(self):
+        '''
+        the end of the log, where the next record is appended
+        '''
+        return (self.segment, self.offset)
+
+    def close(self):
+        if self.file is None:
+            return
+
+        self.sync()
+        self.file.close()
+        self.file = None
+
+        for reader in self.readers.values():
+            reader.close()
+        self.readers = dict()
+        self.cache = collections.OrderedDict()
+
+        self.index.close()
+
+        log.storage.debug('%s: log was closed', self.name)
+
+        return
@@ -1,239 +1,1460 @@
-import json
+import asyncio
+import os
 
 from ..network import (
     BaseTransport,
+    Batch,
     Message,
+    MessageDigest,
     Node,
     Quorum,        
+    VerifiedHashes,
 )
 
 from ..common import (
     log,
+    Metrics,
+    popcount,
 )
 
-from .ballot import Ballot, BallotMessage, BallotVoteResult
+from .ballot import Ballot, BallotMessage, BallotVoteResult, proposal_key
+from .certificate import VoteCertificate
+from .commit_log import DEFAULT_SYNC_INTERVAL, CommitLog
+from .fetch import MessageRequest, MessageResponse, SlotRequest
+from .message_cache import DEFAULT_CACHE_SIZE, MessageCache
+from .snapshot import DEFAULT_SNAPSHOT_INTERVAL, BallotSnapshot, Snapshot
 from .state import State
 from .storage import Storage
+from .validator import DEFAULT_VALIDATION_BATCH_SIZE, ValidationPool, Validator
+
+# number of slots which can be in consensus at the same time
+DEFAULT_WINDOW = 4
+
+# by default every message gets it's own ballot
+DEFAULT_MAX_BATCH_SIZE = 1
+
+# seconds to wait for the next state before the vote is sent again; the wait
+# is doubled by every resend up to `DEFAULT_MAX_STATE_TIMEOUT`
+DEFAULT_STATE_TIMEOUT = 1
+DEFAULT_MAX_STATE_TIMEOUT = 16
+
+# number of the resends in a state before the next round starts with the
+# next aggregator, or the own proposal, which nobody voted for, is aborted
+DEFAULT_MAX_RETRIES = 3
+
 
 class FBAConsensus:
     name = None
     quorum = None
-    ballot = None
+    ballots = None
+    window = None
+    committed_slot = None
+    last_slot = None
+    ahead = None
 
-    storage = None
+    max_batch_size = None
+    max_batch_bytes = None
+    max_batch_delay = None
+    batch_timer = None
 
-    def __init__(self, node, quorum, transport):
+    storage = None
+    handlers = None
+
+    send_digests = None
+    message_cache = None
+    fetching = None
+    fetch_timers = None
+
+    aggregate = None
+
+    state_timeout = None
+    max_state_timeout = None
+    max_retries = None
+
+    validation = None
+    verified_hashes = None
+
+    metrics = None
+    sent_at = None
+    commit_callbacks = None
+
+    snapshot_interval = None
+    snapshot_handle = None
+    recovered_slot = None
+
+    def __init__(
+        self,
+        node,
+        quorum,
+        transport,
+        loop=None,
+        window=DEFAULT_WINDOW,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        max_batch_bytes=None,
+        max_batch_delay=None,
+        send_digests=True,
+        cache_size=DEFAULT_CACHE_SIZE,
+        aggregate=False,
+        state_timeout=DEFAULT_STATE_TIMEOUT,
+        max_state_timeout=DEFAULT_MAX_STATE_TIMEOUT,
+        max_retries=DEFAULT_MAX_RETRIES,
+        validator=None,
+        executor=None,
+        validation_batch_size=DEFAULT_VALIDATION_BATCH_SIZE,
+        log_directory=None,
+        log_sync_interval=DEFAULT_SYNC_INTERVAL,
+        snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL,
+        metrics=None,
+    ):
         assert isinstance(node, Node)
         assert isinstance(quorum, Quorum)
         assert isinstance(transport, BaseTransport)
+        assert type(window) is int and window > 0
+        assert type(max_batch_size) is int and max_batch_size > 0
+        assert max_batch_bytes is None or max_batch_bytes > 0
+        assert max_batch_delay is None or max_batch_delay >= 0
+        assert state_timeout is None or state_timeout > 0
+        assert max_state_timeout is None or state_timeout is None or max_state_timeout >= state_timeout
+        assert type(max_retries) is int and max_retries >= 0
+        assert validator is None or isinstance(validator, Validator)
+        assert snapshot_interval is None or snapshot_interval > 0
+        assert metrics is None or isinstance(metrics, Metrics)
 
         self.node = node
         self.quorum = quorum
         self.transport = transport
-        self.storage = Storage(self.node)
+        self.loop = loop if loop is not None else asyncio.get_event_loop()
+
+        # the counters, the gauges and the latencies of the node are shared
+        # with the ballots and the storage; `sent_at` is the time, when the
+        # message was sent by the client, by `message_id`
+        self.metrics = metrics if metrics is not None else Metrics(node.name, clock=self.loop.time)
+        self.votes_in = self.metrics.counter('consensus.votes_in')
+        self.votes_out = self.metrics.counter('consensus.votes_out')
+        self.certificates_in = self.metrics.counter('consensus.certificates_in')
+        self.rejected = self.metrics.counter('consensus.rejected')
+        self.resends = self.metrics.counter('consensus.resends')
+        self.answers = self.metrics.counter('consensus.answers')
+        self.queries = self.metrics.counter('consensus.queries')
+        self.fetches = self.metrics.counter('consensus.fetches')
+        self.rounds = self.metrics.counter('consensus.rounds')
+        self.aborts = self.metrics.counter('consensus.aborts')
+        self.ballots_in_consensus = self.metrics.gauge('consensus.ballots')
+        self.commit_latency = self.metrics.histogram('consensus.commit')
+        self.sent_at = dict()
+
+        # called with the consensus and the ballot, when the slot is committed
+        self.commit_callbacks = list()
+
+        # with `log_directory`, the committed ballots are appended to the log
+        # in it's directory of the node, and fsync'ed together every
+        # `log_sync_interval` seconds
+        commit_log = None
+        if log_directory is not None:
+            commit_log = CommitLog(
+                os.path.join(log_directory, self.node.name),
+                loop=self.loop,
+                sync_interval=log_sync_interval,
+                metrics=self.metrics,
+                name=self.node.name,
+            )
+
+        self.storage = Storage(self.node, metrics=self.metrics, commit_log=commit_log)
+
+        # with the commit log, the pending messages and the ballots in
+        # consensus are written to the snapshot every `snapshot_interval`
+        # seconds, while the slots are committed, and when it stops
+        self.snapshot_interval = snapshot_interval
+        self.snapshots = self.metrics.counter('storage.snapshots')
+        self.snapshot_time = self.metrics.histogram('storage.snapshot')
+        self.replayed = self.metrics.counter('storage.replayed')
+
+        self.window = window
+
+        # the pending messages are proposed in a batch, up to `max_batch_size`
+        # messages or `max_batch_bytes` bytes; with `max_batch_delay`(seconds),
+        # the batch waits for more messages until it is full
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_delay = max_batch_delay
+        self.batch_timer = None
+
+        # with `send_digests`, the message is carried only by the ballot
+        # messages of `init` state, the ballot messages of the later states
+        # have it's digest; the missing message is fetched from the sender.
+        self.send_digests = send_digests
+        self.message_cache = MessageCache(cache_size)
+
+        # the ballot messages waiting for the fetched message, by `message_id`
+        self.fetching = dict()
+
+        # the retry timer of the request by `message_id`; the request or the
+        # response could be lost, so it is requested again from the next
+        # sender of the digest after `state_timeout`
+        self.fetch_timers = dict()
+
+        # with `aggregate`, the votes are sent only to the aggregator of the
+        # slot and the aggregator broadcasts the `VoteCertificate` of the
+        # state, instead of every validator broadcasting it's vote
+        self.aggregate = aggregate
+
+        # without the new votes in `state_timeout`(seconds), the vote of the
+        # current state is sent again with the doubled wait, up to
+        # `max_state_timeout`; after `max_retries` resends, the next round
+        # starts and the own proposal, which nobody voted for, goes back to
+        # pending. `None` turns off the timers.
+        self.state_timeout = state_timeout
+        self.max_state_timeout = max_state_timeout if max_state_timeout is not None else state_timeout
+        self.max_retries = max_retries
+
+        # the messages are validated by `validator`; with `executor`, a
+        # `concurrent.futures.Executor`, the validation runs in the workers
+        # and the vote of the node waits for the verdict
+        self.validation = ValidationPool(
+            validator if validator is not None else Validator(),
+            self.loop,
+            executor=executor,
+            batch_size=validation_batch_size,
+            callback=self._handle_verdicts,
+        )
+
+        # the data of the received messages is hashed once by the node
+        self.verified_hashes = VerifiedHashes()
+
+        # ballots in consensus, keyed by slot number; `slot_index` maps
+        # `message_id` of the ballot message to it's slot
+        self.ballots = dict()
+        self.slot_index = dict()
+
+        # the slots are committed in order, `committed_slot` is the last
+        # committed one and `last_slot` is the highest known slot
+        self.committed_slot = 0
+        self.last_slot = 0
+
+        # the highest slot known at the restart; the slots up to it, which
+        # lost their ballots, are filled by the new proposals
+        self.recovered_slot = 0
 
-        self.ballot = Ballot(self.node, State.none, None)
-        self.ballot.change_state(State.init)
+        # the ballot messages and the certificates of the slots beyond the
+        # window by the slot, they are handled when the window reaches them
+        self.ahead = dict()
+
+        self.handlers = dict()
+        self.register_handler(Message, self._handle_message)
+        self.register_handler(BallotMessage, self._handle_ballot_message)
+        self.register_handler(MessageRequest, self._handle_message_request)
+        self.register_handler(MessageResponse, self._handle_message_response)
+        self.register_handler(VoteCertificate, self._handle_vote_certificate)
+        self.register_handler(SlotRequest, self._handle_slot_request)
+
+        # the node restarts from the snapshot and the commit log
+        if commit_log is not None:
+            self.recover()
 
         log.consensus.debug(
-            '%s: initially set state to %s',
-            self.node.name, self.ballot.state,
+            '%s: initially set window to %d',
+            self.node.name, self.window,
         )
 
     def __repr__(self):
         return '<Consensus: node=%(node)s quorum=%(quorum)s transport=%(transport)s>' % self.__dict__
 
     def validate_message(self, message):
-        assert isinstance(message, Message)
+        '''
+        `None` while the message is validated by the workers
+        '''
+        assert isinstance(message, (Message, Batch))
+
+        # the batch is valid only if all the messages are valid
+        return self.validation.get_verdicts(message)
+
+    def get_vote_result(self, message):
+        is_validated = self.validate_message(message)
+        if is_validated is None:
+            return None
+
+        if is_validated:
+            return BallotVoteResult.agree
+
+        return BallotVoteResult.disagree
 
-        # TODO implement
-        is_validated = True
+    def register_commit_callback(self, callback):
+        self.commit_callbacks.append(callback)
 
-        return is_validated
+        return
+
+    def unregister_commit_callback(self, callback):
+        if callback in self.commit_callbacks:
+            self.commit_callbacks.remove(callback)
+
+        return
+
+    def register_handler(self, message_class, handler):
+        '''
+        the received message is handled by the handler of it's `type_name`
+        '''
+        self.handlers[message_class.type_name] = handler
+
+        return
 
     def receive(self, data):
         log.consensus.debug('%s: received data: %s', self.node.name, data)
 
         try:
-            loaded = load_message(data)
+            loaded = self.transport.codec.decode(data)
         except Message.InvalidMessageError as e:
             log.consensus.error('unknown data was received: %s', e)
+            self.rejected.inc()
             return
-        else:
-            log.consensus.debug('%s: received data is %s', self.node.name, loaded)
-            if not isinstance(loaded, (Message, BallotMessage)):
-                log.consensus.debug('%s: unknown instance found, `%s`', self.node.name, loaded)
-                return
 
-        if self.storage.is_exists(loaded.get_message()):
+        log.consensus.debug('%s: received data is %s', self.node.name, loaded)
+
+        handler = self.handlers.get(loaded.type_name)
+        if handler is None:
+            log.consensus.debug('%s: unknown instance found, `%s`', self.node.name, loaded)
+            return
+
+        message = loaded.get_message()
+        if message is not None and self.storage.is_exists(message):
             log.consensus.debug('%s: already stored: %s', self.node.name, loaded)
 
+            # the sender is still waiting for the committed slot
+            if isinstance(loaded, BallotMessage) and loaded.resent:
+                self.answer(loaded)
+
+            return
+
+        try:
+            loaded.verify(self.verified_hashes)
+        except Message.InvalidMessageError as e:
+            log.consensus.error('%s: invalid message was received: %s', self.node.name, e)
+            self.rejected.inc()
             return
 
-        if isinstance(loaded, Message):
-            return self._handle_message(loaded)
+        return handler(loaded)
 
-        if isinstance(loaded, BallotMessage):
-            return self._handle_ballot_message(loaded)
+    def get_ballot_message(self, ballot):
+        # every validator got the message by the ballot messages of `init`
+        return ballot.get_ballot_message(
+            digest=self.send_digests and ballot.state != State.init,
+        )
 
-    def broadcast(self, ballot_message, skip_nodes=None):
+    def send_to_validators(self, message, skip_nodes=None):
         assert type(skip_nodes) in (list, tuple) if skip_nodes is not None else True
 
+        data = self.transport.codec.encode(message)
+
         for node in self.quorum.validators:
             if skip_nodes is not None and node in skip_nodes:
                 continue
 
             self.transport.send(
                 node.endpoint,
-                ballot_message,
+                data,
             )
 
-        self.ballot.is_broadcasted = True
+        return
+
+    def broadcast(self, ballot, skip_nodes=None):
+        ballot_message = self.get_ballot_message(ballot)
+        log.consensus.debug('%s: broadcast ballot_message: %s', self.node.name, ballot_message)
+
+        self.send_to_validators(ballot_message, skip_nodes=skip_nodes)
+        self.votes_out.inc()
+
+        ballot.is_broadcasted = True
 
         return
 
-    def _handle_message(self, message):
-        assert message.node is not None
+    def get_aggregator(self, slot, round=0):
+        '''
+        the name of the aggregator of the slot; the aggregator rotates over the
+        members by slot and round, so the next round does not wait for the
+        failed aggregator
+        '''
+        indices = self.quorum.member_indices
 
-        log.consensus.debug('%s: received message: %s', self.node.name, message)
+        return self.quorum.name_of(indices[(slot + round) % len(indices)])
 
-        if self.ballot.state != State.init:
-            log.consensus.debug(
-                '%s: ballot state is not `init`, this message will be in stacked in pending storage',
-                self.node.name,
-                message,
+    def is_aggregator(self, slot, round=0):
+        return self.get_aggregator(slot, round) == self.node.name
+
+    def cast_vote(self, ballot):
+        '''
+        send the vote of the node; without `aggregate`, it is broadcasted
+        '''
+        if not self.aggregate:
+            self.broadcast(ballot)
+
+            return
+
+        ballot.is_broadcasted = True
+
+        # the aggregator counts it's own vote
+        if self.is_aggregator(ballot.slot, ballot.round):
+            return
+
+        # the aggregator got the message by the proposal
+        node = self.quorum.get(self.get_aggregator(ballot.slot, ballot.round))
+        ballot_message = ballot.get_ballot_message(digest=self.send_digests)
+        log.consensus.debug('%s: send vote to aggregator, %s: %s', self.node.name, node, ballot_message)
+
+        self.transport.send(node.endpoint, self.transport.codec.encode(ballot_message))
+        self.votes_out.inc()
+
+        return
+
+    def certify(self, ballot, state):
+        '''
+        broadcast the votes of the state, which passed the threshold
+        '''
+        member_mask = self.quorum.member_mask
+        _, agreed, disagreed = ballot.votes[state.value]
+
+        certificate = VoteCertificate(
+            self.node,
+            state,
+            MessageDigest.of(ballot.message) if self.send_digests else ballot.message,
+            agreed & member_mask,
+            disagreed & member_mask,
+            self.quorum.membership,
+            slot=ballot.slot,
+            round=ballot.round,
+        )
+        log.consensus.debug('%s: broadcast certificate: %s', self.node.name, certificate)
+
+        self.send_to_validators(certificate)
+
+        return
+
+    def new_ballot(self, slot):
+        assert slot > self.committed_slot
+        assert slot not in self.ballots
+
+        ballot = Ballot(self.node, State.none, None, slot=slot, metrics=self.metrics)
+        ballot.change_state(State.init)
+
+        self.ballots[slot] = ballot
+        self.last_slot = max(self.last_slot, slot)
+        self.ballots_in_consensus.set(len(self.ballots))
+
+        log.consensus.debug('%s: new ballot for slot %d', self.node.name, slot)
+
+        # even the empty ballot asks the validators by the timer
+        self.watch(ballot)
+        self.open_next_slot()
+
+        return ballot
+
+    def open_next_slot(self):
+        '''
+        the later slots wait for the next slot to commit; when all of it's
+        ballot messages were lost, the empty ballot is opened, so it's timer
+        asks the validators for the slot
+        '''
+        slot = self.committed_slot + 1
+        if self.state_timeout is None or slot in self.ballots or slot <= self.recovered_slot:
+            return
+
+        if self.last_slot <= slot and len(self.ahead) < 1:
+            return
+
+        log.consensus.debug('%s: slot %d: open the missing slot', self.node.name, slot)
+        self.new_ballot(slot)
+
+        return
+
+    def set_ballot_message(self, ballot, message):
+        ballot.set_message(message)
+        self.index_message(ballot.slot, message)
+
+        return
+
+    def index_message(self, slot, message):
+        self.message_cache.add(message)
+        self.slot_index[message.message_id] = slot
+
+        for m in message.get_messages():
+            self.slot_index[m.message_id] = slot
+
+            # the message is already in consensus by the other validators
+            self.storage.remove_pending(m)
+
+        return
+
+    def unindex_message(self, message):
+        self.slot_index.pop(message.message_id, None)
+        for m in message.get_messages():
+            self.slot_index.pop(m.message_id, None)
+
+        return
+
+    def is_in_consensus(self, message, slot=None):
+        '''
+        with `slot`, the message in the slot is not counted
+        '''
+        if self.slot_index.get(message.message_id, slot) != slot:
+            return True
+
+        for m in message.get_messages():
+            if self.slot_index.get(m.message_id, slot) != slot:
+                return True
+
+        return False
+
+    def replace_message(self, ballot, message, round=None):
+        '''
+        take the other message in the same round or start the next round with
+        the message; the own proposal keeps it's slot until the slot is
+        committed
+        '''
+        if ballot.is_empty():
+            if round is not None:
+                ballot.round = round
+
+            self.set_ballot_message(ballot, message)
+
+            return
+
+        if ballot.message != ballot.proposal:
+            self.unindex_message(ballot.message)
+
+        if round is None:
+            ballot.switch_message(message)
+        else:
+            ballot.change_round(round, message)
+
+        self.index_message(ballot.slot, message)
+
+        return
+
+    def change_round(self, ballot):
+        '''
+        the ballot can not pass the threshold by the conflicting votes; the
+        next round starts with the lowest of the messages
+        '''
+        message = ballot.message
+        for m, _ in ballot.others.values():
+            if proposal_key(m) < proposal_key(message) and not self.is_in_consensus(m, ballot.slot):
+                message = m
+
+        self.replace_message(ballot, message, round=ballot.round + 1)
+        self.rounds.inc()
+
+        # without the verdict, the vote is cast when the message is validated
+        ballot.node_result = self.get_vote_result(message)
+        if ballot.node_result is not None:
+            ballot.vote(self.node, ballot.node_result, State.init)
+
+            # the message is sent again, the validators may not have it
+            self.broadcast(ballot)
+
+        self.watch(ballot)
+
+        return
+
+    def watch(self, ballot):
+        '''
+        start the liveness timer of the current state of the ballot; the timer
+        of the same state keeps running
+        '''
+        if self.state_timeout is None:
+            return
+
+        if ballot.state == State.all_confirm or self.ballots.get(ballot.slot) is not ballot:
+            self.unwatch(ballot)
+
+            return
+
+        timer_state = (ballot.round, ballot.state)
+        if ballot.timer is not None and ballot.timer_state == timer_state:
+            if ballot.received != ballot.timer_received:
+                ballot.timer_received = ballot.received
+                ballot.received_at = self.loop.time()
+
+            return
+
+        self.unwatch(ballot)
+
+        ballot.timer_state = timer_state
+        ballot.timer_received = ballot.received
+        ballot.received_at = ballot.timer_at = self.loop.time()
+        ballot.retries = 0
+        ballot.timer = self.loop.call_later(self.state_timeout, self._expire_state, ballot)
+
+        return
+
+    def unwatch(self, ballot):
+        if ballot.timer is not None:
+            ballot.timer.cancel()
+            ballot.timer = None
+
+        return
+
+    def _expire_state(self, ballot):
+        ballot.timer = None
+
+        if ballot.state == State.all_confirm or self.ballots.get(ballot.slot) is not ballot:
+            return
+
+        # the votes are still coming after the timer was started, the node is
+        # just slow; the timer waits again from the last vote
+        if ballot.received_at > ballot.timer_at:
+            ballot.timer_at = self.loop.time()
+            ballot.timer = self.loop.call_later(
+                self.get_state_timeout(ballot) - (ballot.timer_at - ballot.received_at),
+                self._expire_state,
+                ballot,
             )
-            self.storage.add_pending(message.copy())
 
             return
 
-        if self.ballot.state == State.init:
-            if self.ballot.is_empty():
-                self.ballot.set_message(message.copy())
-            else:
-                self.storage.add_pending(message.copy())
+        ballot.retries += 1
+        if ballot.retries == self.max_retries + 1:
+            log.consensus.warning(
+                '%s: slot %d: no progress in round %d, %s',
+                self.node.name, ballot.slot, ballot.round, ballot.state.name,
+            )
+
+        # the votes could be split over the messages, which can not pass the
+        # threshold anymore; the next round starts over from the lowest of
+        # them, and with `aggregate`, it changes the aggregator. The empty
+        # ballot keeps asking for the slot.
+        if ballot.retries > self.max_retries and not ballot.is_empty():
+            if self.is_abandoned(ballot):
+                self.abort(ballot)
 
                 return
 
-        result = BallotVoteResult.disagree
-        if self.validate_message(message):
+            self.change_round(ballot)
+
+            return
+
+        log.consensus.debug(
+            '%s: slot %d: resend the vote of %s, %d',
+            self.node.name, ballot.slot, ballot.state.name, ballot.retries,
+        )
+        self.resend(ballot)
+
+        ballot.timer_at = self.loop.time()
+        ballot.timer = self.loop.call_later(self.get_state_timeout(ballot), self._expire_state, ballot)
+
+        return
+
+    def get_state_timeout(self, ballot):
+        '''
+        the wait is doubled by every resend
+        '''
+        return min(self.state_timeout * 2 ** min(ballot.retries, 32), self.max_state_timeout)
+
+    def resend(self, ballot):
+        '''
+        the vote of the current state is sent again, even with `aggregate`;
+        the first resend goes to the validators, which vote was not received,
+        and the next ones go to all the validators. The validators, which are
+        not behind, answer with their votes. Without the vote of the node, the
+        empty ballot or the message waiting for the verdict, the validators
+        are asked for the slot by `SlotRequest`.
+        '''
+        if ballot.is_empty() or ballot.node_result is None:
+            self.queries.inc()
+
+            data = self.transport.codec.encode(
+                SlotRequest(self.node, ballot.state, slot=ballot.slot, round=ballot.round),
+            )
+        else:
+            self.resends.inc()
+
+            ballot_message = ballot.get_ballot_message(
+                digest=self.send_digests and ballot.state != State.init,
+                resent=True,
+            )
+            data = self.transport.codec.encode(ballot_message)
+
+        seen = 0
+        if ballot.retries < 2:
+            seen = ballot.votes.get(ballot.state.value, (0, 0, 0))[0]
+
+        for node in self.quorum.validators:
+            if (seen >> self.quorum.index_of(node)) & 1:
+                continue
+
+            self.transport.send(node.endpoint, data)
+
+        return
+
+    def answer(self, ballot_message):
+        '''
+        answer the resent ballot message or `SlotRequest`, when the node is not
+        behind the sender; the committed or confirmed slot is answered by the
+        vote of `all_confirm`, the later round by the vote of it's current
+        state
+        '''
+        node = self.quorum.get(ballot_message.node.name)
+        if node is None or node.name == self.node.name:
+            return
+
+        slot = ballot_message.slot
+        if slot <= self.committed_slot:
+            committed = self.storage.get_slot(slot)
+            if committed is None:
+                return
+
+            message, round = committed
+            state = State.all_confirm
             result = BallotVoteResult.agree
+        else:
+            ballot = self.ballots.get(slot)
+            if ballot is None or ballot.is_empty() or ballot.node_result is None:
+                return
+
+            if (ballot.round, ballot.state) < (ballot_message.round, ballot_message.state):
+                return
+
+            message, round, state, result = ballot.message, ballot.round, ballot.state, ballot.node_result
+            if state == State.all_confirm:
+                result = BallotVoteResult.agree
+
+            # in the same round, the sender waits for the vote of it's state,
+            # which was already cast by the node
+            elif round == ballot_message.round:
+                state = ballot_message.state
+
+        answer = BallotMessage(
+            self.node,
+            state,
+            MessageDigest.of(message) if self.send_digests and state != State.init else message,
+            result,
+            slot=slot,
+            round=round,
+        )
+        log.consensus.debug('%s: answer to %s: %s', self.node.name, node, answer)
+
+        self.transport.send(node.endpoint, self.transport.codec.encode(answer))
+        self.answers.inc()
+
+        return
+
+    def is_abandoned(self, ballot):
+        '''
+        nobody voted for the own proposal in the last slot
+        '''
+        if ballot.proposal is None or ballot.message != ballot.proposal or len(ballot.others) > 0:
+            return False
+
+        if ballot.state != State.init or ballot.round > 0 or ballot.slot != self.last_slot:
+            return False
+
+        seen = ballot.votes.get(State.init.value, (0, 0, 0))[0]
+
+        return seen == 1 << self.quorum.index_of(self.node)
+
+    def abort(self, ballot):
+        '''
+        give up the own proposal, which nobody voted for; the slot is freed
+        and the messages go back to pending
+        '''
+        log.consensus.warning('%s: slot %d: proposal aborted: %s', self.node.name, ballot.slot, ballot.message)
+
+        self.unwatch(ballot)
+        del self.ballots[ballot.slot]
+        self.unindex_message(ballot.message)
+        self.last_slot = max([self.committed_slot] + list(self.ballots.keys()))
+        self.ballots_in_consensus.set(len(self.ballots))
+        self.aborts.inc()
+
+        for m in ballot.message.get_messages():
+            self.storage.add_pending(m)
+
+        self.promote_pending()
+
+        return
+
+    def stop(self):
+        '''
+        cancel the timers and close the storage
+        '''
+        if self.batch_timer is not None:
+            self.batch_timer.cancel()
+            self.batch_timer = None
+
+        for ballot in self.ballots.values():
+            self.unwatch(ballot)
+
+        for message_id in list(self.fetch_timers.keys()):
+            self.cancel_fetch(message_id)
+
+        if self.storage.commit_log is not None and not self.storage.commit_log.is_closed:
+            self.snapshot()
+
+        self.storage.close()
+
+        return
+
+    def is_batch_ready(self):
+        if self.max_batch_delay is None:
+            return True
+
+        if self.storage.count_pending() >= self.max_batch_size:
+            return True
+
+        if self.max_batch_bytes is not None and self.storage.pending_bytes >= self.max_batch_bytes:
+            return True
+
+        return False
+
+    def cut_batch(self):
+        messages = list()
+        size = 0
+        while len(messages) < self.max_batch_size:
+            message = self.storage.peek_pending()
+            if message is None:
+                break
+
+            # the pending messages are proposed in order, after they are
+            # validated
+            is_validated = self.validation.get_verdict(message)
+            if is_validated is None:
+                break
+
+            if self.max_batch_bytes is not None and len(messages) > 0:
+                if size + message.size > self.max_batch_bytes:
+                    break
+
+            self.storage.pop_pending()
+            if self.is_in_consensus(message):
+                continue
+
+            if not is_validated:
+                log.consensus.debug('%s: invalid message is not proposed: %s', self.node.name, message)
+
+                continue
+
+            messages.append(message)
+            size += message.size
+
+        if len(messages) < 1:
+            return None
+
+        if len(messages) == 1:
+            return messages[0]
+
+        return Batch.new(messages)
+
+    def promote_pending(self, force=False):
+        '''
+        fill the free slots in the window with the pending messages
+        '''
+        while len(self.ballots) < self.window and self.storage.count_pending() > 0:
+            # the other nodes hold the ballot beyond the window
+            if self.is_ahead(self.get_free_slot()):
+                break
+
+            if not force and not self.is_batch_ready():
+                if self.batch_timer is None:
+                    self.batch_timer = self.loop.call_later(self.max_batch_delay, self._expire_batch)
+
+                break
+
+            # the delay of the next batch starts with it's first message, the
+            # timer of the batch, which is cut now, must not cut it early
+            if self.batch_timer is not None:
+                self.batch_timer.cancel()
+                self.batch_timer = None
+
+            message = self.cut_batch()
+            if message is None:
+                break
+
+            self.propose(message)
+
+        return
+
+    def _expire_batch(self):
+        self.batch_timer = None
+
+        log.consensus.debug('%s: batch delay expired', self.node.name)
+        self.promote_pending(force=True)
+
+        return
+
+    def get_free_slot(self):
+        '''
+        the slot of the new proposal
+        '''
+        for slot in range(self.committed_slot + 1, self.recovered_slot + 1):
+            if slot not in self.ballots:
+                return slot
+
+        return self.last_slot + 1
+
+    def propose(self, message):
+        ballot = self.new_ballot(self.get_free_slot())
+        self.set_ballot_message(ballot, message)
+        ballot.proposal = message
+
+        # the proposal is already validated by `cut_batch`
+        ballot.node_result = self.get_vote_result(message)
+        ballot.vote(self.node, ballot.node_result, State.init)
 
-        self.ballot.node_result = result
-        self.ballot.vote(self.node, self.ballot.node_result, State.init)
+        log.consensus.debug('%s: broadcast ballot initially: %s', self.node.name, ballot)
+        self.broadcast(ballot, skip_nodes=(message.node,))
 
-        ballot_message = self.ballot.serialize_ballot_message()
-        log.consensus.debug('%s: broadcast ballot_message initially: %s', self.node.name, ballot_message.strip())
+        self.watch(ballot)
 
-        self.broadcast(ballot_message, skip_nodes=(message.node,))
+        return ballot
+
+    def _handle_message(self, message):
+        assert message.node is not None
+
+        log.consensus.debug('%s: received message: %s', self.node.name, message)
+
+        if self.is_in_consensus(message):
+            log.consensus.debug('%s: message is already in consensus: %s', self.node.name, message)
+
+            return False
+
+        self.storage.add_pending(message.copy())
+        self.validation.submit((message,))
+        self.promote_pending()
 
         return False
 
+    def _handle_verdicts(self, messages):
+        '''
+        the messages were validated by the workers; the ballots waiting for
+        the verdict cast the votes and the pending messages are proposed
+        '''
+        for ballot in list(self.ballots.values()):
+            if ballot.is_empty() or ballot.node_result is not None or ballot.state == State.all_confirm:
+                continue
+
+            if self.ballots.get(ballot.slot) is not ballot:
+                continue
+
+            ballot.node_result = self.get_vote_result(ballot.message)
+            if ballot.node_result is None:
+                continue
+
+            ballot.vote(self.node, ballot.node_result, ballot.state)
+            self.cast_vote(ballot)
+
+            self.progress(ballot, ballot.get_ballot_message())
+
+        self.promote_pending()
+
+        return
+
     def _handle_ballot_message(self, ballot_message):
         log.consensus.debug(
-            '%s: %s: received ballot_message: %s',
+            '%s: slot %d: received ballot_message: %s',
             self.node.name,
-            self.ballot.state,
+            ballot_message.slot,
             ballot_message,
         )
 
         # if ballot_message is from unknown node, just ignore it
-        if not self.quorum.is_inside(ballot_message.node):
+        if self.quorum.index_of(ballot_message.node) is None:
             log.consensus.debug(
                 '%s: message from outside quorum: %s',
                 self.node.name,
                 ballot_message,
             )
+            self.rejected.inc()
+            return
+
+        if ballot_message.resent:
+            self.answer(ballot_message)
+
+        # the slot was already committed
+        if ballot_message.slot <= self.committed_slot:
+            return
+
+        if self.is_ahead(ballot_message.slot):
+            self.hold(ballot_message)
+
             return
 
+        if ballot_message.is_digest():
+            message = self.find_message(ballot_message.message)
+            if message is None:
+                self.fetch_message(ballot_message)
+
+                return
+
+            ballot_message = ballot_message.resolve(message)
+
+        ballot = self.ballots.get(ballot_message.slot)
+        if ballot is None:
+            ballot = self.new_ballot(ballot_message.slot)
+
+        # the answer of the confirmed slot is counted apart from the rounds
+        if ballot_message.state == State.all_confirm:
+            self.confirm(ballot, ballot_message)
+
+            return
+
+        # the ballot message of the previous round is ignored
+        if ballot_message.round < ballot.round:
+            return
+
+        if ballot_message.round > ballot.round:
+            if ballot.state == State.all_confirm:
+                return
+
+            if self.is_in_consensus(ballot_message.message, ballot.slot):
+                log.consensus.error(
+                    '%s: message is already in the other slot: %s',
+                    self.node.name,
+                    ballot_message,
+                )
+                self.rejected.inc()
+                return
+
+            self.replace_message(ballot, ballot_message.message, round=ballot_message.round)
+
         # if ballot_message.state is older than state of node, just ignore it
-        if ballot_message.state < self.ballot.state:
+        if ballot_message.state < ballot.state:
             return
 
-        is_ballot_empty = self.ballot.is_empty()
+        is_ballot_empty = ballot.is_empty()
         log.consensus.debug('%s: ballot is empty?: %s', self.node.name, is_ballot_empty)
         if is_ballot_empty:  # ballot is empty, just embrace ballot
-            self.ballot.set_message(ballot_message.message)
+            if self.is_in_consensus(ballot_message.message):
+                log.consensus.error(
+                    '%s: message is already in the other slot: %s',
+                    self.node.name,
+                    ballot_message,
+                )
+                self.rejected.inc()
+                return
 
-        is_valid_ballot_message = self.ballot.is_valid_ballot_message(ballot_message)
+            self.set_ballot_message(ballot, ballot_message.message)
+
+        if ballot.message != ballot_message.message:
+            if not self.resolve_conflict(ballot, ballot_message):
+                return
+
+        is_valid_ballot_message = ballot.is_valid_ballot_message(ballot_message)
 
         log.consensus.debug('%s: ballot_message is valid?: %s', self.node.name, is_valid_ballot_message)
         if not is_valid_ballot_message:
             log.consensus.error(
                 '%s: unexpected ballot_message was received: expected != given\n%s\n%s',
                 self.node.name,
-                self.ballot.__dict__,
+                ballot.__dict__,
                 ballot_message.__dict__,
             )
+            self.rejected.inc()
+            return
+
+        ballot.vote(ballot_message.node, ballot_message.result, ballot_message.state)
+        self.votes_in.inc()
+
+        self.progress(ballot, ballot_message)
+
+        return
+
+    def confirm(self, ballot, ballot_message):
+        '''
+        the slot was confirmed by the validators, which answered; the ballot
+        takes the message and the round of them
+        '''
+        if ballot.state == State.all_confirm:
+            return
+
+        # the ballot, which waits for more answers, keeps asking by the timer
+        if not ballot.confirm(ballot_message.node, ballot_message.message, ballot_message.round):
+            self.watch(ballot)
+
+            return
+
+        message = ballot_message.message
+        if ballot.is_empty() or ballot.round != ballot_message.round or ballot.message != message:
+            if self.is_in_consensus(message, ballot.slot):
+                log.consensus.error(
+                    '%s: message is already in the other slot: %s',
+                    self.node.name,
+                    ballot_message,
+                )
+                self.rejected.inc()
+                return
+
+            self.replace_message(
+                ballot,
+                message,
+                round=ballot_message.round if ballot_message.round != ballot.round else None,
+            )
+
+        log.consensus.debug('%s: slot %d: confirmed by the answers: %s', self.node.name, ballot.slot, message)
+
+        ballot.change_state(State.all_confirm)
+        self._handle_all_confirm(ballot, ballot_message, True)
+        self.watch(ballot)
+
+        return
+
+    def resolve_conflict(self, ballot, ballot_message):
+        '''
+        the other message was voted for the same slot in the same round;
+        return `True` if the ballot takes the other message.
+
+        The votes for the other messages are kept and the message, which
+        passed the threshold, is taken. In `init`, the lowest of the proposals
+        by `proposal_key` wins. After `init`, the next round starts when the
+        threshold can not be passed anymore.
+        '''
+        ballot.vote_other(ballot_message.node, ballot_message.message, ballot_message.result, ballot_message.state)
+
+        message, _ = ballot.check_others()
+        if message is None and ballot.state == State.init and ballot_message.state == State.init:
+            if proposal_key(ballot_message.message) < proposal_key(ballot.message):
+                message = ballot_message.message
+
+        if message is not None:
+            if self.is_in_consensus(message, ballot.slot):
+                log.consensus.error(
+                    '%s: message is already in the other slot: %s',
+                    self.node.name,
+                    message,
+                )
+                return False
+
+            log.consensus.debug('%s: slot %d: message is replaced: %s', self.node.name, ballot.slot, message)
+            self.replace_message(ballot, message)
+
+            # the votes of the message could pass the threshold already
+            self.progress(ballot, ballot_message)
+
+            return False
+
+        if not ballot.is_reachable():
+            self.change_round(ballot)
+
+        return False
+
+    def find_message(self, digest):
+        '''
+        the message of the digest from the cache, the ballots in consensus and
+        the storage
+        '''
+        assert isinstance(digest, MessageDigest)
+
+        message = self.message_cache.get(digest)
+        if message is not None:
+            return message
+
+        slot = self.slot_index.get(digest.message_id)
+        if slot is not None and slot in self.ballots:
+            message = self.ballots[slot].message
+            if message is not None and digest.is_digest_of(message):
+                return message
+
+        message = self.storage.get(digest.message_id)
+        if message is None:
+            message = self.storage.get_batch(digest.message_id)
+
+        if message is not None and digest.is_digest_of(message):
+            return message
+
+        return None
+
+    def fetch_message(self, ballot_message):
+        '''
+        request the message of the digest to the sender of the ballot message
+        or the certificate; it is handled again when the message is received
+        '''
+        digest = ballot_message.message
+
+        waiting = self.fetching.get(digest.message_id)
+        if waiting is not None:
+            waiting.append(ballot_message)
+
             return
 
-        self.ballot.vote(ballot_message.node, ballot_message.result, ballot_message.state)
+        self.fetching[digest.message_id] = [ballot_message]
+        self.request_message(digest.message_id, 0)
 
-        state, is_passed_threshold = self.ballot.check_threshold()
+        return
 
-        # if new state was already agreed from other validators, the new ballot
-        # will be accepted
-        if is_passed_threshold and state != self.ballot.state:
-            self.ballot.change_state(state)
+    def request_message(self, message_id, retries):
+        '''
+        every sender of the digest has the message; the retry asks the next
+        one of them
+        '''
+        waiting = self.fetching.get(message_id)
+        if waiting is None:
+            return
+
+        # the slots were committed by the other messages
+        if all(map(lambda x: x.slot <= self.committed_slot, waiting)):
+            self.cancel_fetch(message_id)
+
+            return
+
+        names = list()
+        for ballot_message in waiting:
+            if ballot_message.node.name not in names and ballot_message.node.name != self.node.name:
+                names.append(ballot_message.node.name)
+
+        node = self.quorum.get(names[retries % len(names)]) if len(names) > 0 else None
+        if node is not None:
+            digest = waiting[0].message
+
+            log.consensus.debug('%s: fetch message from %s, %d: %s', self.node.name, node, retries, digest)
+            self.fetches.inc()
+            self.transport.send(
+                node.endpoint,
+                self.transport.codec.encode(MessageRequest(self.node, digest)),
+            )
+
+        if self.state_timeout is not None:
+            self.fetch_timers[message_id] = self.loop.call_later(
+                self.state_timeout,
+                self._expire_fetch,
+                message_id,
+                retries + 1,
+            )
+
+        return
+
+    def _expire_fetch(self, message_id, retries):
+        self.fetch_timers.pop(message_id, None)
+        self.request_message(message_id, retries)
+
+        return
+
+    def cancel_fetch(self, message_id):
+        timer = self.fetch_timers.pop(message_id, None)
+        if timer is not None:
+            timer.cancel()
+
+        return self.fetching.pop(message_id, None)
+
+    def _handle_message_request(self, request):
+        node = self.quorum.get(request.node.name)
+        if node is None:
+            log.consensus.debug('%s: request from outside quorum: %s', self.node.name, request)
+
+            return
+
+        message = self.find_message(request.digest)
+        if message is None:
+            log.consensus.debug('%s: requested message is not found: %s', self.node.name, request)
+
+            return
+
+        self.transport.send(
+            node.endpoint,
+            self.transport.codec.encode(MessageResponse(self.node, message)),
+        )
 
+        return
+
+    def _handle_message_response(self, response):
+        # the message, which was not requested, is ignored
+        waiting = self.fetching.get(response.message.message_id)
+        if waiting is None or not waiting[0].message.is_digest_of(response.message):
+            return
+
+        self.cancel_fetch(response.message.message_id)
+
+        log.consensus.debug('%s: message fetched: %s', self.node.name, response)
+
+        self.message_cache.add(response.message)
+        for ballot_message in waiting:
+            self.handlers[ballot_message.type_name](ballot_message)
+
+        return
+
+    def _handle_slot_request(self, request):
+        log.consensus.debug('%s: slot %d: received request: %s', self.node.name, request.slot, request)
+
+        self.answer(request)
+
+        return
+
+    def _handle_vote_certificate(self, certificate):
         log.consensus.debug(
-            '%s: is passed threshold?: %s: %s',
+            '%s: slot %d: received certificate: %s',
             self.node.name,
-            is_passed_threshold,
-            ballot_message,
+            certificate.slot,
+            certificate,
         )
 
-        fn = getattr(self, '_handle_%s' % self.ballot.state.name)
-        result = fn(ballot_message, is_passed_threshold)
+        if self.quorum.get(certificate.node.name) is None:
+            log.consensus.debug('%s: certificate from outside quorum: %s', self.node.name, certificate)
+            self.rejected.inc()
 
-        if result is not True:
             return
 
-        next_state = self.ballot.state.get_next()
-        if next_state is None:
+        # the slot was already committed
+        if certificate.slot <= self.committed_slot:
             return
 
-        self.ballot.change_state(next_state)
+        if self.is_ahead(certificate.slot):
+            self.hold(certificate)
 
-        if next_state == State.all_confirm:
-            self._handle_all_confirm(ballot_message, None)
             return
 
-        result = BallotVoteResult.disagree
-        if self.validate_message(ballot_message.message):
-            result = BallotVoteResult.agree
+        if certificate.node.name != self.get_aggregator(certificate.slot, certificate.round):
+            log.consensus.error('%s: certificate from not aggregator: %s', self.node.name, certificate)
+            self.rejected.inc()
+
+            return
+
+        # the bits of the other quorum mean the other validators; the votes
+        # reach the node by the resends instead
+        if certificate.membership != self.quorum.membership:
+            log.consensus.error('%s: certificate of the other quorum: %s', self.node.name, certificate)
+            self.rejected.inc()
+
+            return
+
+        # the votes of the certificate are checked at once
+        if popcount(certificate.agreed & self.quorum.member_mask) < self.quorum.minimum_quorum:
+            log.consensus.error('%s: certificate has not enough votes: %s', self.node.name, certificate)
+            self.rejected.inc()
 
-        self.ballot.node_result = result
-        self.ballot.vote(self.node, self.ballot.node_result, self.ballot.state)
+            return
+
+        if certificate.is_digest():
+            message = self.find_message(certificate.message)
+            if message is None:
+                self.fetch_message(certificate)
+
+                return
 
-        self.broadcast(self.ballot.serialize_ballot_message())
+            certificate = certificate.resolve(message)
 
-        log.consensus.debug('%s: new ballot broadcasted: %s', self.node.name, self.ballot)
+        ballot = self.ballots.get(certificate.slot)
+        if ballot is None:
+            ballot = self.new_ballot(certificate.slot)
+
+        if certificate.round < ballot.round:
+            return
+
+        if certificate.round == ballot.round and certificate.state < ballot.state:
+            return
+
+        # the certificate is agreed by the quorum, so it's message is taken
+        if ballot.is_empty() or certificate.round > ballot.round or ballot.message != certificate.message:
+            if ballot.state == State.all_confirm:
+                log.consensus.error('%s: certificate for the confirmed ballot: %s', self.node.name, certificate)
+                self.rejected.inc()
+
+                return
+
+            if self.is_in_consensus(certificate.message, ballot.slot):
+                log.consensus.error(
+                    '%s: message is already in the other slot: %s',
+                    self.node.name,
+                    certificate,
+                )
+                self.rejected.inc()
+                return
+
+            self.replace_message(
+                ballot,
+                certificate.message,
+                round=certificate.round if certificate.round > ballot.round else None,
+            )
+
+        if not ballot.is_valid_ballot_message(certificate):
+            log.consensus.error('%s: unexpected certificate was received: %s', self.node.name, certificate)
+            self.rejected.inc()
+
+            return
+
+        ballot.merge_votes(certificate.state, certificate.agreed, certificate.disagreed)
+        self.certificates_in.inc()
+
+        self.progress(ballot, certificate)
 
         return
 
-    def _handle_init(self, ballot_message, is_passed_threshold):
-        assert isinstance(ballot_message, BallotMessage)
+    def progress(self, ballot, ballot_message):
+        '''
+        move the ballot to the next state while the threshold is passed; the
+        votes for the next state could be already received
+        '''
+        while True:
+            state, is_passed_threshold = ballot.check_threshold()
 
-        if self.ballot.node_result is None:
-            result = BallotVoteResult.disagree
-            if self.validate_message(ballot_message.message):
-                result = BallotVoteResult.agree
+            # the aggregator lets the validators know the votes
+            if is_passed_threshold and self.aggregate and self.is_aggregator(ballot.slot, ballot.round):
+                self.certify(ballot, state)
 
-            self.ballot.node_result = result
-            self.ballot.vote(self.node, result, self.ballot.state)
+            # if new state was already agreed from other validators, the new ballot
+            # will be accepted
+            if is_passed_threshold and state != ballot.state:
+                ballot.change_state(state)
 
-        if not self.ballot.is_broadcasted:
-            self.broadcast(self.ballot.serialize_ballot_message())
+            log.consensus.debug(
+                '%s: is passed threshold?: %s: %s',
+                self.node.name,
+                is_passed_threshold,
+                ballot_message,
+            )
 
-            log.consensus.debug('%s: new ballot broadcasted: %s', self.node.name, self.ballot)
+            fn = getattr(self, '_handle_%s' % ballot.state.name)
+            result = fn(ballot, ballot_message, is_passed_threshold)
+
+            if result is not True:
+                self.watch(ballot)
+
+                return
+
+            next_state = ballot.state.get_next()
+            if next_state is None:
+                return
+
+            ballot.change_state(next_state)
+
+            if next_state == State.all_confirm:
+                self._handle_all_confirm(ballot, ballot_message, None)
+                self.watch(ballot)
+
+                return
+
+            # without the verdict, the vote is cast when the message is
+            # validated
+            ballot.node_result = self.get_vote_result(ballot.message)
+            if ballot.node_result is None:
+                self.watch(ballot)
+
+                return
+
+            ballot.vote(self.node, ballot.node_result, ballot.state)
+
+            self.cast_vote(ballot)
+
+            log.consensus.debug('%s: new ballot broadcasted: %s', self.node.name, ballot)
+
+    def _handle_init(self, ballot, ballot_message, is_passed_threshold):
+        assert isinstance(ballot_message, (BallotMessage, VoteCertificate))
+
+        if ballot.node_result is None:
+            result = self.get_vote_result(ballot.message)
+
+            # the vote is cast when the message is validated
+            if result is None:
+                return False
+
+            ballot.node_result = result
+            ballot.vote(self.node, result, ballot.state)
+
+        if not ballot.is_broadcasted:
+            self.cast_vote(ballot)
+
+            log.consensus.debug('%s: new ballot broadcasted: %s', self.node.name, ballot)
 
         if is_passed_threshold:
             return True
 
         return False
 
-    def _handle_sign(self, ballot_message, is_passed_threshold):
+    def _handle_sign(self, ballot, ballot_message, is_passed_threshold):
         if is_passed_threshold:
             return True
 
@@ -241,33 +1462,217 @@ class FBAConsensus:
 
     _handle_accept = _handle_sign
 
-    def _handle_all_confirm(self, ballot_message, is_passed_threshold):
-        log.consensus.info('%s: %s: %s', self.node.name, self.ballot.state, ballot_message)
+    def _handle_all_confirm(self, ballot, ballot_message, is_passed_threshold):
+        log.consensus.info('%s: %s: %s', self.node.name, ballot.state, ballot_message)
 
-        self.storage.add(self.ballot)
+        self.commit()
 
-        self.ballot.initialize_state()
+        return
 
-        # FIXME this is for simulation purpose
-        self.reached_all_confirm(ballot_message)
+    def commit(self):
+        '''
+        store the confirmed ballots in slot order; the confirmed ballot waits
+        until all the previous slots are committed
+        '''
+        while True:
+            ballot = self.ballots.get(self.committed_slot + 1)
+            if ballot is None or ballot.state != State.all_confirm:
+                break
+
+            self.storage.add(ballot)
+            self.observe_commit(ballot)
+            for callback in self.commit_callbacks:
+                callback(self, ballot)
+
+            self.unwatch(ballot)
+            del self.ballots[ballot.slot]
+            self.ballots_in_consensus.set(len(self.ballots))
+            self.unindex_message(ballot.message)
+            self.cancel_fetch(ballot.message.message_id)
+
+            # the own proposal lost the slot, it's messages wait for the next
+            # slot
+            if ballot.proposal is not None and ballot.proposal != ballot.message:
+                self.unindex_message(ballot.proposal)
+                for m in ballot.proposal.get_messages():
+                    if not self.is_in_consensus(m):
+                        self.storage.add_pending(m)
+
+            self.committed_slot = ballot.slot
+
+            log.consensus.debug('%s: slot %d committed', self.node.name, ballot.slot)
+
+            # FIXME this is for simulation purpose
+            self.reached_all_confirm(ballot)
+
+        if self.storage.commit_log is not None and self.snapshot_interval is not None and self.snapshot_handle is None:
+            self.snapshot_handle = self.loop.call_later(self.snapshot_interval, self.snapshot)
+
+        self.release()
+        self.promote_pending()
+        self.open_next_slot()
 
         return
 
-    def reached_all_confirm(self, ballot_message):
-        pass
+    def is_ahead(self, slot):
+        '''
+        the slot without the ballot beyond the window; the ballot is not
+        opened for it, otherwise the single faulty node could move
+        `last_slot` far ahead and leave the slots, which are never committed,
+        before the next proposals
+        '''
+        return slot > self.committed_slot + self.window and slot not in self.ballots
+
+    def hold(self, message):
+        '''
+        keep the messages of the slot beyond the window until the window
+        reaches it; every state and round of the sender is kept, so the
+        message of `init` is not replaced by the later digests
+        '''
+        key = (message.node.name, message.type_name, message.state.value, message.round)
+        self.ahead.setdefault(message.slot, dict()).setdefault(key, message)
+
+        return
+
+    def release(self):
+        '''
+        handle the held messages of the slots, which the window reached
+        '''
+        for slot in sorted(filter(lambda x: x <= self.committed_slot + self.window, self.ahead.keys())):
+            messages = self.ahead.pop(slot, None)
+            if messages is None:
+                continue
+
+            for message in messages.values():
+                self.handlers[message.type_name](message)
+
+        return
+
+    def get_snapshot_path(self):
+        return os.path.join(self.storage.commit_log.directory, 'snapshot')
+
+    def snapshot(self):
+        '''
+        write the snapshot at the end of the commit log; the log is synced
+        first, so the snapshot never covers the records, which may be lost
+        '''
+        if self.snapshot_handle is not None:
+            self.snapshot_handle.cancel()
+            self.snapshot_handle = None
+
+        started_at = self.metrics.now()
+
+        commit_log = self.storage.commit_log
+        commit_log.sync()
+
+        snapshot = Snapshot(
+            commit_log.position,
+            self.committed_slot,
+            self.last_slot,
+            self.storage.pending.values(),
+            map(BallotSnapshot.of, filter(lambda x: not x.is_empty(), self.ballots.values())),
+        )
+        snapshot.save(self.get_snapshot_path())
+
+        self.snapshots.inc()
+        self.snapshot_time.observe(self.metrics.now() - started_at)
+
+        log.storage.debug('%s: snapshot was written: %s', self.node.name, snapshot)
+
+        return snapshot
+
+    def recover(self):
+        '''
+        restart from the latest snapshot; the records of the commit log after
+        the snapshot are replayed, so the ballots and the pending messages,
+        which were committed in the meantime, are dropped. Without the
+        snapshot, the consensus starts after the last slot of the log.
+        '''
+        commit_log = self.storage.commit_log
+        self.committed_slot = self.last_slot = commit_log.last_slot
 
+        snapshot = Snapshot.load(self.get_snapshot_path())
+        if snapshot is None:
+            if len(commit_log) > 0:
+                log.storage.warning('%s: no snapshot, starts after slot %d', self.node.name, self.committed_slot)
 
-def load_message(data):
-    try:
-        o = json.loads(data)
-    except json.decoder.JSONDecodeError as e:
-        raise Message.InvalidMessageError(e)
+            return
+
+        # the records after the snapshot
+        committed = set()
+        replayed = 0
+        for _, _, record in commit_log.iter_tail(snapshot.position):
+            committed.update(map(lambda x: x.message_id, record.get_messages()))
+            replayed += 1
+        self.replayed.inc(replayed)
+
+        for message in snapshot.pending:
+            if message.message_id not in committed:
+                self.storage.add_pending(message)
+
+        for ballot_snapshot in snapshot.ballots:
+            if ballot_snapshot.slot > self.committed_slot:
+                self.restore_ballot(ballot_snapshot)
+
+                continue
+
+            # the own proposal, which lost the slot, waits for the next slot
+            if ballot_snapshot.proposal is not None:
+                for m in ballot_snapshot.proposal.get_messages():
+                    if m.message_id not in committed and not self.is_in_consensus(m):
+                        self.storage.add_pending(m)
+
+        self.last_slot = self.recovered_slot = max(self.last_slot, snapshot.last_slot)
+
+        # the confirmed ballots may be committed and the pending messages are
+        # proposed, after the node is started
+        self.loop.call_soon(self.commit)
+
+        log.storage.info(
+            '%s: recovered from %s, %d records were replayed, %d ballots in consensus',
+            self.node.name, snapshot, replayed, len(self.ballots),
+        )
+
+        return
+
+    def restore_ballot(self, ballot_snapshot):
+        ballot = ballot_snapshot.restore(self.node, metrics=self.metrics)
 
-    if 'type_name' not in o:
-        raise Message.InvalidMessageError('field, `type_name` is missing: %s', o)
+        self.ballots[ballot.slot] = ballot
+        self.last_slot = max(self.last_slot, ballot.slot)
+        self.ballots_in_consensus.set(len(self.ballots))
 
-    if o['type_name'] == 'message':
-        return Message.from_json(data)
+        self.index_message(ballot.slot, ballot.message)
+        if ballot.proposal is not None and ballot.proposal != ballot.message:
+            self.index_message(ballot.slot, ballot.proposal)
 
-    if o['type_name'] == 'ballot-message':
-        return BallotMessage.from_json(data)
+        # the vote is sent again by the timer
+        self.watch(ballot)
+
+        return ballot
+
+    def track(self, message):
+        '''
+        the message was sent by the client; the time to commit it is observed
+        by the node
+        '''
+        assert isinstance(message, Message)
+
+        self.sent_at[message.message_id] = self.metrics.now()
+
+        return
+
+    def observe_commit(self, ballot):
+        if len(self.sent_at) < 1:
+            return
+
+        now = self.metrics.now()
+        for m in ballot.message.get_messages():
+            sent_at = self.sent_at.pop(m.message_id, None)
+            if sent_at is not None:
+                self.commit_latency.observe(now - sent_at)
+
+        return
+
+    def reached_all_confirm(self, ballot):
+        pass
@@ -0,0 +1,211 @@
+import json
+
+from ..network import (
+    BaseCodec,
+    Batch,
+    Message,
+    MessageDigest,
+    Node,
+)
+
+from .ballot import PROPOSAL_CODES, PROPOSALS_BY_CODE, load_proposal
+from .state import State
+
+
+class MessageRequest:
+    '''
+    ask the validator for the message of the digest, which was not received
+    '''
+    class InvalidMessageRequestError(Message.InvalidMessageError):
+        pass
+
+    type_name = 'message-request'
+    type_code = 3
+
+    digest = None
+
+    def __init__(self, node, digest):
+        assert isinstance(node, Node)
+        assert isinstance(digest, MessageDigest)
+
+        self.node = node
+        self.digest = digest
+
+    def __repr__(self):
+        return '<MessageRequest: node=%(node)s digest=%(digest)s>' % self.__dict__
+
+    def serialize(self):
+        return json.dumps(dict(
+            type_name=self.type_name,
+            node=self.node.name,
+            message=self.digest.to_message_dict(),
+        )) + '\r\n\r\n'
+
+    @classmethod
+    def from_dict(cls, o):
+        try:
+            return cls(Node(o['node'], None, None), MessageDigest.from_dict(o))
+        except (AssertionError, KeyError, TypeError) as e:
+            raise cls.InvalidMessageRequestError(e)
+
+    def pack(self, writer):
+        writer.string(self.node.name)
+        self.digest.pack_body(writer)
+
+        return
+
+    @classmethod
+    def unpack(cls, reader):
+        node = reader.string()
+
+        return cls(Node(node, None, None), MessageDigest.unpack_body(reader, node))
+
+    def get_message(self):
+        # the request is answered even if the message is already stored
+        return None
+
+    def verify(self, verified_hashes=None):
+        return
+
+
+class MessageResponse:
+    '''
+    the answer of `MessageRequest`, it carries the message or the batch
+    '''
+    class InvalidMessageResponseError(Message.InvalidMessageError):
+        pass
+
+    type_name = 'message-response'
+    type_code = 4
+
+    message = None
+
+    def __init__(self, node, message):
+        assert isinstance(node, Node)
+        assert isinstance(message, (Message, Batch))
+
+        self.node = node
+        self.message = message
+
+    def __repr__(self):
+        return '<MessageResponse: node=%(node)s message=%(message)s>' % self.__dict__
+
+    def serialize(self):
+        return json.dumps(dict(
+            type_name=self.type_name,
+            node=self.node.name,
+            message=self.message.to_message_dict(),
+        )) + '\r\n\r\n'
+
+    @classmethod
+    def from_dict(cls, o):
+        try:
+            return cls(Node(o['node'], None, None), load_proposal(o))
+        except (AssertionError, KeyError, TypeError, Message.InvalidMessageError) as e:
+            raise cls.InvalidMessageResponseError(e)
+
+    def pack(self, writer):
+        writer.string(self.node.name)
+        writer.u8(PROPOSAL_CODES[self.message.__class__])
+        self.message.pack_body(writer)
+
+        return
+
+    @classmethod
+    def unpack(cls, reader):
+        node = reader.string()
+        proposal_class = PROPOSALS_BY_CODE.get(reader.u8())
+        if proposal_class not in (Message, Batch):
+            raise cls.InvalidMessageResponseError('invalid proposal code')
+
+        return cls(Node(node, None, None), proposal_class.unpack_body(reader, node))
+
+    def get_message(self):
+        return self.message
+
+    def verify(self, verified_hashes=None):
+        self.message.verify(verified_hashes)
+
+        return
+
+
+class SlotRequest:
+    '''
+    ask the validators for the slot, which the node can not move without
+    it's own vote; they answer by the vote of the slot like the resent ballot
+    message, the committed slot by the vote of `all_confirm`
+    '''
+    class InvalidSlotRequestError(Message.InvalidMessageError):
+        pass
+
+    type_name = 'slot-request'
+    type_code = 6
+
+    slot = None
+    round = None
+    state = None
+
+    def __init__(self, node, state, slot=0, round=0):
+        assert isinstance(node, Node)
+        assert isinstance(state, State)
+        assert type(slot) is int
+        assert type(round) is int
+
+        self.node = node
+        self.state = state
+        self.slot = slot
+        self.round = round
+
+    def __repr__(self):
+        return '<SlotRequest: node=%(node)s slot=%(slot)d round=%(round)d state=%(state)s>' % self.__dict__
+
+    def serialize(self):
+        return json.dumps(dict(
+            type_name=self.type_name,
+            node=self.node.name,
+            slot=self.slot,
+            round=self.round,
+            state=self.state.name,
+        )) + '\r\n\r\n'
+
+    @classmethod
+    def from_dict(cls, o):
+        try:
+            return cls(
+                Node(o['node'], None, None),
+                State.from_name(o['state']),
+                slot=o['slot'],
+                round=o.get('round', 0),
+            )
+        except (AssertionError, AttributeError, KeyError, TypeError) as e:
+            raise cls.InvalidSlotRequestError(e)
+
+    def pack(self, writer):
+        writer.string(self.node.name)
+        writer.u64(self.slot)
+        writer.u32(self.round)
+        writer.u8(self.state.value)
+
+        return
+
+    @classmethod
+    def unpack(cls, reader):
+        node = reader.string()
+        slot = reader.u64()
+        round = reader.u32()
+        state = State.from_value(reader.u8())
+        if state is None:
+            raise cls.InvalidSlotRequestError('invalid state')
+
+        return cls(Node(node, None, None), state, slot=slot, round=round)
+
+    def get_message(self):
+        return None
+
+    def verify(self, verified_hashes=None):
+        return
+
+
+BaseCodec.register(MessageRequest)
+BaseCodec.register(MessageResponse)
+BaseCodec.register(SlotRequest)
@@ -0,0 +1,56 @@
+import collections
+
+from ..network import (
+    Batch,
+    Message,
+)
+
+
+# number of the messages kept in the cache
+DEFAULT_CACHE_SIZE = 10000
+
+
+class MessageCache:
+    '''
+    the recently seen messages and batches, addressed by their
+    `(message_id, hash_id)`; the least recently used one is dropped when the
+    cache is full
+    '''
+    messages = None
+    size = None
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE):
+        assert type(size) is int and size > 0
+
+        self.messages = collections.OrderedDict()
+        self.size = size
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __contains__(self, digest):
+        return (digest.message_id, digest.hash_id) in self.messages
+
+    def add(self, message):
+        assert isinstance(message, (Message, Batch))
+
+        key = (message.message_id, message.hash_id)
+        if key in self.messages:
+            self.messages.move_to_end(key)
+
+            return
+
+        self.messages[key] = message
+        if len(self.messages) > self.size:
+            self.messages.popitem(last=False)
+
+        return
+
+    def get(self, digest):
+        key = (digest.message_id, digest.hash_id)
+
+        message = self.messages.get(key)
+        if message is not None:
+            self.messages.move_to_end(key)
+
+        return message
@@ -0,0 +1,310 @@
+import os
+import struct
+import zlib
+
+from ..common import (
+    log,
+)
+
+from ..network.codec import BinaryReader, BinaryWriter, InvalidFrameError
+
+from .ballot import Ballot, BallotVoteResult, put_vote
+from .commit_log import pack_proposal, pack_voted, unpack_proposal, unpack_voted
+from .state import State
+
+
+# seconds between the snapshots of the consensus with the commit log
+DEFAULT_SNAPSHOT_INTERVAL = 1
+
+
+class BallotSnapshot:
+    '''
+    the ballot in consensus; the votes are kept by the validator names, like
+    `CommitRecord`
+    '''
+    slot = None
+    round = None
+    timestamp = None
+    state = None
+    state_history = None
+    node_result = None
+    message = None
+    proposal = None
+
+    # the votes of the current and the next states by the value of the
+    # state, and the votes of the previous states by the name
+    votes = None
+    vote_history = None
+
+    def __init__(self, slot, round, timestamp, state, state_history, node_result, message, proposal, votes, vote_history):
+        self.slot = slot
+        self.round = round
+        self.timestamp = timestamp
+        self.state = state
+        self.state_history = state_history
+        self.node_result = node_result
+        self.message = message
+        self.proposal = proposal
+        self.votes = votes
+        self.vote_history = vote_history
+
+    def __repr__(self):
+        return '<BallotSnapshot: slot=%(slot)d round=%(round)d state=%(state)s message=%(message)s>' % self.__dict__
+
+    @classmethod
+    def of(cls, ballot):
+        assert not ballot.is_empty()
+
+        votes = dict()
+        for state_value, masks in ballot.votes.items():
+            votes[state_value] = ballot.get_voted(masks)
+
+        vote_history = dict()
+        for state, masks in ballot.vote_history.items():
+            vote_history[state] = ballot.get_voted(masks)
+
+        return cls(
+            ballot.slot,
+            ballot.round,
+            ballot.timestamp,
+            ballot.state,
+            list(ballot.state_history),
+            ballot.node_result,
+            ballot.message,
+            ballot.proposal,
+            votes,
+            vote_history,
+        )
+
+    def get_masks(self, node, voted):
+        '''
+        the bitmasks of the votes in the current quorum of the node; the
+        validators, which left the quorum, are not counted
+        '''
+        masks = [0, 0, 0]
+        for name, result in voted.items():
+            member = node if name == node.name else node.quorum.get(name)
+            index = node.quorum.index_of(member) if member is not None else None
+            if index is None:
+                continue
+
+            put_vote(masks, 1 << index, result)
+
+        return masks
+
+    def restore(self, node, metrics=None):
+        '''
+        the ballot of the snapshot; the liveness timer is not started
+        '''
+        ballot = Ballot(node, self.state, self.node_result, timestamp=self.timestamp, slot=self.slot, metrics=metrics)
+        ballot.round = self.round
+        ballot.state_history = list(self.state_history)
+        ballot.message = self.message
+        ballot.proposal = self.proposal
+
+        for state_value, voted in self.votes.items():
+            ballot.votes[state_value] = self.get_masks(node, voted)
+
+        for state, voted in self.vote_history.items():
+            ballot.vote_history[state] = self.get_masks(node, voted)
+
+        return ballot
+
+    def pack(self, writer):
+        writer.u64(self.slot)
+        writer.u32(self.round)
+        writer.string(self.timestamp)
+        writer.u8(self.state.value)
+        writer.string(self.node_result.name if self.node_result is not None else None)
+
+        writer.u8(len(self.state_history))
+        for state in self.state_history:
+            writer.u8(state.value)
+
+        pack_proposal(writer, self.message)
+
+        # the own proposal, which is not the message of the ballot
+        if self.proposal is None:
+            writer.u8(0)
+        elif self.proposal == self.message:
+            writer.u8(1)
+        else:
+            writer.u8(2)
+            pack_proposal(writer, self.proposal)
+
+        writer.u8(len(self.votes))
+        for state_value, voted in self.votes.items():
+            writer.u8(state_value)
+            pack_voted(writer, voted)
+
+        writer.u8(len(self.vote_history))
+        for state, voted in self.vote_history.items():
+            writer.string(state)
+            pack_voted(writer, voted)
+
+        return
+
+    @classmethod
+    def unpack(cls, reader):
+        slot = reader.u64()
+        round = reader.u32()
+        timestamp = reader.string()
+        state = State.from_value(reader.u8())
+        node_result = reader.string()
+
+        state_history = list(map(lambda x: State.from_value(reader.u8()), range(reader.u8())))
+
+        message = unpack_proposal(reader)
+
+        proposal = None
+        kind = reader.u8()
+        if kind == 1:
+            proposal = message
+        elif kind == 2:
+            proposal = unpack_proposal(reader)
+
+        votes = dict()
+        for _ in range(reader.u8()):
+            state_value = reader.u8()
+            votes[state_value] = unpack_voted(reader)
+
+        vote_history = dict()
+        for _ in range(reader.u8()):
+            name = reader.string()
+            vote_history[name] = unpack_voted(reader)
+
+        return cls(
+            slot,
+            round,
+            timestamp,
+            state,
+            state_history,
+            BallotVoteResult.from_name(node_result) if node_result is not None else None,
+            message,
+            proposal,
+            votes,
+            vote_history,
+        )
+
+
+class Snapshot:
+    '''
+    the state of the consensus at the position of the commit log, `segment`
+    and `offset`: the last committed slot, the pending messages and the
+    ballots in consensus. The offset index of the committed ballots is kept on
+    the disk by itself, so the snapshot has only the position of the log,
+    which it covers; the node restarts from the snapshot and replays only the
+    records after the position.
+
+        snapshot = magic + length(u32) + crc32(u32) + body
+
+    the snapshot is written to the temporary file and renamed, so the
+    previous snapshot is kept until the new one is whole.
+    '''
+    MAGIC = b'MFBASNP1'
+    header = struct.Struct('>8sII')
+
+    segment = None
+    offset = None
+    committed_slot = None
+    last_slot = None
+    pending = None
+    ballots = None
+
+    def __init__(self, position, committed_slot, last_slot, pending, ballots):
+        ballots = list(ballots)
+        assert len(list(filter(lambda x: not isinstance(x, BallotSnapshot), ballots))) < 1
+
+        self.segment, self.offset = position
+        self.committed_slot = committed_slot
+        self.last_slot = last_slot
+        self.pending = list(pending)
+        self.ballots = ballots
+
+    def __repr__(self):
+        return '<Snapshot: segment=%d offset=%d committed_slot=%d pending=%d ballots=%d>' % (
+            self.segment,
+            self.offset,
+            self.committed_slot,
+            len(self.pending),
+            len(self.ballots),
+        )
+
+    @property
+    def position(self):
+        return (self.segment, self.offset)
+
+    def pack(self):
+        writer = BinaryWriter()
+        writer.u32(self.segment)
+        writer.u64(self.offset)
+        writer.u64(self.committed_slot)
+        writer.u64(self.last_slot)
+
+        writer.u32(len(self.pending))
+        for message in self.pending:
+            pack_proposal(writer, message)
+
+        writer.u32(len(self.ballots))
+        for ballot in self.ballots:
+            ballot.pack(writer)
+
+        body = writer.getvalue()
+
+        return self.header.pack(self.MAGIC, len(body), zlib.crc32(body)) + body
+
+    @classmethod
+    def unpack(cls, data):
+        reader = BinaryReader(data)
+        segment = reader.u32()
+        offset = reader.u64()
+        committed_slot = reader.u64()
+        last_slot = reader.u64()
+
+        pending = list(map(lambda x: unpack_proposal(reader), range(reader.u32())))
+        ballots = list(map(lambda x: BallotSnapshot.unpack(reader), range(reader.u32())))
+
+        return cls((segment, offset), committed_slot, last_slot, pending, ballots)
+
+    def save(self, path):
+        data = self.pack()
+
+        tmp_path = path + '.new'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, path)
+
+        return
+
+    @classmethod
+    def load(cls, path):
+        '''
+        the snapshot of the file; `None` if it does not exist or it is broken
+        '''
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        if len(data) < cls.header.size:
+            log.storage.error('broken snapshot: %s', path)
+
+            return None
+
+        magic, length, checksum = cls.header.unpack_from(data)
+        body = data[cls.header.size:]
+        if magic != cls.MAGIC or length != len(body) or zlib.crc32(body) != checksum:
+            log.storage.error('broken snapshot: %s', path)
+
+            return None
+
+        try:
+            return cls.unpack(body)
+        except (InvalidFrameError, AttributeError, KeyError, ValueError) as e:
+            log.storage.error('broken snapshot: %s: %s', path, e)
+
+            return None
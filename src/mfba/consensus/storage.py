@@ -1,62 +1,278 @@
+import collections
+
 from ..common import (
     log,
+    Metrics,
 )
 
 from ..network import (
+    Batch,
     Node,
     Message,
 )
 
 from .state import State
 from .ballot import Ballot
+from .commit_log import CommitLog
 
 class Storage:
+    '''
+    the committed messages and the pending messages of the node; with
+    `commit_log`, the committed ballots are kept in the log on the disk
+    instead of the memory, and they are read back from it
+    '''
     messages = None
-    message_ids = None
+    hash_index = None
+    batches = None
+    slots = None
 
     ballot_history = None
 
     pending = None
-    pending_ids = None
 
-    def __init__(self, node):
+    commit_log = None
+    metrics = None
+
+    def __init__(self, node, metrics=None, commit_log=None):
         assert isinstance(node, Node)
+        assert metrics is None or isinstance(metrics, Metrics)
+        assert commit_log is None or isinstance(commit_log, CommitLog)
 
         self.node = node
+        self.commit_log = commit_log
+
+        # the committed messages and slots, and the depth of the pending
+        # messages
+        self.metrics = metrics if metrics is not None else Metrics(node.name)
+        self.committed_messages = self.metrics.counter('storage.messages')
+        self.committed_bytes = self.metrics.counter('storage.bytes')
+        self.committed_slots = self.metrics.counter('storage.slots')
+        self.pending_depth = self.metrics.gauge('storage.pending')
+
+        # committed messages, indexed by `message_id`; `hash_index` maps
+        # `hash_id` to the set of `message_id`s which have the same content
+        self.messages = dict()
+        self.hash_index = dict()
 
-        self.messages = list()
-        self.message_ids = list()
+        # committed batches, the merkle root to the `message_id`s of the batch
+        self.batches = dict()
 
-        self.pending = list()
-        self.pending_ids = list()
+        # committed slots, the slot number to the `message_id` of the ballot
+        # message and the round
+        self.slots = dict()
 
+        # pending messages are kept in arrival order, indexed by `message_id`
+        self.pending = collections.OrderedDict()
+        self.pending_bytes = 0
+
+        # the committed ballots by `message_id`; the dict of the ballot is made
+        # when it is read, it has the votes of every validator
         self.ballot_history = dict()
 
+    def __len__(self):
+        if self.commit_log is not None:
+            return self.commit_log.messages
+
+        return len(self.messages)
+
+    @property
+    def message_ids(self):
+        if self.commit_log is not None:
+            message_ids = list()
+            for record in self.commit_log.iter_records():
+                message_ids.extend(map(lambda x: x.message_id, record.get_messages()))
+
+            return message_ids
+
+        return self.messages.keys()
+
+    @property
+    def pending_ids(self):
+        return self.pending.keys()
+
     def add(self, ballot):
         assert isinstance(ballot, Ballot)
         assert not ballot.is_empty()
         assert ballot.state == State.all_confirm
 
-        self.messages.append(ballot.message)
-        self.message_ids.append(ballot.message.message_id)
-        self.ballot_history[ballot.message.message_id] = ballot.to_dict()
+        if self.commit_log is not None:
+            self.commit_log.append(ballot)
+
+        # the messages of the batch are committed at once
+        for message in ballot.message.get_messages():
+            if self.commit_log is None:
+                self.messages[message.message_id] = message
+                self.hash_index.setdefault(message.hash_id, set()).add(message.message_id)
+
+            self.committed_messages.inc()
+            self.committed_bytes.inc(message.size)
+
+            # committed message does not need to wait anymore
+            self.remove_pending(message)
+
+        if self.commit_log is None:
+            if isinstance(ballot.message, Batch):
+                self.batches[ballot.message.message_id] = tuple(map(
+                    lambda x: x.message_id,
+                    ballot.message.get_messages(),
+                ))
+
+            self.slots[ballot.slot] = (ballot.message.message_id, ballot.round)
+            self.ballot_history[ballot.message.message_id] = ballot
+
+        self.committed_slots.inc()
 
         log.storage.info('%s: ballot was added: %s', self.node.name, ballot)
 
         return
 
+    def get(self, message_id):
+        if self.commit_log is not None:
+            record = self.commit_log.get_message(message_id)
+            if record is None:
+                return None
+
+            for message in record.get_messages():
+                if message.message_id == message_id:
+                    return message
+
+            return None
+
+        return self.messages.get(message_id)
+
+    def get_ballot_history(self, message_id):
+        if self.commit_log is not None:
+            record = self.commit_log.get_message(message_id)
+            if record is None or record.message.message_id != message_id:
+                return None
+
+            return record.to_dict(self.node)
+
+        ballot = self.ballot_history.get(message_id)
+        if ballot is None:
+            return None
+
+        return ballot.to_dict()
+
+    def get_by_hash(self, hash_id):
+        if self.commit_log is not None:
+            messages = list()
+            for record in self.commit_log.get_by_hash(hash_id):
+                messages.extend(filter(lambda x: x.hash_id == hash_id, record.get_messages()))
+
+            return messages
+
+        return list(map(self.messages.get, self.hash_index.get(hash_id, ())))
+
+    def get_batch(self, root):
+        '''
+        the committed batch is built again from it's messages
+        '''
+        if self.commit_log is not None:
+            record = self.commit_log.get_message(root)
+            if record is None or record.message.message_id != root or not isinstance(record.message, Batch):
+                return None
+
+            return record.message
+
+        if root not in self.batches:
+            return None
+
+        return Batch(None, root, list(map(self.messages.get, self.batches[root])))
+
+    def get_slot(self, slot):
+        '''
+        the committed message or batch of the slot and it's round; `None` if
+        the slot is not committed
+        '''
+        if self.commit_log is not None:
+            record = self.commit_log.get_slot(slot)
+            if record is None:
+                return None
+
+            return (record.message, record.round)
+
+        if slot not in self.slots:
+            return None
+
+        message_id, round = self.slots[slot]
+        message = self.messages.get(message_id)
+        if message is None:
+            message = self.get_batch(message_id)
+
+        return (message, round)
+
     def is_exists(self, message):
-        return message.message_id in self.message_ids
+        if self.commit_log is not None:
+            return self.commit_log.contains('m%s' % message.message_id)
+
+        return message.message_id in self.messages or message.message_id in self.batches
+
+    def is_exists_hash(self, hash_id):
+        if self.commit_log is not None:
+            return self.commit_log.contains('h%s' % hash_id)
+
+        return hash_id in self.hash_index
+
+    def close(self):
+        if self.commit_log is not None:
+            self.commit_log.close()
+
+        return
 
     def add_pending(self, message):
         assert isinstance(message, Message)
 
-        self.pending.append(message)
-        self.pending_ids.append(message.message_id)
+        if message.message_id in self.pending:
+            log.storage.debug('%s: message is already in pending: %s', self.node.name, message)
+
+            return False
+
+        if self.is_exists(message):
+            log.storage.debug('%s: message is already stored: %s', self.node.name, message)
+
+            return False
+
+        self.pending[message.message_id] = message
+        self.pending_bytes += message.size
+        self.pending_depth.set(len(self.pending))
 
         log.storage.info('%s: message was added to pending: %s', self.node.name, message)
 
-        return
+        return True
 
     def is_exists_pending(self, message):
-        return message.message_id in self.pending_ids
\ No newline at end of file
+        return message.message_id in self.pending
+
+    def remove_pending(self, message):
+        message = self.pending.pop(message.message_id, None)
+        if message is not None:
+            self.pending_bytes -= message.size
+            self.pending_depth.set(len(self.pending))
+
+        return message
+
+    def peek_pending(self):
+        '''
+        the oldest pending message; `None` if nothing is pending
+        '''
+        if len(self.pending) < 1:
+            return None
+
+        return next(iter(self.pending.values()))
+
+    def pop_pending(self):
+        '''
+        pop the oldest pending message; `None` if nothing is pending
+        '''
+        if len(self.pending) < 1:
+            return None
+
+        _, message = self.pending.popitem(last=False)
+        self.pending_bytes -= message.size
+        self.pending_depth.set(len(self.pending))
+
+        return message
+
+    def count_pending(self):
+        return len(self.pending)
@@ -0,0 +1,184 @@
+import collections
+import functools
+
+from ..common import (
+    log,
+)
+
+from ..network import (
+    Message,
+)
+
+
+# number of the messages validated by a worker at once
+DEFAULT_VALIDATION_BATCH_SIZE = 100
+
+# number of the verdicts kept by `hash_id`
+DEFAULT_VERDICT_CACHE_SIZE = 100000
+
+
+class Validator:
+    '''
+    the validator of the message, like the signature and payload checks; the
+    subclass overrides `validate`. With the process pool, the validator and
+    the messages are pickled to the workers, so the validator should be
+    defined at the module level.
+    '''
+    def validate(self, message):
+        return True
+
+
+def validate_batch(validator, messages):
+    '''
+    run in the worker; the verdicts of the messages in order
+    '''
+    return list(map(lambda x: bool(validator.validate(x)), messages))
+
+
+class ValidationPool:
+    '''
+    validate the messages by the `Validator` in the
+    `concurrent.futures.Executor`; the messages are collected until the end of
+    the loop iteration and sent to the workers in batches. Without the
+    executor, the messages are validated at once in the loop.
+
+    The verdicts are cached by `hash_id` and `callback` gets the validated
+    messages.
+    '''
+    validator = None
+    executor = None
+    batch_size = None
+    verdicts = None
+    cache_size = None
+    callback = None
+
+    # the messages waiting for the workers, and the `hash_id`s in the workers
+    queue = None
+    validating = None
+
+    def __init__(
+        self,
+        validator,
+        loop,
+        executor=None,
+        batch_size=DEFAULT_VALIDATION_BATCH_SIZE,
+        cache_size=DEFAULT_VERDICT_CACHE_SIZE,
+        callback=None,
+    ):
+        assert isinstance(validator, Validator)
+        assert type(batch_size) is int and batch_size > 0
+        assert type(cache_size) is int and cache_size > 0
+
+        self.validator = validator
+        self.loop = loop
+        self.executor = executor
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.callback = callback
+
+        self.verdicts = collections.OrderedDict()
+        self.queue = list()
+        self.validating = set()
+
+    def __repr__(self):
+        return '<ValidationPool: validator=%(validator)s executor=%(executor)s batch_size=%(batch_size)d>' % self.__dict__
+
+    def get_verdict(self, message):
+        '''
+        the verdict of the message; `None` while it is validated
+        '''
+        assert isinstance(message, Message)
+
+        verdict = self.verdicts.get(message.hash_id)
+        if verdict is not None:
+            return verdict
+
+        self.submit((message,))
+
+        return self.verdicts.get(message.hash_id)
+
+    def get_verdicts(self, message):
+        '''
+        the verdict of the message or the batch; the batch is valid only if
+        all the messages are valid
+        '''
+        is_validating = False
+        for m in message.get_messages():
+            verdict = self.get_verdict(m)
+            if verdict is False:
+                return False
+
+            if verdict is None:
+                is_validating = True
+
+        if is_validating:
+            return None
+
+        return True
+
+    def set_verdict(self, message, verdict):
+        self.verdicts[message.hash_id] = verdict
+        if len(self.verdicts) > self.cache_size:
+            self.verdicts.popitem(last=False)
+
+        return
+
+    def submit(self, messages):
+        '''
+        validate the messages, which are not validated yet
+        '''
+        messages = list(filter(
+            lambda x: x.hash_id not in self.verdicts and x.hash_id not in self.validating,
+            messages,
+        ))
+        if len(messages) < 1:
+            return
+
+        if self.executor is None:
+            for message, verdict in zip(messages, validate_batch(self.validator, messages)):
+                self.set_verdict(message, verdict)
+
+            return
+
+        if len(self.queue) < 1:
+            self.loop.call_soon(self.flush)
+
+        for message in messages:
+            self.validating.add(message.hash_id)
+            self.queue.append(message)
+
+        return
+
+    def flush(self):
+        queue, self.queue = self.queue, list()
+
+        for i in range(0, len(queue), self.batch_size):
+            messages = queue[i:i + self.batch_size]
+            future = self.loop.run_in_executor(self.executor, validate_batch, self.validator, messages)
+            future.add_done_callback(functools.partial(self._done, messages))
+
+        return
+
+    def _done(self, messages, future):
+        # the cancelled or failed messages are not cached, they are submitted
+        # again by the next `get_verdict`
+        for message in messages:
+            self.validating.discard(message.hash_id)
+
+        if future.cancelled():
+            return
+
+        try:
+            verdicts = future.result()
+        except Exception as e:
+            log.consensus.error('failed to validate %d messages, validated again later: %s', len(messages), e)
+
+            return
+
+        for message, verdict in zip(messages, verdicts):
+            self.set_verdict(message, verdict)
+
+        if self.callback is not None:
+            self.callback(messages)
+
+        return
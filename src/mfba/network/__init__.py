@@ -1,7 +1,14 @@
 from .base_server import BaseServer
+from .batch import Batch
+from .codec import BaseCodec, BinaryCodec, JSONCodec, ObjectCodec, get_codec
 from .base_transport import BaseTransport
+from .digest import MessageDigest
 from .endpoint import Endpoint
 from .local_transport import LocalTransportProtocol, LocalTransport
-from .message import Message
+from .memory_transport import MemoryTransport
+from .message import Message, VerifiedHashes
 from .node import Node
-from .quorum import Quorum
\ No newline at end of file
+from .quorum import Quorum
+from .ring import SharedMemoryRing
+from .shm_transport import ShmTransport
+from .tcp_transport import TcpConnection, TcpTransport
\ No newline at end of file
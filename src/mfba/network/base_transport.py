@@ -1,24 +1,151 @@
+from ..common import log, Metrics
+
+from .codec import JSONCodec
 from .endpoint import Endpoint
 
 class BaseTransport:
     name = None
     endpoint = None
+    codec = None
+    loop = None
     message_received_callback = None
 
-    def __init__(self, name, endpoint):
+    coalesce = None
+    coalesce_delay = None
+    outbox = None
+    flush_handle = None
+
+    metrics = None
+
+    def __init__(self, name, endpoint, codec=None, coalesce=True, coalesce_delay=0, metrics=None):
+        assert coalesce_delay >= 0
+
         self.name = name
         self.endpoint = Endpoint.from_uri(endpoint)
 
+        # the frames are encoded and decoded by the codec of the transport
+        self.codec = codec if codec is not None else JSONCodec()
+
+        # with `coalesce`, the frames to the same destination are collected
+        # and written at once, at the end of the loop iteration or after
+        # `coalesce_delay` seconds
+        self.coalesce = coalesce
+        self.coalesce_delay = coalesce_delay
+        self.outbox = dict()
+        self.flush_handle = None
+
+        # the counters of the frames and the bytes; `metrics` is shared with
+        # the consensus of the node
+        self.metrics = metrics if metrics is not None else Metrics(name)
+        self.frames_out = self.metrics.counter('transport.frames_out')
+        self.bytes_out = self.metrics.counter('transport.bytes_out')
+        self.writes_out = self.metrics.counter('transport.writes')
+        self.frames_in = self.metrics.counter('transport.frames_in')
+        self.bytes_in = self.metrics.counter('transport.bytes_in')
+
+    def to_dict(self):
+        return dict(
+            name=self.name,
+            endpoint=self.endpoint.to_dict(),
+            codec=self.codec.name,
+            frames_sent=self.frames_sent,
+            bytes_sent=self.bytes_sent,
+            writes=self.writes,
+            coalescing_ratio=self.coalescing_ratio,
+        )
+
+    @property
+    def frames_sent(self):
+        return self.frames_out.value
+
+    @property
+    def bytes_sent(self):
+        return self.bytes_out.value
+
+    @property
+    def writes(self):
+        return self.writes_out.value
+
+    @property
+    def coalescing_ratio(self):
+        '''
+        the average number of frames in a write
+        '''
+        if self.writes < 1:
+            return 0
+
+        return self.frames_sent / self.writes
+
     def receive(self, data):
         raise NotImplementedError()
 
+    def deliver(self, messages):
+        '''
+        hand over the received frames to the callback
+        '''
+        self.frames_in.inc(len(messages))
+        self.message_received_callback(messages)
+
+        return
+
     def write(self, data):
         raise NotImplementedError()
 
-    def send(self, data):
+    def write_frames(self, endpoint, frames):
         raise NotImplementedError()
 
+    def send(self, endpoint, data):
+        assert isinstance(endpoint, Endpoint)
+
+        log.transport.debug('%s: send: %s', self.name, data)
+
+        if not self.coalesce:
+            self._write_frames(endpoint, [data])
+
+            return
+
+        if endpoint.uri in self.outbox:
+            self.outbox[endpoint.uri][1].append(data)
+        else:
+            self.outbox[endpoint.uri] = (endpoint, [data])
+
+        if self.flush_handle is None:
+            if self.coalesce_delay > 0:
+                self.flush_handle = self.loop.call_later(self.coalesce_delay, self.flush)
+            else:
+                self.flush_handle = self.loop.call_soon(self.flush)
+
+        return
+
+    def flush(self):
+        self.flush_handle = None
+
+        outbox = self.outbox
+        self.outbox = dict()
+        for endpoint, frames in outbox.values():
+            self._write_frames(endpoint, frames)
+
+        return
+
+    def _write_frames(self, endpoint, frames):
+        self.writes_out.inc()
+        self.frames_out.inc(len(frames))
+        for frame in frames:
+            if isinstance(frame, (bytes, bytearray, memoryview)):
+                self.bytes_out.inc(len(frame))
+
+        self.write_frames(endpoint, frames)
+
+        return
+
     def start(self, message_received_callback):
         self.message_received_callback = message_received_callback
 
-        return
\ No newline at end of file
+        return
+
+    def stop(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        return
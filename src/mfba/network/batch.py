@@ -0,0 +1,133 @@
+import hashlib
+
+from .message import Message
+
+
+def merkle_root(messages):
+    '''
+    the leaves are the hash of `message_id` and `hash_id` of each message, if
+    the number of nodes in a level is odd, the last node is paired with itself
+    '''
+    level = list(map(
+        lambda x: hashlib.sha1((x.message_id + x.hash_id).encode()).digest(),
+        messages,
+    ))
+    if len(level) < 1:
+        return None
+
+    while len(level) > 1:
+        if len(level) % 2 == 1:
+            level.append(level[-1])
+
+        level = [
+            hashlib.sha1(level[i] + level[i + 1]).digest()
+            for i in range(0, len(level), 2)
+        ]
+
+    return level[0].hex()
+
+
+class Batch:
+    class InvalidBatchError(Message.InvalidMessageError):
+        pass
+
+    message_id = None
+    hash_id = None
+    messages = None
+
+    def __init__(self, node, root, messages):
+        assert type(messages) in (list, tuple)
+        assert len(messages) > 0
+        assert len(list(filter(lambda x: not isinstance(x, Message), messages))) < 1
+
+        if root != merkle_root(messages):
+            raise self.InvalidBatchError('merkle root does not match: %s' % root)
+
+        self.node = node
+
+        # batch is identified by the merkle root of the messages
+        self.message_id = root
+        self.hash_id = root
+        self.messages = tuple(messages)
+
+    def __repr__(self):
+        return '<Batch: node=%s message_id=%s messages=%d>' % (self.node, self.message_id, len(self.messages))
+
+    def __eq__(self, batch):
+        if not isinstance(batch, Batch):
+            return False
+
+        return batch.message_id == self.message_id
+
+    def __len__(self):
+        return len(self.messages)
+
+    @property
+    def size(self):
+        return sum(map(lambda x: x.size, self.messages))
+
+    def verify(self, verified_hashes=None):
+        for message in self.messages:
+            message.verify(verified_hashes)
+
+        return
+
+    def copy(self):
+        return self.__class__(
+            self.node,
+            self.message_id,
+            list(map(lambda x: x.copy(), self.messages)),
+        )
+
+    def to_dict(self):
+        return dict(
+            message=self.to_message_dict(),
+        )
+
+    def to_message_dict(self):
+        return dict(
+            hash_id=self.hash_id,
+            message_id=self.message_id,
+            messages=list(map(lambda x: x.to_message_dict(), self.messages)),
+        )
+
+    def pack_body(self, writer):
+        writer.hex_id(self.message_id)
+        writer.u32(len(self.messages))
+        for message in self.messages:
+            message.pack_body(writer)
+
+        return
+
+    @classmethod
+    def unpack_body(cls, reader, node):
+        root = reader.hex_id()
+        messages = list(map(
+            lambda x: Message.unpack_body(reader, node),
+            range(reader.u32()),
+        ))
+
+        return cls(node, root, messages)
+
+    @classmethod
+    def new(cls, messages):
+        return cls(None, merkle_root(messages), messages)
+
+    @classmethod
+    def from_dict(cls, o):
+        try:
+            m = o['message']
+            messages = list(map(
+                lambda x: Message(o['node'], x['message_id'], x['hash_id'], x['data']),
+                m['messages'],
+            ))
+
+            return cls(o['node'], m['message_id'], messages)
+        except (AssertionError, KeyError, TypeError) as e:
+            raise cls.InvalidBatchError(e)
+
+    def get_message(self):
+        return self
+
+    def get_messages(self):
+        return self.messages
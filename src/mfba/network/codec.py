@@ -0,0 +1,252 @@
+import json
+import struct
+
+from .framing import DelimiterFramer, LengthPrefixFramer
+from .message import Message
+
+
+class InvalidFrameError(Message.InvalidMessageError):
+    pass
+
+
+class BinaryWriter:
+    buf = None
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def getvalue(self):
+        return bytes(self.buf)
+
+    def u8(self, v):
+        self.buf.append(v)
+
+    def u32(self, v):
+        self.buf += struct.pack('>I', v)
+
+    def u64(self, v):
+        self.buf += struct.pack('>Q', v)
+
+    def string(self, v):
+        # `None` is written as the empty string
+        b = v.encode() if v is not None else b''
+        assert len(b) < 0x100
+
+        self.u8(len(b))
+        self.buf += b
+
+    def hex_id(self, v):
+        '''
+        the hex ids and digests are written as the raw bytes; the other
+        strings are flagged with the high bit of the length
+        '''
+        try:
+            b = bytes.fromhex(v)
+        except ValueError:
+            b = None
+
+        if b is None or b.hex() != v:
+            b = v.encode()
+            assert len(b) < 0x80
+
+            self.u8(0x80 | len(b))
+        else:
+            assert len(b) < 0x80
+
+            self.u8(len(b))
+
+        self.buf += b
+
+    def blob(self, v):
+        self.u32(len(v))
+        self.buf += v
+
+
+class BinaryReader:
+    view = None
+    offset = None
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.offset = 0
+
+    def read(self, n):
+        if self.offset + n > len(self.view):
+            raise InvalidFrameError('frame is too short: %d < %d' % (len(self.view), self.offset + n))
+
+        b = self.view[self.offset:self.offset + n]
+        self.offset += n
+
+        return b
+
+    def u8(self):
+        return self.read(1)[0]
+
+    def u32(self):
+        return struct.unpack('>I', self.read(4))[0]
+
+    def u64(self):
+        return struct.unpack('>Q', self.read(8))[0]
+
+    def string(self):
+        n = self.u8()
+        if n < 1:
+            return None
+
+        return bytes(self.read(n)).decode()
+
+    def hex_id(self):
+        n = self.u8()
+        if n & 0x80:
+            return bytes(self.read(n & 0x7f)).decode()
+
+        return self.read(n).hex()
+
+    def blob(self):
+        return bytes(self.read(self.u32()))
+
+
+class BaseCodec:
+    '''
+    the codec encodes the messages into the frames and decodes the frame into
+    the message; the message types are registered by `register`
+    '''
+    name = None
+    types = dict()
+    type_codes = dict()
+
+    # the frames of the stream are separated by `delimiter`; if `None`, the
+    # frames are prefixed by the length
+    delimiter = None
+
+    def __repr__(self):
+        return '<Codec: %s>' % self.name
+
+    @classmethod
+    def register(cls, message_class):
+        assert message_class.type_name not in BaseCodec.types
+        assert message_class.type_code not in BaseCodec.type_codes
+
+        BaseCodec.types[message_class.type_name] = message_class
+        BaseCodec.type_codes[message_class.type_code] = message_class
+
+        return message_class
+
+    def create_framer(self):
+        if self.delimiter is None:
+            return LengthPrefixFramer()
+
+        return DelimiterFramer(self.delimiter)
+
+    def unframe(self, data):
+        '''
+        the body of the single encoded frame
+        '''
+        if self.delimiter is None:
+            return memoryview(data)[4:]
+
+        return data[:-len(self.delimiter)]
+
+    def encode(self, message):
+        raise NotImplementedError()
+
+    def decode(self, frame):
+        raise NotImplementedError()
+
+
+class JSONCodec(BaseCodec):
+    name = 'json'
+    delimiter = b'\r\n\r\n'
+
+    def encode(self, message):
+        return message.serialize().encode()
+
+    def decode(self, frame):
+        # the broken utf-8 is not `JSONDecodeError`
+        try:
+            o = json.loads(frame)
+        except (UnicodeDecodeError, ValueError) as e:
+            raise InvalidFrameError(e)
+
+        if not isinstance(o, dict) or 'type_name' not in o:
+            raise InvalidFrameError('field, `type_name` is missing: %s' % o)
+
+        if o['type_name'] not in self.types:
+            raise InvalidFrameError('unknown `type_name`: %s' % o['type_name'])
+
+        # the frame is parsed only once, the message is built from the parsed
+        # object
+        return self.types[o['type_name']].from_dict(o)
+
+
+class BinaryCodec(BaseCodec):
+    '''
+    frame = length(u32) + version(u8) + type code(u8) + body
+    '''
+    name = 'binary'
+    version = 1
+
+    def encode(self, message):
+        writer = BinaryWriter()
+        writer.u8(self.version)
+        writer.u8(message.type_code)
+        message.pack(writer)
+
+        return struct.pack('>I', len(writer.buf)) + writer.buf
+
+    def decode(self, frame):
+        reader = BinaryReader(frame)
+
+        version = reader.u8()
+        if version != self.version:
+            raise InvalidFrameError('unsupported version: %d' % version)
+
+        type_code = reader.u8()
+        if type_code not in self.type_codes:
+            raise InvalidFrameError('unknown type code: %d' % type_code)
+
+        try:
+            return self.type_codes[type_code].unpack(reader)
+        except (AssertionError, UnicodeDecodeError, ValueError) as e:
+            raise InvalidFrameError(e)
+
+
+class ObjectCodec(BaseCodec):
+    '''
+    the message objects are passed without serialization; it works only in
+    the same process, like `MemoryTransport`. The passed objects are shared by
+    the nodes, so they must not be modified.
+    '''
+    name = 'object'
+
+    def create_framer(self):
+        raise NotImplementedError('`ObjectCodec` can not be used with the stream')
+
+    def unframe(self, data):
+        return data
+
+    def encode(self, message):
+        return message
+
+    def decode(self, frame):
+        if frame.__class__ not in self.types.values():
+            raise InvalidFrameError('unknown object: %s' % frame)
+
+        return frame
+
+
+CODECS = dict(
+    json=JSONCodec,
+    binary=BinaryCodec,
+    object=ObjectCodec,
+)
+
+
+def get_codec(name):
+    if name not in CODECS:
+        raise KeyError('unknown codec: %s' % name)
+
+    return CODECS[name]()
+
+
+BaseCodec.register(Message)
@@ -0,0 +1,76 @@
+class MessageDigest:
+    '''
+    the reference to the message or the batch by it's `message_id` and
+    `hash_id`; the content is not carried, the receiver finds it by the digest
+    '''
+    message_id = None
+    hash_id = None
+
+    def __init__(self, node, message_id, hash_id):
+        assert message_id is not None
+        assert hash_id is not None
+
+        self.node = node
+        self.message_id = message_id
+        self.hash_id = hash_id
+
+    def __repr__(self):
+        return '<MessageDigest: node=%(node)s message_id=%(message_id)s>' % self.__dict__
+
+    def __eq__(self, digest):
+        if not isinstance(digest, MessageDigest):
+            return False
+
+        return digest.message_id == self.message_id and digest.hash_id == self.hash_id
+
+    def __hash__(self):
+        return hash((self.message_id, self.hash_id))
+
+    @property
+    def size(self):
+        return 0
+
+    def copy(self):
+        return self.__class__(self.node, self.message_id, self.hash_id)
+
+    def to_dict(self):
+        return dict(
+            message=self.to_message_dict(),
+        )
+
+    def to_message_dict(self):
+        return dict(
+            hash_id=self.hash_id,
+            message_id=self.message_id,
+        )
+
+    def pack_body(self, writer):
+        writer.hex_id(self.message_id)
+        writer.hex_id(self.hash_id)
+
+        return
+
+    @classmethod
+    def unpack_body(cls, reader, node):
+        return cls(node, reader.hex_id(), reader.hex_id())
+
+    @classmethod
+    def of(cls, message):
+        return cls(message.node, message.message_id, message.hash_id)
+
+    @classmethod
+    def from_dict(cls, o):
+        m = o['message']
+        return cls(o['node'], m['message_id'], m['hash_id'])
+
+    def is_digest_of(self, message):
+        return message.message_id == self.message_id and message.hash_id == self.hash_id
+
+    def verify(self, verified_hashes=None):
+        return
+
+    def get_message(self):
+        return self
+
+    def get_messages(self):
+        return ()
@@ -1,5 +1,18 @@
+import functools
 import urllib.parse
 
+
+@functools.lru_cache(maxsize=4096)
+def parse_uri(uri):
+    '''
+    the scheme, the host and the port of the uri; the same uris are parsed
+    for the nodes of every quorum
+    '''
+    parsed = urllib.parse.urlparse(uri)
+
+    return (parsed.scheme, parsed.hostname, parsed.port)
+
+
 class Endpoint:
     scheme = None
     host = None
@@ -15,9 +28,7 @@ class Endpoint:
 
     @classmethod
     def from_uri(cls, uri):
-        parsed = urllib.parse.urlparse(uri)
-
-        return cls(parsed.scheme, parsed.hostname, parsed.port)
+        return cls(*parse_uri(uri))
 
     @property
     def uri(self):
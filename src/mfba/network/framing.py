@@ -0,0 +1,152 @@
+import struct
+
+from .message import Message
+
+
+class FrameTooBigError(Message.InvalidMessageError):
+    '''
+    the buffered bytes are dropped with the broken frame; `frames` are the
+    complete frames of the same `feed` before it
+    '''
+    frames = None
+
+    def __init__(self, message, frames=None):
+        super(FrameTooBigError, self).__init__(message)
+
+        self.frames = frames if frames is not None else list()
+
+
+# the frame bigger than this is treated as the broken stream
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+class BaseFramer:
+    '''
+    the framer splits the stream into the frames; `feed` returns the list of
+    the complete frames and keeps the partial frame until the next `feed`
+    '''
+    buf = None
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def feed(self, data):
+        raise NotImplementedError()
+
+    def reset(self):
+        self.buf = bytearray()
+
+        return
+
+
+class DelimiterFramer(BaseFramer):
+    delimiter = None
+
+    def __init__(self, delimiter):
+        super(DelimiterFramer, self).__init__()
+
+        assert isinstance(delimiter, bytes) and len(delimiter) > 0
+
+        self.delimiter = delimiter
+
+        # the buffered bytes before `scanned` do not contain the delimiter
+        self.scanned = 0
+
+    def feed(self, data):
+        if len(self.buf) > 0:
+            self.buf += data
+
+            # the delimiter can be split across the chunks, so the search
+            # starts before the end of the last chunk
+            if self.buf.find(self.delimiter, self.scanned) < 0:
+                self.scanned = max(0, len(self.buf) - len(self.delimiter) + 1)
+                self._check_size(list())
+
+                return []
+
+            data = bytes(self.buf)
+            self.buf = bytearray()
+
+        frames = list()
+        start = 0
+        size = len(self.delimiter)
+        while True:
+            i = data.find(self.delimiter, start)
+            if i < 0:
+                break
+
+            frames.append(data[start:i])
+            start = i + size
+
+        if start < len(data):
+            self.buf += memoryview(data)[start:]
+
+        self.scanned = max(0, len(self.buf) - size + 1)
+        self._check_size(frames)
+
+        return frames
+
+    def reset(self):
+        super(DelimiterFramer, self).reset()
+        self.scanned = 0
+
+        return
+
+    def _check_size(self, frames):
+        if len(self.buf) > MAX_FRAME_SIZE:
+            self.reset()
+
+            raise FrameTooBigError('frame is too big', frames=frames)
+
+        return
+
+
+class LengthPrefixFramer(BaseFramer):
+    '''
+    the frames are handed over as `memoryview` of the received chunk without
+    copy, except the frame which was split across the chunks
+    '''
+    header = struct.Struct('>I')
+
+    def feed(self, data):
+        if len(self.buf) > 0:
+            self.buf += data
+
+            if len(self.buf) < self.header.size:
+                return []
+
+            length = self.header.unpack_from(self.buf)[0]
+            self._check_length(length, list())
+            if len(self.buf) < self.header.size + length:
+                return []
+
+            data = bytes(self.buf)
+            self.buf = bytearray()
+
+        view = memoryview(data)
+        frames = list()
+        offset = 0
+        size = len(data)
+        while size - offset >= self.header.size:
+            length = self.header.unpack_from(data, offset)[0]
+            self._check_length(length, frames)
+
+            end = offset + self.header.size + length
+            if end > size:
+                break
+
+            frames.append(view[offset + self.header.size:end])
+            offset = end
+
+        if offset < size:
+            self.buf += view[offset:]
+
+        return frames
+
+    def _check_length(self, length, frames):
+        if length > MAX_FRAME_SIZE:
+            self.reset()
+
+            raise FrameTooBigError('frame is too big: %d' % length, frames=frames)
+
+        return
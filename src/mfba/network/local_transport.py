@@ -5,8 +5,8 @@ from ..common import (
     log,
 )
 
-from .endpoint import Endpoint
 from .base_transport import BaseTransport
+from .message import Message
 
 
 LOCAL_TRANSPORT_LIST = dict(
@@ -29,15 +29,15 @@ class LocalTransport(BaseTransport):
     rsock = None
     wsock = None
     protocol = None
+    write_transport = None
 
-    buf = None
-    data_delimeter = list('\r\n\r\n')
+    framer = None
 
-    def __init__(self, name, endpoint, loop):
-        super(LocalTransport, self).__init__(name, endpoint)
+    def __init__(self, name, endpoint, loop, codec=None, **kw):
+        super(LocalTransport, self).__init__(name, endpoint, codec=codec, **kw)
 
         self.loop = loop
-        self.buf = list()
+        self.framer = self.codec.create_framer()
         LOCAL_TRANSPORT_LIST[self.endpoint.uri] = self
 
     def start(self, *a, **kw):
@@ -49,59 +49,46 @@ class LocalTransport(BaseTransport):
         _, self.protocol = self.loop.run_until_complete(conn)
         self.protocol.data_received = self.data_receive
 
+        # the write side is also handled by the loop, so the write does not
+        # block the loop when the socket buffer is full
+        conn = self.loop.create_connection(LocalTransportProtocol, sock=self.wsock)
+        self.write_transport, _ = self.loop.run_until_complete(conn)
+
         return
 
     def data_receive(self, data):
-        self.receive(data.decode())
+        self.receive(data)
 
         return
 
     def receive(self, data):
-        log.transport.debug('%s: received: %s', self.name, data.encode())
-
-        if '\r\n\r\n' not in data:
-            self.buf.append(data)
-
-            return
-
-        messages = list()
-        cr = list()
-        sl = self.buf
-        self.buf = list()
-        for s in data:
-            if s == self.data_delimeter[len(cr)]:
-                cr.append(s)
+        log.transport.debug('%s: received: %s', self.name, data)
 
-                if self.data_delimeter == cr:
-                    messages.append(''.join(sl))
-                    cr = list()
-                    sl = list()
+        self.bytes_in.inc(len(data))
 
-                continue
+        try:
+            messages = self.framer.feed(data)
+        except Message.InvalidMessageError as e:
+            log.transport.error('%s: broken stream: %s', self.name, e)
 
-            if len(cr) > 0 and s != self.data_delimeter[len(cr)]:
-                s = ''.join(cr) + s
-                cr = list()
-
-            sl.append(s)
-
-        if len(sl) > 0:
-            self.buf.extend(sl)
+            return
 
-        self.message_received_callback(messages)
+        if len(messages) > 0:
+            self.deliver(messages)
 
         return
 
     def write(self, data):
-        log.transport.debug('%s: wrote: %s', self.name, data.encode())
+        log.transport.debug('%s: wrote: %s', self.name, data)
 
-        return self.wsock.send(data.encode())
+        return self.write_transport.write(data)
 
-    def send(self, endpoint, data):
-        assert isinstance(endpoint, Endpoint)
+    def writelines(self, frames):
+        log.transport.debug('%s: wrote %d frames', self.name, len(frames))
 
-        log.transport.debug('%s: send: %s', self.name, data.strip().encode())
+        return self.write_transport.writelines(frames)
 
-        LOCAL_TRANSPORT_LIST[endpoint.uri].write(data)
+    def write_frames(self, endpoint, frames):
+        LOCAL_TRANSPORT_LIST[endpoint.uri].writelines(frames)
 
-        return
\ No newline at end of file
+        return
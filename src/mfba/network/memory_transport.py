@@ -0,0 +1,71 @@
+from ..common import (
+    log,
+)
+
+from .base_transport import BaseTransport
+
+
+MEMORY_TRANSPORT_LIST = dict(
+)
+
+class MemoryTransport(BaseTransport):
+    '''
+    the frames are delivered to the callback of the peer by the loop, without
+    socket; the frames are handed over one by one, so the stream is never
+    parsed. With `ObjectCodec`, the message objects are passed as it is.
+    '''
+    loop = None
+
+    def __init__(self, name, endpoint, loop, codec=None, **kw):
+        super(MemoryTransport, self).__init__(name, endpoint, codec=codec, **kw)
+
+        self.loop = loop
+        MEMORY_TRANSPORT_LIST[self.endpoint.uri] = self
+
+    def stop(self):
+        super(MemoryTransport, self).stop()
+
+        if MEMORY_TRANSPORT_LIST.get(self.endpoint.uri) is self:
+            del MEMORY_TRANSPORT_LIST[self.endpoint.uri]
+
+        return
+
+    def receive(self, data):
+        log.transport.debug('%s: received: %s', self.name, data)
+
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            self.bytes_in.inc(len(data))
+
+        self.deliver([self.codec.unframe(data)])
+
+        return
+
+    def receive_frames(self, frames):
+        log.transport.debug('%s: received %d frames', self.name, len(frames))
+
+        for frame in frames:
+            if isinstance(frame, (bytes, bytearray, memoryview)):
+                self.bytes_in.inc(len(frame))
+
+        self.deliver(list(map(self.codec.unframe, frames)))
+
+        return
+
+    def write(self, data):
+        log.transport.debug('%s: wrote: %s', self.name, data)
+
+        self.loop.call_soon(self.receive, data)
+
+        return
+
+    def writelines(self, frames):
+        log.transport.debug('%s: wrote %d frames', self.name, len(frames))
+
+        self.loop.call_soon(self.receive_frames, frames)
+
+        return
+
+    def write_frames(self, endpoint, frames):
+        MEMORY_TRANSPORT_LIST[endpoint.uri].writelines(frames)
+
+        return
@@ -1,3 +1,4 @@
+import collections
 import time
 import hashlib
 import uuid
@@ -6,30 +7,100 @@ import json
 
 CLOCK_SEQ = int(time.time() * 1000000)
 
+# number of the `hash_id`s kept by `VerifiedHashes`
+DEFAULT_MAX_VERIFIED_HASHES = 100000
+
+
+class VerifiedHashes:
+    '''
+    the verified `hash_id` to it's data, so the same data is hashed only once;
+    every node has it's own, the nodes in the same process do not share the
+    cost of the hashing
+    '''
+    hashes = None
+    max_size = None
+
+    def __init__(self, max_size=DEFAULT_MAX_VERIFIED_HASHES):
+        assert type(max_size) is int and max_size > 0
+
+        self.hashes = collections.OrderedDict()
+        self.max_size = max_size
+
+    def __repr__(self):
+        return '<VerifiedHashes: hashes=%d max_size=%d>' % (len(self.hashes), self.max_size)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def is_verified(self, message):
+        data = self.hashes.get(message.hash_id)
+        if data is None or data != message.data:
+            return False
+
+        self.hashes.move_to_end(message.hash_id)
+
+        return True
+
+    def add(self, message):
+        self.hashes[message.hash_id] = message.data
+        if len(self.hashes) > self.max_size:
+            self.hashes.popitem(last=False)
+
+        return
+
 
 class Message:
     class InvalidMessageError(Exception):
         pass
 
+    type_name = 'message'
+    type_code = 1
+
     message_id = None
     hash_id = None
     data = None
+    is_verified = None
 
     def __init__(self, node, message_id, hash_id, data):
         assert isinstance(data, str)
         assert message_id is not None
-        assert hash_id == hashlib.sha1(data.encode()).hexdigest()
 
         self.node = node
         self.message_id = message_id
         self.hash_id = hash_id
         self.data = data
 
+        # `hash_id` is checked by `verify`, not here
+        self.is_verified = False
+
     def __repr__(self):
         d = self.__dict__.copy()
         d['data'] = d['data'] if len(d['data']) < 10 else (d['data'][:10] + '...')
         return '<Message: node=%(node)s message_id=%(message_id)s data=%(data)s>' % d
 
+    def verify(self, verified_hashes=None):
+        '''
+        check `hash_id` of the data; raise `InvalidMessageError` if it does not
+        match. The data in `verified_hashes` of the node is not hashed again;
+        with it, `is_verified` is not trusted, the message object may be
+        shared by the nodes of `ObjectCodec`.
+        '''
+        if verified_hashes is None and self.is_verified:
+            return
+
+        if verified_hashes is not None and verified_hashes.is_verified(self):
+            return
+
+        if self.hash_id != hashlib.sha1(self.data.encode()).hexdigest():
+            raise self.InvalidMessageError('`hash_id` does not match: %s' % self.message_id)
+
+        if verified_hashes is not None:
+            verified_hashes.add(self)
+
+        self.is_verified = True
+
+        return
+
     def __eq__(self, message):
         if not isinstance(message, Message):
             return False
@@ -45,13 +116,20 @@ class Message:
 
         return True
 
+    @property
+    def size(self):
+        return len(self.data.encode())
+
     def copy(self):
-        return self.__class__(
+        message = self.__class__(
             self.node,
             self.message_id,
             self.hash_id,
             self.data,
         )
+        message.is_verified = self.is_verified
+
+        return message
 
     def to_dict(self):
         return dict(
@@ -65,22 +143,53 @@ class Message:
             data=self.data,
         )
 
-    def serialize(self, node):
+    def serialize(self, node=None):
         d = self.to_dict()
-        d['node'] = node.name
-        d['type_name'] = 'message'
+        d['node'] = node.name if node is not None else self.node
+        d['type_name'] = self.type_name
         return json.dumps(d) + '\r\n\r\n'
 
+    def pack(self, writer):
+        writer.string(self.node)
+        self.pack_body(writer)
+
+        return
+
+    def pack_body(self, writer):
+        writer.hex_id(self.message_id)
+        writer.hex_id(self.hash_id)
+        writer.blob(self.data.encode())
+
+        return
+
     @classmethod
-    def new(cls, data):
+    def unpack(cls, reader):
+        return cls.unpack_body(reader, reader.string())
+
+    @classmethod
+    def unpack_body(cls, reader, node):
+        message_id = reader.hex_id()
+        hash_id = reader.hex_id()
+
+        return cls(node, message_id, hash_id, reader.blob().decode())
+
+    @classmethod
+    def new(cls, data, node=None, message_id=None):
+        '''
+        the new message of the data; `message_id` is the hex string, time
+        based by default
+        '''
         assert isinstance(data, str)
 
-        return cls(
-            None,
-            uuid.uuid1(clock_seq=CLOCK_SEQ).hex,
+        message = cls(
+            node,
+            message_id if message_id is not None else uuid.uuid1(clock_seq=CLOCK_SEQ).hex,
             hashlib.sha1(data.encode()).hexdigest(),
             data,
         )
+        message.is_verified = True
+
+        return message
 
     @classmethod
     def from_json(cls, data):
@@ -89,19 +198,24 @@ class Message:
         except json.decoder.JSONDecodeError as e:
             raise cls.InvalidMessageError(e)
 
-        if 'type_name' not in o or o['type_name'] != 'message':
+        if not isinstance(o, dict) or o.get('type_name') != 'message':
             raise cls.InvalidMessageError('`type_name` is not "message"')
 
+        return cls.from_dict(o)
+
+    @classmethod
+    def from_dict(cls, o):
+        '''
+        the message from the parsed JSON object
+        '''
         try:
             m = o['message']
             return cls(o['node'], m['message_id'], m['hash_id'], m['data'])
-        except KeyError as e:
+        except (AssertionError, KeyError, TypeError) as e:
             raise cls.InvalidMessageError(e)
 
-    @classmethod
-    def from_dict(cls, o):
-        m = o['message']
-        return cls(o['node'], m['message_id'], m['hash_id'], m['data'])
-
     def get_message(self):
-        return self
\ No newline at end of file
+        return self
+
+    def get_messages(self):
+        return (self,)
\ No newline at end of file
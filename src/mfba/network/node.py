@@ -12,6 +12,9 @@ class Node:
         if quorum is not None and quorum.is_inside(self):
             quorum.remove(self)
 
+        if quorum is not None:
+            quorum.bind(self)
+
         self.quorum = quorum
 
     def __repr__(self):
@@ -1,11 +1,36 @@
+import hashlib
 import math
+
+from ..common import iter_bits
+
 from .node import Node
 
 class Quorum:
     validators = None
     threshold = None
+    local = None
+
+    # the validator name to the node
+    members = None
+
+    # derived from the validators and threshold; updated by `insert` and
+    # `remove`
+    size = None
+    _minimum_quorum = None
+
+    # the validator name to it's index, the index is the bit of the votes
+    indices = None
+    names = None
+    member_mask = None
+    member_indices = None
+
+    # the digest of the names in the order of the indices; the bits of the
+    # votes mean the same validators only in the quorums of the same digest
+    membership = None
 
     def __init__(self, threshold, validators):
+        validators = list(validators)
+
         assert type(threshold) in (float, int)
         assert threshold <= 100 and threshold > 0  # threshold must be percentile
         assert len(
@@ -14,31 +39,124 @@ class Quorum:
 
         self.threshold = threshold
         self.validators = validators
+        self.members = dict(map(lambda x: (x.name, x), self.validators))
+
+        self.local = None
+        self.assign_indices()
+        self.update()
 
     def __repr__(self):
-        return '<Quorum: threshold=%(threshold)s validators=%(validators)s>' % self.__dict__
+        return '<Quorum: threshold=%s validators=%s>' % (self.threshold, self.validators)
+
+    def assign_indices(self):
+        '''
+        the indices are assigned in the order of the names, so the nodes, which
+        have the same members, have the same indices
+        '''
+        names = set(map(lambda x: x.name, self.validators))
+        if self.local is not None:
+            names.add(self.local.name)
+
+        self.names = sorted(names)
+        self.indices = dict(map(lambda x: (x[1], x[0]), enumerate(self.names)))
+        self.member_mask = (1 << len(self.names)) - 1
+
+        return
+
+    def bind(self, node):
+        '''
+        set the local node; the local node is also the member of quorum
+        '''
+        self.local = node
+        self.assign_indices()
+        self.update()
+
+        return
+
+    def index_of(self, node):
+        '''
+        the index of the member; `None` if the node is not the member
+        '''
+        index = self.indices.get(node.name)
+        if index is None or not (self.member_mask >> index) & 1:
+            return None
+
+        return index
+
+    def name_of(self, index):
+        return self.names[index]
+
+    def update(self):
+        # the local node is also counted
+        self.size = len(self.validators) + 1
+        self._minimum_quorum = None
+        self.member_indices = list(iter_bits(self.member_mask))
+        self.membership = int.from_bytes(
+            hashlib.blake2b('\n'.join(self.names).encode(), digest_size=8).digest(),
+            'big',
+        )
+
+        return
+
+    def get(self, name):
+        return self.members.get(name)
 
     def is_inside(self, node):
-        return len(list(filter(lambda x: x.name == node.name, self.validators))) > 0
+        return node.name in self.members
 
     # remove node from quorum
     def remove(self, node):
         if not self.is_inside(node):
             return
 
-        self.validators = filter(lambda x: x != node, self.validators)
+        del self.members[node.name]
+
+        # the list is replaced, not changed, so the iteration over the
+        # validators, like broadcasting, is not affected
+        self.validators = list(filter(lambda x: x.name != node.name, self.validators))
+
+        # the index of the removed node is not reused
+        self.member_mask &= ~(1 << self.indices[node.name])
+        self.update()
+
         return
 
     # add node to quorum
     def insert(self, node):
-        self.validators.append(node)        
+        assert isinstance(node, Node)
+
+        if self.is_inside(node):
+            return
+
+        self.members[node.name] = node
+        self.validators = self.validators + [node]
+
+        if node.name not in self.indices:
+            self.indices[node.name] = len(self.names)
+            self.names.append(node.name)
+
+        self.member_mask |= 1 << self.indices[node.name]
+        self.update()
+
+        return
 
     @property
     def minimum_quorum(self):
         '''
         the required minimum quorum will be round *up*
         '''
-        return math.ceil((len(self.validators) + 1) * (self.threshold / 100))
+        if self._minimum_quorum is None:
+            self._minimum_quorum = math.ceil(self.size * (self.threshold / 100))
+
+        return self._minimum_quorum
+
+    @property
+    def minimum_blocking(self):
+        '''
+        one more than the validators out of the minimum quorum; the set of this
+        size has at least one validator, which is not faulty
+        '''
+        return self.size - self.minimum_quorum + 1
 
     def to_dict(self, simple=True):
         return dict(
@@ -0,0 +1,216 @@
+import struct
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+
+# bytes of the frames in the ring
+DEFAULT_RING_SIZE = 1 << 22
+
+
+def open_shared_memory(name, create=False, size=0):
+    '''
+    the shared memory, which is not tracked by `resource_tracker`; the ring is
+    removed only by the writer, but the tracker removes the tracked memory when
+    any process of it exits, and the processes of the same parent share the
+    tracker
+    '''
+    try:
+        return SharedMemory(name, create=create, size=size, track=False)
+    except TypeError:
+        shm = SharedMemory(name, create=create, size=size)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+
+        return shm
+
+
+def unlink_shared_memory(shm):
+    # `unlink` of the older python always lets the tracker forget the memory
+    if getattr(shm, '_track', True):
+        resource_tracker.register(shm._name, 'shared_memory')
+
+    shm.unlink()
+
+    return
+
+
+class SharedMemoryRing:
+    '''
+    the ring of the frames in the shared memory with the single writer and
+    the single reader; `tail` is moved only by the writer and `head` only by
+    the reader, so the ring needs no lock.
+
+        ring = head(u64) + size(u64) + padding + tail(u64) + padding + data
+        record = length(u32) + frame + padding
+
+    the record is never split; when the record does not fit at the end of the
+    data, the rest of the data is skipped by the `WRAP` length. The frame is
+    at most the half of the ring, so the skipped data and the record always
+    fit, once the reader read everything.
+    '''
+    class FrameTooLargeError(Exception):
+        pass
+
+    header_size = 128
+    head_offset = 0
+    size_offset = 8
+    tail_offset = 64
+
+    counter = struct.Struct('=Q')
+    length = struct.Struct('=I')
+
+    WRAP = 0xffffffff
+
+    # the records start at the multiple of `align`
+    align = 8
+
+    name = None
+    size = None
+    shm = None
+    buf = None
+    created = None
+
+    # the tail of the writer and the head of the reader; the other side reads
+    # them from the shared memory
+    tail = None
+    head = None
+
+    def __init__(self, shm, created=False):
+        self.shm = shm
+        self.buf = shm.buf
+        self.name = shm.name
+        self.created = created
+
+        self.size = self.counter.unpack_from(self.buf, self.size_offset)[0]
+        self.head = self.counter.unpack_from(self.buf, self.head_offset)[0]
+        self.tail = self.counter.unpack_from(self.buf, self.tail_offset)[0]
+
+    def __repr__(self):
+        return '<SharedMemoryRing: name=%s size=%d head=%d tail=%d>' % (
+            self.name,
+            self.size,
+            self.head,
+            self.tail,
+        )
+
+    @classmethod
+    def create(cls, name, size=DEFAULT_RING_SIZE):
+        assert size > 0 and size % cls.align == 0
+
+        try:
+            shm = open_shared_memory(name, create=True, size=cls.header_size + size)
+        except FileExistsError:
+            # the ring of the previous run was not removed
+            stale = open_shared_memory(name)
+            stale.close()
+            unlink_shared_memory(stale)
+
+            shm = open_shared_memory(name, create=True, size=cls.header_size + size)
+
+        shm.buf[:cls.header_size] = bytes(cls.header_size)
+        cls.counter.pack_into(shm.buf, cls.size_offset, size)
+
+        return cls(shm, created=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(open_shared_memory(name))
+
+    @property
+    def max_frame_size(self):
+        return self.size // 2 - self.length.size
+
+    def get_record_size(self, frame):
+        return (self.length.size + len(frame) + self.align - 1) // self.align * self.align
+
+    def write(self, frames):
+        '''
+        write the frames as many as the free space allows; return the number
+        of the written frames and whether the reader may wait for the new
+        frames
+        '''
+        for frame in frames:
+            if len(frame) > self.max_frame_size:
+                raise self.FrameTooLargeError('frame is larger than the ring: %d > %d' % (len(frame), self.max_frame_size))
+
+        head = self.counter.unpack_from(self.buf, self.head_offset)[0]
+        started = tail = self.tail
+
+        written = 0
+        for frame in frames:
+            record_size = self.get_record_size(frame)
+            position = tail % self.size
+            skip = self.size - position if self.size - position < record_size else 0
+            if tail + skip + record_size - head > self.size:
+                break
+
+            if skip > 0:
+                self.length.pack_into(self.buf, self.header_size + position, self.WRAP)
+                tail += skip
+                position = 0
+
+            offset = self.header_size + position
+            self.length.pack_into(self.buf, offset, len(frame))
+            self.buf[offset + self.length.size:offset + self.length.size + len(frame)] = frame
+            tail += record_size
+            written += 1
+
+        if written < 1:
+            return 0, False
+
+        # the frames are published at once by the tail
+        self.tail = tail
+        self.counter.pack_into(self.buf, self.tail_offset, tail)
+
+        # the reader read everything before this write, so it may be waiting
+        head = self.counter.unpack_from(self.buf, self.head_offset)[0]
+
+        return written, head == started
+
+    def read(self):
+        '''
+        the frames written after the head; the frames are the memoryviews of
+        the ring, they are valid until `consume` is called with the returned
+        head
+        '''
+        tail = self.counter.unpack_from(self.buf, self.tail_offset)[0]
+        head = self.head
+
+        frames = list()
+        while head < tail:
+            position = head % self.size
+            offset = self.header_size + position
+            length = self.length.unpack_from(self.buf, offset)[0]
+            if length == self.WRAP:
+                head += self.size - position
+
+                continue
+
+            frames.append(self.buf[offset + self.length.size:offset + self.length.size + length])
+            head += (self.length.size + length + self.align - 1) // self.align * self.align
+
+        return frames, head
+
+    def consume(self, head):
+        '''
+        free the frames before `head` for the writer; return whether more
+        frames were written in the meantime
+        '''
+        self.head = head
+        self.counter.pack_into(self.buf, self.head_offset, head)
+
+        return self.counter.unpack_from(self.buf, self.tail_offset)[0] != head
+
+    def close(self):
+        self.buf = None
+
+        try:
+            self.shm.close()
+        except BufferError:
+            # the frame is still referenced; the memory is unmapped when the
+            # frame is released
+            pass
+
+        if self.created:
+            unlink_shared_memory(self.shm)
+
+        return
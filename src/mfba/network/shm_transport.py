@@ -0,0 +1,269 @@
+import errno
+import hashlib
+import os
+import tempfile
+
+from ..common import (
+    log,
+)
+
+from .base_transport import BaseTransport
+from .codec import ObjectCodec
+from .message import Message
+from .ring import DEFAULT_RING_SIZE, SharedMemoryRing
+
+
+# seconds to wait before the full ring or the peer, which is not started yet,
+# is tried again
+DEFAULT_RETRY_DELAY = 0.001
+
+
+def get_key(s):
+    return hashlib.sha1(s.encode()).hexdigest()[:20]
+
+
+class ShmTransport(BaseTransport):
+    '''
+    the frames to the node in the other process on the same host are written
+    to the shared memory ring of the pair of the nodes, without the syscall
+    and the copy of the socket. Every node has the named pipe, `directory`
+    /mfba-<key>.pipe, which wakes up the node, when the ring was empty, and
+    tells it the name of the new ring; the pipe is watched by the loop.
+
+    the received frames are handed over to the codec as the memoryview of the
+    ring, and the ring is freed after the frames are decoded.
+    '''
+    loop = None
+    directory = None
+    ring_size = None
+    retry_delay = None
+
+    pipe = None
+    pipe_path = None
+    pipe_keep = None
+
+    # the rings to the peers by uri, the rings from the peers by name and the
+    # peers which know the ring
+    rings = None
+    inbound = None
+    announced = None
+    peer_pipes = None
+
+    # the frames waiting for the free space of the ring
+    backlog = None
+    retry_handle = None
+
+    def __init__(
+        self,
+        name,
+        endpoint,
+        loop,
+        codec=None,
+        directory=None,
+        ring_size=DEFAULT_RING_SIZE,
+        retry_delay=DEFAULT_RETRY_DELAY,
+        **kw
+    ):
+        super(ShmTransport, self).__init__(name, endpoint, codec=codec, **kw)
+
+        assert not isinstance(self.codec, ObjectCodec)
+
+        self.loop = loop
+        self.directory = directory if directory is not None else tempfile.gettempdir()
+        self.ring_size = ring_size
+        self.retry_delay = retry_delay
+
+        self.rings = dict()
+        self.inbound = dict()
+        self.announced = set()
+        self.peer_pipes = dict()
+        self.backlog = dict()
+
+    def get_pipe_path(self, uri):
+        return os.path.join(self.directory, 'mfba-%s.pipe' % get_key(uri))
+
+    def get_ring_name(self, uri):
+        return 'mfba-%s' % get_key('%s>%s' % (self.endpoint.uri, uri))
+
+    def start(self, *a, **kw):
+        super(ShmTransport, self).start(*a, **kw)
+
+        self.pipe_path = self.get_pipe_path(self.endpoint.uri)
+        if os.path.exists(self.pipe_path):
+            os.unlink(self.pipe_path)
+        os.mkfifo(self.pipe_path, 0o600)
+
+        # the pipe is also opened to write, so the pipe is not closed, when
+        # the peers close it
+        self.pipe = os.open(self.pipe_path, os.O_RDONLY | os.O_NONBLOCK)
+        self.pipe_keep = os.open(self.pipe_path, os.O_WRONLY | os.O_NONBLOCK)
+        self.loop.add_reader(self.pipe, self.wakeup)
+
+        return
+
+    def stop(self):
+        super(ShmTransport, self).stop()
+
+        if self.retry_handle is not None:
+            self.retry_handle.cancel()
+            self.retry_handle = None
+
+        if self.pipe is not None:
+            self.loop.remove_reader(self.pipe)
+            os.close(self.pipe)
+            os.close(self.pipe_keep)
+            os.unlink(self.pipe_path)
+            self.pipe = None
+
+        for pipe in self.peer_pipes.values():
+            os.close(pipe)
+        self.peer_pipes = dict()
+
+        for ring in list(self.inbound.values()) + list(self.rings.values()):
+            ring.close()
+        self.inbound = dict()
+        self.rings = dict()
+
+        return
+
+    def wakeup(self):
+        names = list()
+        while True:
+            try:
+                data = os.read(self.pipe, 65536)
+            except BlockingIOError:
+                break
+
+            if len(data) < 1:
+                break
+
+            names.extend(filter(lambda x: len(x) > 0, data.split(b'\n')))
+
+        for name in names:
+            name = name.decode()
+            if name not in self.inbound:
+                log.transport.debug('%s: new ring: %s', self.name, name)
+                self.inbound[name] = SharedMemoryRing.attach(name)
+
+        for ring in self.inbound.values():
+            self.receive(ring)
+
+        return
+
+    def receive(self, ring):
+        # the codec with the delimiter parses the frame by `json`, which does
+        # not take the memoryview
+        copy = self.codec.delimiter is not None
+
+        while True:
+            frames, head = ring.read()
+            if len(frames) > 0:
+                log.transport.debug('%s: received %d frames from %s', self.name, len(frames), ring.name)
+
+                for frame in frames:
+                    self.bytes_in.inc(len(frame))
+
+                if copy:
+                    frames = list(map(bytes, frames))
+
+                try:
+                    self.deliver(list(map(self.codec.unframe, frames)))
+                except Message.InvalidMessageError as e:
+                    log.transport.error('%s: broken frame: %s', self.name, e)
+
+                # the frames must not be referenced after the ring is freed
+                del frames
+
+            if not ring.consume(head):
+                break
+
+        return
+
+    def write_frames(self, endpoint, frames):
+        uri = endpoint.uri
+
+        # the frames keep the order behind the frames waiting for the space
+        if uri in self.backlog:
+            self.backlog[uri].extend(frames)
+
+            return
+
+        self.write_ring(uri, frames)
+
+        return
+
+    def write_ring(self, uri, frames):
+        ring = self.rings.get(uri)
+        if ring is None:
+            ring = self.rings[uri] = SharedMemoryRing.create(self.get_ring_name(uri), size=self.ring_size)
+
+        if any(map(lambda x: len(x) > ring.max_frame_size, frames)):
+            log.transport.error('%s: frame to %s is larger than the ring, dropped', self.name, uri)
+            frames = list(filter(lambda x: len(x) <= ring.max_frame_size, frames))
+
+        written, wait = ring.write(frames)
+        if written < len(frames):
+            log.transport.debug('%s: ring to %s is full, %d frames wait', self.name, uri, len(frames) - written)
+            self.backlog[uri] = list(frames[written:])
+            self.schedule_retry()
+
+        if written > 0 and (wait or uri not in self.announced):
+            self.notify(uri, ring)
+
+        return
+
+    def notify(self, uri, ring):
+        '''
+        wake up the peer; the first message tells the name of the ring
+        '''
+        announced = uri in self.announced
+        data = b'\n' if announced else ring.name.encode() + b'\n'
+
+        try:
+            pipe = self.peer_pipes.get(uri)
+            if pipe is None:
+                pipe = self.peer_pipes[uri] = os.open(self.get_pipe_path(uri), os.O_WRONLY | os.O_NONBLOCK)
+
+            os.write(pipe, data)
+        except BlockingIOError:
+            # the pipe is full of the wake ups, so the peer reads the ring soon
+            if not announced:
+                self.schedule_retry()
+
+            return
+        except OSError as e:
+            # the peer is not started yet or stopped
+            if e.errno not in (errno.ENOENT, errno.ENXIO, errno.EPIPE):
+                raise
+
+            if e.errno == errno.EPIPE:
+                os.close(self.peer_pipes.pop(uri))
+                self.announced.discard(uri)
+
+            self.schedule_retry()
+
+            return
+
+        self.announced.add(uri)
+
+        return
+
+    def schedule_retry(self):
+        if self.retry_handle is None:
+            self.retry_handle = self.loop.call_later(self.retry_delay, self.retry)
+
+        return
+
+    def retry(self):
+        self.retry_handle = None
+
+        for uri, ring in self.rings.items():
+            if uri not in self.announced:
+                self.notify(uri, ring)
+
+        backlog = self.backlog
+        self.backlog = dict()
+        for uri, frames in backlog.items():
+            self.write_ring(uri, frames)
+
+        return
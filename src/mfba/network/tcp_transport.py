@@ -0,0 +1,282 @@
+import asyncio
+
+from ..common import (
+    log,
+)
+
+from .endpoint import Endpoint
+from .base_transport import BaseTransport
+from .framing import FrameTooBigError
+from .message import Message
+
+
+class TcpConnection:
+    '''
+    persistent connection to the peer; the connection is reused by every
+    `send` and it is reconnected with the exponential backoff when it is lost
+    '''
+    transport = None
+    endpoint = None
+    writer = None
+    task = None
+
+    # seconds
+    min_backoff = 0.05
+    max_backoff = 5
+
+    # the frames are dropped if the buffered bytes of the disconnected peer
+    # are over this
+    max_buffer_size = 16 * 1024 * 1024
+
+    def __init__(self, transport, endpoint):
+        assert isinstance(endpoint, Endpoint)
+
+        self.transport = transport
+        self.endpoint = endpoint
+        self.writer = None
+        self.task = None
+        self.backoff = self.min_backoff
+
+        # the frames written before the connection is made
+        self.buf = bytearray()
+
+    def __repr__(self):
+        return '<TcpConnection: %s connected=%s>' % (self.endpoint.uri, self.is_connected())
+
+    def is_connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    def write(self, data):
+        if self.is_connected():
+            # the write does not block, the data is buffered by the asyncio
+            # transport and flushed when the socket is writable
+            self.writer.write(data)
+
+            return
+
+        if len(self.buf) + len(data) > self.max_buffer_size:
+            log.transport.error(
+                '%s: buffer is full, frame is dropped: %s',
+                self.transport.name,
+                self.endpoint.uri,
+            )
+
+            return
+
+        self.buf += data
+        self.connect()
+
+        return
+
+    def writelines(self, frames):
+        if self.is_connected():
+            self.writer.writelines(frames)
+
+            return
+
+        self.write(b''.join(frames))
+
+        return
+
+    def connect(self):
+        if self.task is not None and not self.task.done():
+            return
+
+        self.task = self.transport.loop.create_task(self.run())
+
+        return
+
+    async def run(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(
+                    self.endpoint.host,
+                    self.endpoint.port,
+                )
+            except OSError as e:
+                log.transport.debug(
+                    '%s: failed to connect to %s, retry after %ss: %s',
+                    self.transport.name,
+                    self.endpoint.uri,
+                    self.backoff,
+                    e,
+                )
+                await asyncio.sleep(self.backoff)
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+
+                continue
+
+            self.writer = writer
+            self.backoff = self.min_backoff
+            log.transport.debug('%s: connected to %s', self.transport.name, self.endpoint.uri)
+
+            # flush the buffered frames at once
+            if len(self.buf) > 0:
+                writer.write(bytes(self.buf))
+                self.buf = bytearray()
+
+            # the peer does not send anything, the read returns when the
+            # connection is closed by the peer
+            try:
+                while len(await reader.read(self.transport.read_size)) > 0:
+                    pass
+            except OSError as e:
+                log.transport.debug('%s: connection error: %s', self.transport.name, e)
+
+            self.writer = None
+            writer.close()
+
+            log.transport.debug('%s: connection to %s is lost', self.transport.name, self.endpoint.uri)
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+        if self.writer is not None:
+            self.writer.close()
+
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+
+            self.writer = None
+
+        return
+
+
+class TcpTransport(BaseTransport):
+    loop = None
+    server = None
+    connections = None
+
+    read_size = 64 * 1024
+
+    def __init__(self, name, endpoint, loop, codec=None, **kw):
+        super(TcpTransport, self).__init__(name, endpoint, codec=codec, **kw)
+
+        self.loop = loop
+        self.connections = dict()
+
+        # writers of the accepted connections and the tasks, which read them
+        self.peers = set()
+        self.handlers = set()
+
+    def start(self, *a, **kw):
+        super(TcpTransport, self).start(*a, **kw)
+
+        self.server = self.loop.run_until_complete(asyncio.start_server(
+            self.handle_connection,
+            self.endpoint.host,
+            self.endpoint.port,
+        ))
+
+        log.transport.debug('%s: listening on %s', self.name, self.endpoint.uri)
+
+        return
+
+    def stop(self):
+        super(TcpTransport, self).stop()
+
+        # the loop is not running, like in `start`
+        if self.loop.is_running():
+            self.loop.create_task(self.close())
+        else:
+            self.loop.run_until_complete(self.close())
+
+        return
+
+    async def close(self):
+        '''
+        close the server and the connections, and wait until the tasks of them
+        are finished
+        '''
+        if self.server is not None:
+            self.server.close()
+
+        await asyncio.gather(*map(lambda x: x.close(), self.connections.values()))
+
+        handlers = list(self.handlers)
+        for task in handlers:
+            task.cancel()
+
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+        if self.server is not None:
+            await self.server.wait_closed()
+            self.server = None
+
+        return
+
+    async def handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self.peers.add(writer)
+        self.handlers.add(task)
+
+        # every connection has it's own framer, the partial frames of the
+        # connections must not be mixed
+        framer = self.codec.create_framer()
+        try:
+            while True:
+                data = await reader.read(self.read_size)
+                if not data:
+                    break
+
+                # the invalid frame is dropped, the connection keeps the
+                # frames of the peer after it
+                try:
+                    self.receive(data, framer)
+                except Message.InvalidMessageError as e:
+                    log.transport.error('%s: invalid frame is dropped: %s', self.name, e)
+        except OSError as e:
+            log.transport.error('%s: connection is closed: %s', self.name, e)
+        except asyncio.CancelledError:
+            # cancelled by `close`; the server of the older python raises the
+            # cancellation of the handler in it's callback
+            pass
+        finally:
+            self.peers.discard(writer)
+            self.handlers.discard(task)
+            writer.close()
+
+        return
+
+    def receive(self, data, framer):
+        log.transport.debug('%s: received: %s', self.name, data)
+
+        self.bytes_in.inc(len(data))
+
+        try:
+            messages = framer.feed(data)
+        except FrameTooBigError as e:
+            log.transport.error('%s: broken frame is dropped: %s', self.name, e)
+            messages = e.frames
+
+        if len(messages) > 0:
+            self.deliver(messages)
+
+        return
+
+    def get_connection(self, endpoint):
+        connection = self.connections.get(endpoint.uri)
+        if connection is None:
+            connection = TcpConnection(self, endpoint)
+            self.connections[endpoint.uri] = connection
+
+        return connection
+
+    def write(self, endpoint, data):
+        log.transport.debug('%s: wrote: %s', self.name, data)
+
+        self.get_connection(endpoint).write(data)
+
+        return
+
+    def write_frames(self, endpoint, frames):
+        log.transport.debug('%s: wrote %d frames', self.name, len(frames))
+
+        self.get_connection(endpoint).writelines(frames)
+
+        return
@@ -0,0 +1,5 @@
+from .latency import FixedLatency, Latency, LogNormalLatency, UniformLatency, get_latency
+from .loop import VirtualHandle, VirtualLoop
+from .network import SimulatedNetwork, SimulatedTransport
+from .shard import ShardRouter, ShardTransport, ShardWorker, ShardedSimulation
+from .simulation import SimulatedConsensus, Simulation
@@ -0,0 +1,101 @@
+import math
+
+
+class Latency:
+    '''
+    the one-way delay of the frames between the nodes in seconds; the
+    random delays are taken from `rng`, the seeded `random.Random` of the
+    network
+    '''
+    def get(self, rng, source, destination):
+        raise NotImplementedError()
+
+    def to_dict(self):
+        raise NotImplementedError()
+
+
+class FixedLatency(Latency):
+    delay = None
+
+    def __init__(self, delay):
+        assert delay >= 0
+
+        self.delay = delay
+
+    def __repr__(self):
+        return '<FixedLatency: delay=%(delay)f>' % self.__dict__
+
+    def get(self, rng, source, destination):
+        return self.delay
+
+    def to_dict(self):
+        return dict(model='fixed', delay=self.delay)
+
+
+class UniformLatency(Latency):
+    low = None
+    high = None
+
+    def __init__(self, low, high):
+        assert 0 <= low <= high
+
+        self.low = low
+        self.high = high
+
+    def __repr__(self):
+        return '<UniformLatency: low=%(low)f high=%(high)f>' % self.__dict__
+
+    def get(self, rng, source, destination):
+        return rng.uniform(self.low, self.high)
+
+    def to_dict(self):
+        return dict(model='uniform', low=self.low, high=self.high)
+
+
+class LogNormalLatency(Latency):
+    '''
+    the usual delay is around `median` and a few frames are much slower, like
+    the real network; `sigma` is the spread of the logarithm of the delay
+    '''
+    median = None
+    sigma = None
+
+    def __init__(self, median, sigma=0.5):
+        assert median > 0
+        assert sigma >= 0
+
+        self.median = median
+        self.sigma = sigma
+
+    def __repr__(self):
+        return '<LogNormalLatency: median=%(median)f sigma=%(sigma)f>' % self.__dict__
+
+    def get(self, rng, source, destination):
+        return rng.lognormvariate(math.log(self.median), self.sigma)
+
+    def to_dict(self):
+        return dict(model='lognormal', median=self.median, sigma=self.sigma)
+
+
+LATENCY_MODELS = dict(
+    fixed=FixedLatency,
+    uniform=UniformLatency,
+    lognormal=LogNormalLatency,
+)
+
+
+def get_latency(name, delay, jitter=0):
+    '''
+    the latency model by name from the usual delay and it's spread, both in
+    seconds; for `lognormal`, the spread is relative to the delay
+    '''
+    if name == 'fixed':
+        return FixedLatency(delay)
+
+    if name == 'uniform':
+        return UniformLatency(max(delay - jitter, 0), delay + jitter)
+
+    if name == 'lognormal':
+        return LogNormalLatency(delay, jitter / delay if delay > 0 else 0)
+
+    raise ValueError('unknown latency model: %s' % name)
@@ -0,0 +1,117 @@
+import heapq
+import itertools
+
+
+class VirtualHandle:
+    '''
+    the scheduled callback of `VirtualLoop`, like `asyncio.TimerHandle`
+    '''
+    when = None
+    callback = None
+    args = None
+    cancelled = None
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __repr__(self):
+        return '<VirtualHandle: when=%(when)f callback=%(callback)s cancelled=%(cancelled)s>' % self.__dict__
+
+    def cancel(self):
+        self.cancelled = True
+        self.callback = None
+        self.args = None
+
+        return
+
+    def run(self):
+        self.callback(*self.args)
+
+        return
+
+
+class VirtualLoop:
+    '''
+    the discrete event loop with the virtual clock; the callbacks are run in
+    the order of the scheduled time and, at the same time, of the scheduling,
+    and the clock jumps to the next callback. It has the part of the asyncio
+    loop, which is used by the consensus and the transports, so the same run
+    is repeated exactly.
+    '''
+    now = None
+    events = None
+    sequence = None
+    stopping = None
+
+    # number of the callbacks run
+    processed = None
+
+    def __init__(self, start=0):
+        self.now = start
+        self.events = list()
+        self.sequence = itertools.count()
+        self.stopping = False
+        self.processed = 0
+
+    def __repr__(self):
+        return '<VirtualLoop: now=%f events=%d processed=%d>' % (self.now, len(self.events), self.processed)
+
+    def time(self):
+        return self.now
+
+    def call_at(self, when, callback, *args, context=None):
+        handle = VirtualHandle(max(when, self.now), callback, args)
+        heapq.heappush(self.events, (handle.when, next(self.sequence), handle))
+
+        return handle
+
+    def call_later(self, delay, callback, *args, context=None):
+        return self.call_at(self.now + delay, callback, *args)
+
+    def call_soon(self, callback, *args, context=None):
+        return self.call_at(self.now, callback, *args)
+
+    def run_in_executor(self, executor, func, *args):
+        raise NotImplementedError('the virtual loop does not run the executor')
+
+    def stop(self):
+        self.stopping = True
+
+        return
+
+    def is_running(self):
+        return False
+
+    def is_closed(self):
+        return False
+
+    def run(self, until=None):
+        '''
+        run the callbacks until `stop`, no callback is left or the clock
+        reaches `until`; return `True` if it was stopped
+        '''
+        self.stopping = False
+        events = self.events
+
+        while len(events) > 0 and not self.stopping:
+            when, _, handle = events[0]
+            if until is not None and when > until:
+                break
+
+            heapq.heappop(events)
+            if handle.cancelled:
+                continue
+
+            self.now = when
+            self.processed += 1
+            handle.run()
+
+        if until is not None and not self.stopping:
+            self.now = max(self.now, until)
+
+        stopped, self.stopping = self.stopping, False
+
+        return stopped
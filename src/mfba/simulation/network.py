@@ -0,0 +1,144 @@
+import random
+
+from ..common import (
+    log,
+)
+from ..network import (
+    BaseTransport,
+)
+
+from .latency import FixedLatency, Latency
+from .loop import VirtualLoop
+
+
+class SimulatedNetwork:
+    '''
+    deliver the frames between the `SimulatedTransport`s by the virtual loop
+    after the delay of `latency`; the frames of the same link keep their
+    order, like the stream. The frame is lost by the chance of `loss`. The
+    delays and the losses are taken from the random of `seed`, so the same
+    seed gives the same run.
+    '''
+    loop = None
+    latency = None
+    loss = None
+    seed = None
+    rng = None
+    transports = None
+
+    # the last delivery time by `(source uri, destination uri)`
+    links = None
+
+    def __init__(self, loop, latency=None, loss=0, seed=0):
+        assert isinstance(loop, VirtualLoop)
+        assert latency is None or isinstance(latency, Latency)
+        assert 0 <= loss < 1
+
+        self.loop = loop
+        self.latency = latency if latency is not None else FixedLatency(0)
+        self.loss = loss
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.transports = dict()
+        self.links = dict()
+
+        self.delivered = 0
+        self.dropped = 0
+
+    def __repr__(self):
+        return '<SimulatedNetwork: latency=%(latency)s loss=%(loss)f seed=%(seed)s>' % self.__dict__
+
+    def to_dict(self):
+        return dict(
+            latency=self.latency.to_dict(),
+            loss=self.loss,
+            seed=self.seed,
+            delivered=self.delivered,
+            dropped=self.dropped,
+        )
+
+    def add(self, transport):
+        self.transports[transport.endpoint.uri] = transport
+
+        return
+
+    def remove(self, transport):
+        if self.transports.get(transport.endpoint.uri) is transport:
+            del self.transports[transport.endpoint.uri]
+
+        return
+
+    def send(self, source, endpoint, frames):
+        destination = self.transports.get(endpoint.uri)
+        if destination is None:
+            self.dropped += len(frames)
+
+            return
+
+        # the message of the client is handed over to the node itself at once
+        delay = 0
+        if destination is not source:
+            if self.loss > 0:
+                sent = list(filter(lambda x: self.rng.random() >= self.loss, frames))
+                self.dropped += len(frames) - len(sent)
+                frames = sent
+
+                if len(frames) < 1:
+                    return
+
+            delay = self.latency.get(self.rng, source, destination)
+
+        link = (source.endpoint.uri, endpoint.uri)
+        when = max(self.loop.time() + delay, self.links.get(link, 0))
+        self.links[link] = when
+
+        self.delivered += len(frames)
+        self.loop.call_at(when, destination.receive_frames, frames)
+
+        return
+
+
+class SimulatedTransport(BaseTransport):
+    '''
+    the transport of `SimulatedNetwork`; with `ObjectCodec`, the message
+    objects are passed as it is
+    '''
+    loop = None
+    network = None
+
+    def __init__(self, name, endpoint, loop, codec=None, network=None, **kw):
+        assert isinstance(network, SimulatedNetwork)
+
+        super(SimulatedTransport, self).__init__(name, endpoint, codec=codec, **kw)
+
+        self.loop = loop
+        self.network = network
+        self.network.add(self)
+
+    def stop(self):
+        super(SimulatedTransport, self).stop()
+
+        self.network.remove(self)
+
+        return
+
+    def receive(self, data):
+        self.receive_frames([data])
+
+        return
+
+    def receive_frames(self, frames):
+        log.transport.debug('%s: received %d frames', self.name, len(frames))
+
+        for frame in frames:
+            if isinstance(frame, (bytes, bytearray, memoryview)):
+                self.bytes_in.inc(len(frame))
+
+        self.deliver(list(map(self.codec.unframe, frames)))
+
+        return
+
+    def write_frames(self, endpoint, frames):
+        self.network.send(self, endpoint, frames)
+
+        return
@@ -0,0 +1,630 @@
+import asyncio
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import random
+import socket
+import struct
+import time
+
+from ..benchmark.load import (
+    DEFAULT_BURST,
+    get_arrival,
+)
+from ..blockchain import (
+    Blockchain,
+    NodeConfig,
+)
+from ..common import (
+    log,
+    Metrics,
+)
+from ..network import (
+    BaseTransport,
+    Node,
+    ShmTransport,
+    get_codec,
+)
+from ..network.framing import LengthPrefixFramer
+
+from .simulation import SimulatedConsensus
+
+
+# seconds to wait for the workers to start and to send the results
+DEFAULT_WORKER_TIMEOUT = 60
+
+# the frames between the workers go through the socket pairs by
+# `ShardRouter`, or through the shared memory rings of `ShmTransport`
+SHARD_TRANSPORTS = ('socket', 'shm')
+
+
+class ShardProtocol(asyncio.Protocol):
+    '''
+    the stream from the other shard; the envelopes are split by the
+    length-prefixed framer
+    '''
+    router = None
+    framer = None
+    transport = None
+
+    def __init__(self, router):
+        self.router = router
+        self.framer = LengthPrefixFramer()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        for envelope in self.framer.feed(data):
+            self.router.receive(envelope)
+
+    def connection_lost(self, exc):
+        pass
+
+
+class ShardRouter:
+    '''
+    deliver the frames of the nodes in the same worker by the loop, and the
+    frames to the nodes in the other workers by the socket to the worker. The
+    frames to the same node are sent in the envelope,
+
+        envelope = length(u32) + uri length(u16) + uri + frames
+
+    and the envelopes to the same worker are written at once, at the end of
+    the loop iteration.
+    '''
+    header = struct.Struct('>IH')
+    uri_header = struct.Struct('>H')
+
+    loop = None
+    shard = None
+    routes = None
+    sockets = None
+    peers = None
+    transports = None
+    outbox = None
+    flush_handle = None
+
+    def __init__(self, loop, shard, routes, sockets):
+        self.loop = loop
+        self.shard = shard
+
+        # the shard of the node by uri and the socket of the other shard
+        self.routes = routes
+        self.sockets = sockets
+        self.peers = dict()
+
+        self.transports = dict()
+        self.outbox = dict()
+        self.flush_handle = None
+
+        self.envelopes_sent = 0
+        self.dropped = 0
+
+    def __repr__(self):
+        return '<ShardRouter: shard=%(shard)d>' % self.__dict__
+
+    def start(self):
+        for shard, sock in self.sockets.items():
+            conn = self.loop.create_connection(lambda: ShardProtocol(self), sock=sock)
+            self.peers[shard], _ = self.loop.run_until_complete(conn)
+
+        return
+
+    def stop(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        for peer in self.peers.values():
+            peer.close()
+
+        return
+
+    def add(self, transport):
+        self.transports[transport.endpoint.uri] = transport
+
+        return
+
+    def remove(self, transport):
+        if self.transports.get(transport.endpoint.uri) is transport:
+            del self.transports[transport.endpoint.uri]
+
+        return
+
+    def send(self, endpoint, frames):
+        uri = endpoint.uri
+
+        target = self.transports.get(uri)
+        if target is not None:
+            self.loop.call_soon(target.receive_frames, frames)
+
+            return
+
+        shard = self.routes.get(uri)
+        if shard is None or shard not in self.peers:
+            self.dropped += len(frames)
+
+            return
+
+        uri = uri.encode()
+        body = b''.join(frames)
+        envelope = self.header.pack(2 + len(uri) + len(body), len(uri)) + uri + body
+
+        if shard in self.outbox:
+            self.outbox[shard].append(envelope)
+        else:
+            self.outbox[shard] = [envelope]
+
+        if self.flush_handle is None:
+            self.flush_handle = self.loop.call_soon(self.flush)
+
+        return
+
+    def flush(self):
+        self.flush_handle = None
+
+        outbox = self.outbox
+        self.outbox = dict()
+        for shard, envelopes in outbox.items():
+            self.envelopes_sent += len(envelopes)
+            self.peers[shard].writelines(envelopes)
+
+        return
+
+    def receive(self, envelope):
+        length, = self.uri_header.unpack_from(envelope)
+        uri = bytes(envelope[2:2 + length]).decode()
+
+        target = self.transports.get(uri)
+        if target is None:
+            self.dropped += 1
+
+            return
+
+        target.receive_data(bytes(envelope[2 + length:]))
+
+        return
+
+
+class ShardTransport(BaseTransport):
+    '''
+    the transport of `ShardRouter`; the frames from the other worker come in
+    the chunk of the envelope
+    '''
+    loop = None
+    router = None
+
+    def __init__(self, name, endpoint, loop, codec=None, router=None, **kw):
+        assert isinstance(router, ShardRouter)
+
+        super(ShardTransport, self).__init__(name, endpoint, codec=codec, **kw)
+
+        self.loop = loop
+        self.router = router
+        self.router.add(self)
+
+    def stop(self):
+        super(ShardTransport, self).stop()
+
+        self.router.remove(self)
+
+        return
+
+    def receive(self, data):
+        self.receive_frames([data])
+
+        return
+
+    def receive_frames(self, frames):
+        log.transport.debug('%s: received %d frames', self.name, len(frames))
+
+        for frame in frames:
+            if isinstance(frame, (bytes, bytearray, memoryview)):
+                self.bytes_in.inc(len(frame))
+
+        self.deliver(list(map(self.codec.unframe, frames)))
+
+        return
+
+    def receive_data(self, data):
+        log.transport.debug('%s: received %d bytes from the other shard', self.name, len(data))
+
+        self.bytes_in.inc(len(data))
+
+        # the envelope has only the complete frames
+        self.deliver(self.codec.create_framer().feed(data))
+
+        return
+
+    def write_frames(self, endpoint, frames):
+        self.router.send(endpoint, frames)
+
+        return
+
+
+class ShardWorker:
+    '''
+    the nodes of the shard in the worker process; the worker lets the
+    coordinator know, when all the nodes committed the messages, and keeps
+    running for the other shards until it is stopped
+    '''
+    shard = None
+    control = None
+    loop = None
+    router = None
+    blockchains = None
+    messages = None
+    done = None
+
+    def __init__(self, shard, control, node_configs, routes, sockets, codec, messages, transport='socket', **consensus_options):
+        self.shard = shard
+        self.control = control
+        self.messages = messages
+        self.done = set()
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        self.router = ShardRouter(self.loop, shard, routes, sockets)
+        self.router.start()
+
+        if transport == 'shm':
+            transport_class, transport_options = ShmTransport, dict()
+        else:
+            transport_class, transport_options = ShardTransport, dict(router=self.router)
+
+        self.blockchains = list()
+        for node_config in node_configs:
+            if routes[node_config.endpoint] != shard:
+                continue
+
+            blockchain = Blockchain(
+                node_config,
+                list(filter(lambda x: x.name != node_config.name, node_configs)),
+                self.loop,
+                codec=get_codec(codec),
+                transport_class=transport_class,
+                transport_options=transport_options,
+                consensus_class=SimulatedConsensus,
+                simulation=self,
+                **consensus_options
+            )
+            blockchain.start()
+            self.blockchains.append(blockchain)
+
+    def __repr__(self):
+        return '<ShardWorker: shard=%d nodes=%d>' % (self.shard, len(self.blockchains))
+
+    def committed(self, consensus):
+        if len(consensus.storage) < self.messages or consensus.node.name in self.done:
+            return
+
+        self.done.add(consensus.node.name)
+        if len(self.done) == len(self.blockchains):
+            self.control.send(('done', self.shard))
+
+        return
+
+    def send(self, proposers, arrival=None, payload_size=32):
+        '''
+        the messages go to the proposers in turn; only the proposers of this
+        shard send. Every worker draws the same schedule of `arrival`, so the
+        messages of the workers keep the rate together.
+        '''
+        client = Node('client0', None, None)
+        blockchains = dict(map(lambda x: (x.node.name, x), self.blockchains))
+
+        def inject(index):
+            blockchains[proposers[index % len(proposers)]].send(
+                client,
+                data=('%d:' % index).ljust(payload_size, '.'),
+            )
+
+            return
+
+        rng = random.Random(0)
+        delay = 0
+        for index in range(self.messages):
+            if proposers[index % len(proposers)] in blockchains:
+                if arrival is None:
+                    inject(index)
+                else:
+                    self.loop.call_later(delay, inject, index)
+
+            if arrival is not None:
+                delay += arrival.get(rng)
+
+        return
+
+    def receive_control(self):
+        command = self.control.recv()
+        if command[0] == 'stop':
+            self.loop.stop()
+
+        return
+
+    def run(self, proposers, arrival=None, payload_size=32):
+        # the nodes are ready, the messages are sent at the same time by all
+        # the workers
+        self.control.send(('ready', self.shard))
+        command = self.control.recv()
+        if command[0] != 'start':
+            return None
+
+        cpu_time = time.process_time()
+        started = time.perf_counter()
+
+        self.send(proposers, arrival=arrival, payload_size=payload_size)
+        if len(self.blockchains) < 1:
+            self.control.send(('done', self.shard))
+
+        self.loop.add_reader(self.control.fileno(), self.receive_control)
+        self.loop.run_forever()
+        self.loop.remove_reader(self.control.fileno())
+
+        elapsed = time.perf_counter() - started
+        cpu_time = time.process_time() - cpu_time
+
+        for blockchain in self.blockchains:
+            blockchain.stop()
+        self.router.stop()
+
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.close()
+
+        # the metrics are copied without the clock of the loop
+        return dict(
+            shard=self.shard,
+            elapsed=elapsed,
+            cpu_time=cpu_time,
+            envelopes_sent=self.router.envelopes_sent,
+            dropped=self.router.dropped,
+            nodes=dict(map(
+                lambda x: (
+                    x.node.name,
+                    dict(
+                        metrics=Metrics.aggregate((x.metrics,), name=x.node.name),
+                        committed=len(x.consensus.storage),
+                        order=hashlib.sha1(''.join(x.consensus.storage.message_ids).encode()).hexdigest(),
+                    ),
+                ),
+                self.blockchains,
+            )),
+        )
+
+
+def run_shard(
+    shard,
+    control,
+    node_configs,
+    routes,
+    sockets,
+    codec,
+    transport,
+    messages,
+    proposers,
+    arrival,
+    payload_size,
+    log_level,
+    consensus_options,
+):
+    '''
+    the entry of the worker process
+    '''
+    log.set_level(log_level)
+
+    try:
+        worker = ShardWorker(
+            shard,
+            control,
+            node_configs,
+            routes,
+            sockets,
+            codec,
+            messages,
+            transport=transport,
+            **consensus_options
+        )
+        result = worker.run(proposers, arrival=arrival, payload_size=payload_size)
+        control.send(('result', result))
+    except Exception as e:
+        log.main.exception('shard %d failed', shard)
+        control.send(('error', '%s: %s' % (e.__class__.__name__, e)))
+
+    return
+
+
+class ShardedSimulation:
+    '''
+    the nodes are partitioned over `workers` processes, each has it's own
+    loop; every pair of the workers is connected by a socket pair. The
+    coordinator starts the workers at once, waits until every node committed
+    the messages and merges the results.
+    '''
+    class WorkerError(Exception):
+        pass
+
+    nodes = None
+    workers = None
+    node_configs = None
+    routes = None
+    codec = None
+    transport = None
+    consensus_options = None
+
+    def __init__(self, nodes=4, threshold=80, workers=2, codec='binary', transport='socket', **consensus_options):
+        assert type(nodes) is int and nodes > 0
+        assert type(threshold) is int and 0 < threshold <= 100
+        assert type(workers) is int and 0 < workers <= nodes
+        assert codec != 'object'
+        assert transport in SHARD_TRANSPORTS
+
+        self.nodes = nodes
+        self.workers = workers
+        self.codec = codec
+        self.transport = transport
+        self.consensus_options = consensus_options
+
+        self.node_configs = list(map(
+            lambda x: NodeConfig('n%d' % x, 'shard://shard:%d' % x, threshold),
+            range(nodes),
+        ))
+
+        # the nodes are dealt to the workers in turn
+        self.routes = dict(map(lambda x: (x[1].endpoint, x[0] % workers), enumerate(self.node_configs)))
+
+    def __repr__(self):
+        return '<ShardedSimulation: nodes=%(nodes)d workers=%(workers)d codec=%(codec)s transport=%(transport)s>' % self.__dict__
+
+    def run(
+        self,
+        messages,
+        rate=None,
+        proposers=1,
+        payload_size=32,
+        arrival='constant',
+        burst=DEFAULT_BURST,
+        timeout=None,
+        log_level=logging.ERROR,
+    ):
+        '''
+        run the workers until every node committed the messages or `timeout`
+        seconds; return the result of the run
+        '''
+        assert type(messages) is int and messages > 0
+        assert type(proposers) is int and 0 < proposers <= self.nodes
+
+        arrival = get_arrival(arrival, rate, burst) if rate is not None else None
+
+        # the sockets are made for every pair of the workers
+        sockets = dict(map(lambda x: (x, dict()), range(self.workers)))
+        if self.transport == 'socket':
+            for a, b in itertools.combinations(range(self.workers), 2):
+                sockets[a][b], sockets[b][a] = socket.socketpair()
+
+        context = multiprocessing.get_context('spawn')
+        controls = list()
+        processes = list()
+        for shard in range(self.workers):
+            control, worker_control = context.Pipe()
+            process = context.Process(
+                target=run_shard,
+                args=(
+                    shard,
+                    worker_control,
+                    self.node_configs,
+                    self.routes,
+                    sockets[shard],
+                    self.codec,
+                    self.transport,
+                    messages,
+                    list(map(lambda x: x.name, self.node_configs[:proposers])),
+                    arrival,
+                    payload_size,
+                    log_level,
+                    self.consensus_options,
+                ),
+            )
+            process.start()
+            controls.append(control)
+            processes.append(process)
+
+        # the sockets belong to the workers now
+        for peers in sockets.values():
+            for sock in peers.values():
+                sock.close()
+
+        try:
+            for control in controls:
+                self._expect(control, 'ready', DEFAULT_WORKER_TIMEOUT)
+
+            started = time.perf_counter()
+            for control in controls:
+                control.send(('start',))
+
+            completed = True
+            deadline = None if timeout is None else started + timeout
+            for control in controls:
+                wait = None if deadline is None else max(deadline - time.perf_counter(), 0)
+                if self._expect(control, 'done', wait) is None:
+                    completed = False
+
+                    break
+
+            elapsed = time.perf_counter() - started
+
+            for control in controls:
+                control.send(('stop',))
+
+            # the workers, which were not waited for after the timeout, may
+            # have sent `done` before the result
+            results = list(map(lambda x: self._expect(x, 'result', DEFAULT_WORKER_TIMEOUT, skip=('done',)), controls))
+        finally:
+            for process in processes:
+                process.join(DEFAULT_WORKER_TIMEOUT)
+                if process.is_alive():
+                    process.terminate()
+
+        return self.merge(results, completed, elapsed)
+
+    def _expect(self, control, command, timeout, skip=()):
+        '''
+        the payload of the expected command from the worker; `None` after
+        `timeout` seconds. The commands of `skip` are ignored.
+        '''
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            wait = None if deadline is None else max(deadline - time.perf_counter(), 0)
+            if not control.poll(wait):
+                return None
+
+            received = control.recv()
+            if received[0] not in skip:
+                break
+
+        if received[0] == 'error':
+            raise self.WorkerError(received[1])
+
+        if received[0] != command:
+            raise self.WorkerError('unexpected command, `%s` instead of `%s`' % (received[0], command))
+
+        return received[1] if len(received) > 1 else True
+
+    def merge(self, results, completed, elapsed):
+        nodes = dict()
+        for result in filter(lambda x: x is not None, results):
+            nodes.update(result['nodes'])
+
+        metrics = Metrics.aggregate(map(lambda x: x['metrics'], nodes.values()), name='all')
+        latency = metrics.histogram('consensus.commit')
+        committed = min(map(lambda x: x['committed'], nodes.values())) if len(nodes) > 0 else 0
+        frames = metrics.counter('transport.frames_out').value
+
+        return dict(
+            completed=completed,
+            committed=committed,
+            consistent=len(set(map(lambda x: x['order'], nodes.values()))) == 1,
+            elapsed=elapsed,
+            throughput=committed / elapsed if elapsed > 0 else None,
+            latency_p50=latency.percentile(0.5),
+            latency_p99=latency.percentile(0.99),
+            latency_max=latency.max,
+            frames_per_commit=frames / committed if committed > 0 else None,
+            workers=list(map(
+                lambda x: dict(
+                    shard=x['shard'],
+                    nodes=len(x['nodes']),
+                    cpu_time=x['cpu_time'],
+                    envelopes_sent=x['envelopes_sent'],
+                    dropped=x['dropped'],
+                ),
+                filter(lambda x: x is not None, results),
+            )),
+            metrics=metrics,
+            node_metrics=dict(map(lambda x: (x[0], x[1]['metrics']), nodes.items())),
+        )
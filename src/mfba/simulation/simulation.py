@@ -0,0 +1,194 @@
+import time
+
+from ..benchmark.load import (
+    DEFAULT_BURST,
+    get_arrival,
+)
+from ..blockchain import (
+    Blockchain,
+    NodeConfig,
+)
+from ..common import (
+    log,
+    Metrics,
+)
+from ..consensus import (
+    FBAConsensus,
+)
+from ..network import (
+    Node,
+    get_codec,
+)
+
+from .loop import VirtualLoop
+from .network import SimulatedNetwork, SimulatedTransport
+
+
+class SimulatedConsensus(FBAConsensus):
+    '''
+    let the simulation know the committed slots
+    '''
+    simulation = None
+
+    def __init__(self, *a, simulation=None, **kw):
+        super(SimulatedConsensus, self).__init__(*a, **kw)
+
+        self.simulation = simulation
+
+    def reached_all_confirm(self, ballot):
+        self.simulation.committed(self)
+
+        return
+
+
+class Simulation:
+    '''
+    the quorum of the nodes in `VirtualLoop` connected by `SimulatedNetwork`;
+    the messages of the client are sent on the virtual clock and the loop runs
+    until every node committed all of them. Everything random is taken from
+    `seed`, even `message_id` of the messages, so the run is repeated exactly.
+    '''
+    loop = None
+    network = None
+    blockchains = None
+    client = None
+
+    # the messages sent by the client, the nodes which committed all of them
+    # and the time of it
+    sent = None
+    done = None
+    completed_at = None
+
+    def __init__(self, nodes=4, threshold=80, latency=None, loss=0, seed=0, codec='object', **consensus_options):
+        assert type(nodes) is int and nodes > 0
+        assert type(threshold) is int and 0 < threshold <= 100
+
+        self.loop = VirtualLoop()
+        self.network = SimulatedNetwork(self.loop, latency=latency, loss=loss, seed=seed)
+
+        node_configs = list(map(
+            lambda x: NodeConfig('n%d' % x, 'sim://simulated:%d' % x, threshold),
+            range(nodes),
+        ))
+
+        self.blockchains = list()
+        for node_config in node_configs:
+            blockchain = Blockchain(
+                node_config,
+                list(filter(lambda x: x.name != node_config.name, node_configs)),
+                self.loop,
+                codec=get_codec(codec),
+                transport_class=SimulatedTransport,
+                transport_options=dict(network=self.network),
+                consensus_class=SimulatedConsensus,
+                simulation=self,
+                **consensus_options
+            )
+            blockchain.start()
+            self.blockchains.append(blockchain)
+
+        self.client = Node('client0', None, None)
+        self.sent = 0
+        self.done = set()
+        self.completed_at = None
+
+    def __repr__(self):
+        return '<Simulation: nodes=%d network=%s loop=%s>' % (len(self.blockchains), self.network, self.loop)
+
+    def send(self, messages, rate=None, proposers=1, payload_size=32, arrival='constant', burst=DEFAULT_BURST):
+        '''
+        send the messages from now; `rate` is the number of the messages in
+        a virtual second by the schedule of `arrival`, `None` sends all of
+        them at once. The messages go to the first `proposers` nodes in turn.
+        '''
+        assert type(messages) is int and messages > 0
+        assert rate is None or rate > 0
+        assert type(proposers) is int and 0 < proposers <= len(self.blockchains)
+
+        first = self.sent
+        self.sent += messages
+        self.done = set()
+        self.completed_at = None
+
+        arrival = get_arrival(arrival, rate, burst) if rate is not None else None
+
+        delay = 0
+        for i in range(messages):
+            index = first + i
+            if arrival is None:
+                self.inject(index, proposers, payload_size)
+            else:
+                self.loop.call_later(delay, self.inject, index, proposers, payload_size)
+                delay += arrival.get(self.network.rng)
+
+        return
+
+    def inject(self, index, proposers, payload_size):
+        self.blockchains[index % proposers].send(
+            self.client,
+            data=('%d:' % index).ljust(payload_size, '.'),
+            message_id='%032x' % self.network.rng.getrandbits(128),
+        )
+
+        return
+
+    def committed(self, consensus):
+        if len(consensus.storage) < self.sent or consensus.node.name in self.done:
+            return
+
+        self.done.add(consensus.node.name)
+        if len(self.done) == len(self.blockchains):
+            self.completed_at = self.loop.time()
+            self.loop.stop()
+
+        return
+
+    def run(self, until=None):
+        '''
+        run until every node committed the sent messages or the virtual clock
+        reaches `until`; return the result of the run
+        '''
+        started = self.loop.time()
+        processed = self.loop.processed
+        wall_time = time.perf_counter()
+
+        self.loop.run(until=until)
+
+        wall_time = time.perf_counter() - wall_time
+        elapsed = (self.completed_at if self.completed_at is not None else self.loop.time()) - started
+        events = self.loop.processed - processed
+
+        metrics = self.get_metrics()
+        committed = min(map(lambda x: len(x.consensus.storage), self.blockchains))
+        frames = metrics.counter('transport.frames_out').value
+
+        # the latency is observed by the nodes, which got the messages
+        latency = Metrics.aggregate(
+            map(lambda x: x.metrics, filter(lambda x: x.consensus.commit_latency.count > 0, self.blockchains)),
+        ).histogram('consensus.commit')
+
+        log.main.debug('simulation finished: %s', self)
+
+        return dict(
+            completed=self.completed_at is not None,
+            committed=committed,
+            virtual_time=elapsed,
+            wall_time=wall_time,
+            events=events,
+            events_per_second=events / wall_time if wall_time > 0 else None,
+            throughput=committed / elapsed if elapsed > 0 else None,
+            latency_p50=latency.percentile(0.5),
+            latency_p99=latency.percentile(0.99),
+            latency_max=latency.max,
+            frames_per_commit=frames / committed if committed > 0 else None,
+            network=self.network.to_dict(),
+        )
+
+    def get_metrics(self):
+        return Metrics.aggregate(map(lambda x: x.metrics, self.blockchains), name='all')
+
+    def stop(self):
+        for blockchain in self.blockchains:
+            blockchain.stop()
+
+        return
@@ -0,0 +1,33 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+
+def run_until(loop, condition, timeout=5):
+    '''
+    run the loop until `condition` returns true
+    '''
+    async def wait():
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    loop.run_until_complete(asyncio.wait_for(wait(), timeout))
+
+    return
+
+
+@pytest.fixture
+def loop():
+    '''
+    the new event loop of the test; the test must finish every task of it
+    '''
+    loop = asyncio.new_event_loop()
+    yield loop
+
+    assert len(asyncio.all_tasks(loop)) < 1
+    loop.close()
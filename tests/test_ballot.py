@@ -0,0 +1,145 @@
+import pytest
+
+from mfba.consensus import Ballot, BallotVoteResult, State
+from mfba.network import Node, Quorum
+
+
+@pytest.fixture
+def node():
+    validators = list(map(lambda x: Node('n%d' % x, 'sock://memory:%d' % (7000 + x), None), range(1, 5)))
+
+    return Node('n0', 'sock://memory:7000', Quorum(80, validators))
+
+
+def vote(ballot, name, result, state=State.sign):
+    quorum = ballot.node.quorum
+    ballot.vote(ballot.node if name == ballot.node.name else quorum.get(name), result, state)
+
+    return
+
+
+def test_tally(node):
+    ballot = Ballot(node, State.sign)
+    assert node.quorum.minimum_quorum == 4
+
+    vote(ballot, 'n0', BallotVoteResult.agree)
+    vote(ballot, 'n1', BallotVoteResult.agree)
+    vote(ballot, 'n2', BallotVoteResult.disagree)
+
+    assert ballot.get_tally(State.sign) == (2, 1)
+    assert ballot.get_tally(State.accept) == (0, 0)
+    assert ballot.get_tallies() == dict(sign=dict(agree=2, disagree=1))
+    assert ballot.received == 3
+
+    # the next vote of the same validator replaces the previous one
+    vote(ballot, 'n2', BallotVoteResult.agree)
+    vote(ballot, 'n1', BallotVoteResult.disagree)
+    assert ballot.get_tally(State.sign) == (2, 1)
+    assert ballot.received == 3
+
+    vote(ballot, 'n1', BallotVoteResult.none)
+    assert ballot.get_tally(State.sign) == (2, 0)
+
+    # the votes of the next state are counted by the state
+    vote(ballot, 'n3', BallotVoteResult.agree, State.accept)
+    assert ballot.get_tallies() == dict(
+        sign=dict(agree=2, disagree=0),
+        accept=dict(agree=1, disagree=0),
+    )
+
+    # the votes of the previous state are ignored
+    vote(ballot, 'n4', BallotVoteResult.agree, State.init)
+    assert State.init.value not in ballot.votes
+
+
+def test_check_threshold(node):
+    ballot = Ballot(node, State.sign)
+    assert ballot.check_threshold() == (State.sign, False)
+
+    for name in ('n0', 'n1', 'n2'):
+        vote(ballot, name, BallotVoteResult.agree)
+    vote(ballot, 'n3', BallotVoteResult.disagree)
+    assert ballot.check_threshold() == (State.sign, False)
+
+    vote(ballot, 'n3', BallotVoteResult.agree)
+    assert ballot.check_threshold() == (State.sign, True)
+
+    # the next state passed by the others is returned before the current one
+    for name in ('n1', 'n2', 'n3', 'n4'):
+        vote(ballot, name, BallotVoteResult.agree, State.accept)
+    assert ballot.check_threshold() == (State.accept, True)
+
+
+def test_votes_are_bitmasks(node):
+    quorum = node.quorum
+    ballot = Ballot(node, State.sign)
+
+    # the indices are in the order of the names, the local node included
+    assert list(map(lambda x: quorum.index_of(Node(x, None, None)), ('n0', 'n1', 'n3'))) == [0, 1, 3]
+
+    vote(ballot, 'n1', BallotVoteResult.agree)
+    vote(ballot, 'n3', BallotVoteResult.disagree)
+    vote(ballot, 'n4', BallotVoteResult.none)
+    assert ballot.votes[State.sign.value] == [0b11010, 0b00010, 0b01000]
+
+    assert ballot.is_voted(quorum.get('n1'))
+    assert ballot.is_voted(quorum.get('n4'))
+    assert not ballot.is_voted(quorum.get('n2'))
+    assert not ballot.is_voted(quorum.get('n1'), State.accept)
+    assert ballot.get_voted(ballot.votes[State.sign.value]) == dict(
+        n1=BallotVoteResult.agree,
+        n3=BallotVoteResult.disagree,
+        n4=BallotVoteResult.none,
+    )
+
+    # the vote from outside of the quorum is ignored
+    outsider = Node('n9', 'sock://memory:7009', None)
+    ballot.vote(outsider, BallotVoteResult.agree, State.sign)
+    assert not ballot.is_voted(outsider)
+    assert ballot.votes[State.sign.value] == [0b11010, 0b00010, 0b01000]
+
+
+def test_merge_votes(node):
+    ballot = Ballot(node, State.sign)
+    vote(ballot, 'n1', BallotVoteResult.agree)
+    vote(ballot, 'n2', BallotVoteResult.disagree)
+    received = ballot.received
+
+    # the merged votes override the previous votes of the same validators
+    ballot.merge_votes(State.sign, 0b00101, 0b00010)
+    assert ballot.votes[State.sign.value] == [0b00111, 0b00101, 0b00010]
+    assert ballot.received == received + 1
+
+    # nothing new is not counted as received
+    ballot.merge_votes(State.sign, 0b00001, 0)
+    assert ballot.received == received + 1
+
+    # the votes of the previous state are ignored
+    ballot.merge_votes(State.init, 0b11111, 0)
+    assert State.init.value not in ballot.votes
+
+
+def test_votes_of_removed_member(node):
+    quorum = node.quorum
+    ballot = Ballot(node, State.sign)
+    removed = quorum.get('n3')
+
+    for name in ('n0', 'n1', 'n2', 'n3'):
+        vote(ballot, name, BallotVoteResult.agree)
+    assert ballot.check_threshold() == (State.sign, True)
+
+    # the bit of the removed member is kept, but it is not counted
+    quorum.remove(removed)
+    assert quorum.index_of(removed) is None
+    assert not ballot.is_voted(removed)
+    assert ballot.get_tally(State.sign) == (3, 0)
+    assert quorum.minimum_quorum == 4
+    assert ballot.check_threshold() == (State.sign, False)
+
+    vote(ballot, 'n4', BallotVoteResult.agree)
+    assert ballot.check_threshold() == (State.sign, True)
+
+    # the index of the removed member is not reused
+    quorum.insert(Node('n5', 'sock://memory:7005', None))
+    assert quorum.index_of(quorum.get('n5')) == 5
+    assert ballot.get_tally(State.sign) == (4, 0)
@@ -0,0 +1,38 @@
+import logging
+
+from mfba.common import log
+from mfba.simulation import Simulation, get_latency
+
+
+log.set_level(logging.ERROR)
+
+
+def test_batch_delay_after_full_batch():
+    simulation = Simulation(
+        nodes=4,
+        latency=get_latency('lognormal', 0.01, 0.01),
+        max_batch_size=4,
+        max_batch_delay=1.0,
+        window=8,
+    )
+    consensus = simulation.blockchains[0].consensus
+
+    # the first message starts the delay, and the batch is filled before it
+    simulation.loop.call_later(0, simulation.inject, 0, 1, 32)
+    for index in range(1, 4):
+        simulation.loop.call_later(0.5, simulation.inject, index, 1, 32)
+
+    # the next batch waits for it's own delay
+    simulation.loop.call_later(0.6, simulation.inject, 4, 1, 32)
+
+    simulation.run(until=0.55)
+    assert consensus.storage.count_pending() == 0
+    assert consensus.batch_timer is None
+
+    simulation.run(until=1.5)
+    assert consensus.storage.count_pending() == 1
+
+    simulation.run(until=1.7)
+    assert consensus.storage.count_pending() == 0
+
+    simulation.stop()
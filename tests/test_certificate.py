@@ -0,0 +1,85 @@
+import logging
+
+import pytest
+
+from mfba.common import log
+from mfba.consensus import State, VoteCertificate
+from mfba.network import Message, Node, Quorum, get_codec
+from mfba.simulation import Simulation
+
+
+log.set_level(logging.CRITICAL)
+
+
+def new_quorum(names):
+    return Quorum(80, list(map(lambda x: Node(x, 'sock://memory:%d' % (7000 + int(x[1:])), None), names)))
+
+
+def test_membership():
+    a = new_quorum(['n1', 'n2', 'n3'])
+    b = new_quorum(['n3', 'n2', 'n1'])
+    assert a.membership == b.membership
+
+    a.bind(Node('n0', 'sock://memory:7000', None))
+    assert a.membership != b.membership
+
+    b.bind(Node('n0', 'sock://memory:7000', None))
+    assert a.membership == b.membership
+
+    # the index of the removed validator is kept
+    b.remove(b.get('n2'))
+    assert a.membership == b.membership
+
+    # the new validator takes the next index, not the index of it's name
+    c = new_quorum(['n1', 'n2', 'n3', 'n4'])
+    c.bind(Node('n0', 'sock://memory:7000', None))
+    a.insert(Node('n4', 'sock://memory:7004', None))
+    assert a.names == c.names
+    assert a.membership == c.membership
+
+    d = new_quorum(['n1', 'n3', 'n5'])
+    d.bind(Node('n0', 'sock://memory:7000', None))
+    d.insert(Node('n2', 'sock://memory:7002', None))
+    assert d.names != sorted(d.names)
+    assert d.membership != new_quorum(['n0', 'n1', 'n2', 'n3', 'n5']).membership
+
+
+@pytest.mark.parametrize('codec', ['json', 'binary'])
+def test_codec(codec):
+    codec = get_codec(codec)
+    certificate = VoteCertificate(
+        Node('n0', None, None),
+        State.accept,
+        Message.new('data', node='client0'),
+        0b1011,
+        0b0100,
+        (1 << 64) - 1,
+        slot=3,
+        round=1,
+    )
+
+    decoded = codec.decode(codec.unframe(codec.encode(certificate)))
+    assert decoded.membership == certificate.membership
+    assert (decoded.agreed, decoded.disagreed) == (certificate.agreed, certificate.disagreed)
+
+
+def test_certificate_of_other_quorum():
+    simulation = Simulation(nodes=4, aggregate=True)
+    consensus = simulation.blockchains[0].consensus
+
+    aggregator = consensus.get_aggregator(1)
+    certificate = VoteCertificate(
+        consensus.quorum.get(aggregator) or consensus.node,
+        State.accept,
+        Message.new('data', node='client0'),
+        consensus.quorum.member_mask,
+        0,
+        consensus.quorum.membership ^ 1,
+        slot=1,
+    )
+
+    rejected = consensus.rejected.value
+    consensus._handle_vote_certificate(certificate)
+
+    assert consensus.rejected.value == rejected + 1
+    assert 1 not in consensus.ballots
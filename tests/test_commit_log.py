@@ -0,0 +1,302 @@
+import os
+
+import pytest
+
+from mfba.consensus import Ballot, BallotVoteResult, CommitLog, OffsetIndex, State, Storage
+from mfba.network import Batch, Message, Node, Quorum
+from mfba.simulation import VirtualLoop
+
+
+@pytest.fixture
+def node():
+    return Node('n0', 'sock://memory:7000', Quorum(80, [Node('n1', 'sock://memory:7001', None)]))
+
+
+def new_ballot(node, slot):
+    ballot = Ballot(node, State.all_confirm, BallotVoteResult.agree, slot=slot)
+    ballot.message = Batch.new(list(map(
+        lambda x: Message.new('%d-%d' % (slot, x), node='client0', message_id='%08d%02d' % (slot, x)),
+        range(2),
+    )))
+
+    return ballot
+
+
+def append(commit_log, node, slots):
+    return list(map(lambda x: commit_log.append(new_ballot(node, x)), slots))
+
+
+def get_segment_path(directory):
+    return os.path.join(str(directory), '00000000.log')
+
+
+def test_reopen(tmp_path, node):
+    commit_log = CommitLog(str(tmp_path), sync_interval=None)
+    records = append(commit_log, node, range(1, 11))
+    commit_log.close()
+
+    commit_log = CommitLog(str(tmp_path), sync_interval=None)
+    assert len(commit_log) == 10
+    assert commit_log.last_slot == 10
+
+    for record in records:
+        assert commit_log.get_slot(record.slot).message.message_id == record.message.message_id
+
+        message = record.get_messages()[1]
+        assert commit_log.get_message(message.message_id).slot == record.slot
+        assert list(map(lambda x: x.slot, commit_log.get_by_hash(message.hash_id))) == [record.slot]
+
+    commit_log.close()
+
+
+def test_crash_before_sync(tmp_path, node):
+    # the records are written at once, so they survive the crash of the
+    # process without the sync
+    commit_log = CommitLog(str(tmp_path), sync_interval=None)
+    append(commit_log, node, range(1, 6))
+    commit_log.sync()
+    records = append(commit_log, node, range(6, 11))
+
+    commit_log = CommitLog(str(tmp_path), sync_interval=None)
+    assert len(commit_log) == 10
+    assert commit_log.get_slot(8).message.message_id == records[2].message.message_id
+    commit_log.close()
+
+
+def test_torn_tail(tmp_path, node):
+    commit_log = CommitLog(str(tmp_path), sync_interval=None)
+    append(commit_log, node, range(1, 6))
+    commit_log.sync()
+    synced = os.path.getsize(get_segment_path(tmp_path))
+
+    records = append(commit_log, node, range(6, 9))
+    commit_log.index.flush()
+
+    # the last record was written partly
+    os.truncate(get_segment_path(tmp_path), os.path.getsize(get_segment_path(tmp_path)) - 3)
+
+    commit_log = CommitLog(str(tmp_path), sync_interval=None)
+    assert len(commit_log) == 7
+    assert commit_log.last_slot == 7
+    assert commit_log.get_slot(7).message.message_id == records[1].message.message_id
+    assert commit_log.get_slot(8) is None
+    assert commit_log.get_message(records[2].message.message_id) is None
+    assert os.path.getsize(get_segment_path(tmp_path)) > synced
+
+    # the next record takes the place of the broken one
+    record = append(commit_log, node, [8])[0]
+    commit_log.close()
+
+    commit_log = CommitLog(str(tmp_path), sync_interval=None)
+    assert list(map(lambda x: x.slot, commit_log.iter_records())) == list(range(1, 9))
+    assert commit_log.get_slot(8).message.message_id == record.message.message_id
+    commit_log.close()
+
+
+def test_lost_tail(tmp_path, node):
+    commit_log = CommitLog(str(tmp_path), sync_interval=None)
+    append(commit_log, node, range(1, 6))
+    commit_log.sync()
+    synced = os.path.getsize(get_segment_path(tmp_path))
+
+    records = append(commit_log, node, range(6, 9))
+    commit_log.index.flush()
+
+    # the records after the last sync were lost with the host
+    os.truncate(get_segment_path(tmp_path), synced)
+
+    commit_log = CommitLog(str(tmp_path), sync_interval=None)
+    assert len(commit_log) == 5
+    assert commit_log.get_slot(6) is None
+    assert not commit_log.contains('m%s' % records[0].message.message_id)
+
+    # the lost records are committed again
+    append(commit_log, node, range(6, 9))
+    commit_log.sync()
+    assert commit_log.get_slot(6).slot == 6
+    commit_log.close()
+
+    commit_log = CommitLog(str(tmp_path), sync_interval=None)
+    assert list(map(lambda x: x.slot, commit_log.iter_records())) == list(range(1, 9))
+    commit_log.close()
+
+
+def test_header_counts_synced_records(tmp_path, node):
+    commit_log = CommitLog(str(tmp_path), sync_interval=None, index_capacity=4)
+    append(commit_log, node, range(1, 6))
+    commit_log.sync()
+    synced = os.path.getsize(get_segment_path(tmp_path))
+    append(commit_log, node, range(6, 9))
+
+    assert (len(commit_log), commit_log.messages, commit_log.last_slot) == (8, 16, 8)
+    assert (commit_log.index.records, commit_log.index.messages, commit_log.index.last_slot) == (5, 10, 5)
+
+    # the rebuilt table keeps the count of it's entries without the sync
+    commit_log.index.rebuild(commit_log.index.capacity * 2)
+
+    index = OffsetIndex(os.path.join(str(tmp_path), 'index'))
+    assert (index.records, index.messages, index.last_slot) == (5, 10, 5)
+    assert index.count == len(list(index.iter_entries())) > 0
+    index.close()
+
+    # the records after the last sync were lost with the host
+    commit_log.index.flush()
+    os.truncate(get_segment_path(tmp_path), synced)
+
+    commit_log = CommitLog(str(tmp_path), sync_interval=None)
+    assert (len(commit_log), commit_log.messages, commit_log.last_slot) == (5, 10, 5)
+    commit_log.close()
+
+
+def test_roll_segments(tmp_path, node):
+    commit_log = CommitLog(str(tmp_path), sync_interval=None, segment_size=1024)
+    append(commit_log, node, range(1, 51))
+    commit_log.close()
+
+    assert len(os.listdir(str(tmp_path))) > 3
+
+    commit_log = CommitLog(str(tmp_path), sync_interval=None, segment_size=1024)
+    assert list(map(lambda x: x.slot, commit_log.iter_records())) == list(range(1, 51))
+    assert commit_log.get_slot(25).slot == 25
+    commit_log.close()
+
+
+class ShortWriteFile:
+    '''
+    the raw file, which writes at most `limit` bytes at once
+    '''
+    def __init__(self, f, limit):
+        self.f = f
+        self.limit = limit
+
+    def write(self, data):
+        return self.f.write(data[:self.limit])
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+
+def test_short_write(tmp_path, node):
+    commit_log = CommitLog(str(tmp_path), sync_interval=None)
+    commit_log.file = ShortWriteFile(commit_log.file, 7)
+    records = append(commit_log, node, range(1, 6))
+
+    assert commit_log.offset == os.path.getsize(get_segment_path(tmp_path))
+    assert commit_log.get_slot(3).message.message_id == records[2].message.message_id
+    commit_log.close()
+
+    commit_log = CommitLog(str(tmp_path), sync_interval=None)
+    assert list(map(lambda x: x.slot, commit_log.iter_records())) == list(range(1, 6))
+    commit_log.close()
+
+
+def test_cache(tmp_path, node):
+    commit_log = CommitLog(str(tmp_path), sync_interval=None, cache_size=2)
+    append(commit_log, node, range(1, 4))
+
+    # the last records are in the cache
+    assert commit_log.get_slot(3).slot == 3
+    assert (commit_log.cache_hits.value, commit_log.cache_misses.value) == (1, 0)
+
+    # the record read from the segment is cached, and the oldest one is out
+    assert commit_log.get_slot(1).slot == 1
+    assert commit_log.get_slot(1).slot == 1
+    assert (commit_log.cache_hits.value, commit_log.cache_misses.value) == (2, 1)
+    assert commit_log.get_slot(2).slot == 2
+    assert (commit_log.cache_hits.value, commit_log.cache_misses.value) == (2, 2)
+    assert len(commit_log.cache) == 2
+
+    commit_log.close()
+
+    commit_log = CommitLog(str(tmp_path), sync_interval=None, cache_size=0)
+    for slot in (1, 1, 3):
+        assert commit_log.get_slot(slot).slot == slot
+    assert (commit_log.cache_hits.value, commit_log.cache_misses.value) == (0, 3)
+    assert len(commit_log.cache) < 1
+
+    commit_log.close()
+
+
+def test_sync_bytes(tmp_path, node):
+    commit_log = CommitLog(str(tmp_path / 'size'), sync_interval=None)
+    append(commit_log, node, [1])
+    size = commit_log.unsynced
+    commit_log.close()
+
+    # the records are synced at once, when `sync_bytes` are appended
+    commit_log = CommitLog(str(tmp_path / 'log'), sync_interval=None, sync_bytes=size * 3)
+    append(commit_log, node, [1, 2])
+    assert commit_log.syncs.value == 0
+    assert commit_log.unsynced_records == 2
+    assert commit_log.index.records == 0
+    assert len(commit_log) == 2
+
+    append(commit_log, node, [3])
+    assert commit_log.syncs.value == 1
+    assert commit_log.unsynced == 0
+    assert commit_log.index.records == 3
+    assert commit_log.index.last_slot == 3
+
+    commit_log.close()
+
+
+def test_sync_interval(tmp_path, node):
+    loop = VirtualLoop()
+    commit_log = CommitLog(str(tmp_path), loop=loop, sync_interval=0.5)
+
+    append(commit_log, node, [1])
+    loop.run(until=0.2)
+    append(commit_log, node, [2])
+
+    # the records of the interval are synced together by the single timer
+    assert len(loop.events) == 1
+    loop.run(until=0.4)
+    assert commit_log.syncs.value == 0
+
+    loop.run(until=0.6)
+    assert commit_log.syncs.value == 1
+    assert commit_log.sync_handle is None
+    assert commit_log.index.records == 2
+
+    # the timer starts again by the next record
+    append(commit_log, node, [3])
+    loop.run(until=1.2)
+    assert commit_log.syncs.value == 2
+    assert commit_log.index.records == 3
+
+    commit_log.close()
+
+
+def test_storage(tmp_path, node):
+    storage = Storage(node, commit_log=CommitLog(str(tmp_path), sync_interval=None))
+
+    ballots = list(map(lambda x: new_ballot(node, x), range(1, 4)))
+    for m in ballots[0].message.get_messages():
+        storage.add_pending(m)
+
+    for ballot in ballots:
+        storage.add(ballot)
+
+    # the committed messages are found in the log
+    assert storage.count_pending() == 0
+    assert storage.add_pending(ballots[0].message.get_messages()[0]) is False
+    assert len(storage) == 6
+    storage.close()
+
+    storage = Storage(node, commit_log=CommitLog(str(tmp_path), sync_interval=None))
+    assert len(storage) == 6
+    assert list(storage.message_ids) == list(map(lambda x: '%08d%02d' % (x // 2 + 1, x % 2), range(6)))
+
+    message = ballots[1].message.get_messages()[1]
+    assert storage.is_exists(message)
+    assert storage.is_exists(ballots[1].message)
+    assert storage.is_exists_hash(message.hash_id)
+    assert storage.get(message.message_id).data == message.data
+    assert list(map(lambda x: x.message_id, storage.get_by_hash(message.hash_id))) == [message.message_id]
+    assert storage.get_batch(ballots[1].message.message_id).message_id == ballots[1].message.message_id
+    assert storage.get_batch(message.message_id) is None
+    assert storage.get_slot(2)[0].message_id == ballots[1].message.message_id
+    assert storage.get_slot(4) is None
+    assert not storage.is_exists(Message.new('other', node='client0'))
+
+    storage.close()
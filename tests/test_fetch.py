@@ -0,0 +1,106 @@
+import logging
+
+from mfba.common import log
+from mfba.consensus import BallotMessage, BallotVoteResult, MessageRequest, MessageResponse, State
+from mfba.network import Message, MessageDigest
+from mfba.simulation import Simulation, get_latency
+
+
+log.set_level(logging.ERROR)
+
+
+def record_sent(consensus):
+    '''
+    the frames sent by the node are kept instead of sent, by the name of the
+    destination
+    '''
+    sent = list()
+    names = dict(map(lambda x: (x.endpoint.uri, x.name), consensus.quorum.validators))
+
+    def send(endpoint, data):
+        sent.append((names.get(endpoint.uri), data))
+
+        return
+
+    consensus.transport.send = send
+
+    return sent
+
+
+def digest_ballot_message(consensus, name, message):
+    return BallotMessage(
+        consensus.quorum.get(name),
+        State.sign,
+        MessageDigest.of(message),
+        BallotVoteResult.agree,
+        slot=1,
+    )
+
+
+def test_fetch_retries_the_next_sender():
+    simulation = Simulation(nodes=4, state_timeout=1)
+    consensus = simulation.blockchains[3].consensus
+    sent = record_sent(consensus)
+
+    message = Message.new('a', node='client0')
+    consensus._handle_ballot_message(digest_ballot_message(consensus, 'n1', message))
+    consensus._handle_ballot_message(digest_ballot_message(consensus, 'n2', message))
+
+    requests = lambda: list(map(lambda x: x[0], filter(lambda x: isinstance(x[1], MessageRequest), sent)))
+
+    # the second sender waits for the same request
+    assert requests() == ['n1']
+    assert len(consensus.fetching[message.message_id]) == 2
+
+    simulation.loop.run(until=1.5)
+    assert requests() == ['n1', 'n2']
+
+    simulation.loop.run(until=2.5)
+    assert requests() == ['n1', 'n2', 'n1']
+    assert consensus.fetches.value == 3
+
+    consensus._handle_message_response(MessageResponse(consensus.quorum.get('n1'), message))
+    assert message.message_id not in consensus.fetching
+    assert message.message_id not in consensus.fetch_timers
+    assert consensus.ballots[1].message == message
+
+    # the timer was cancelled by the response
+    simulation.loop.run(until=5)
+    assert consensus.fetches.value == 3
+
+    simulation.stop()
+
+
+def test_fetch_from_the_other_sender():
+    simulation = Simulation(
+        nodes=4,
+        threshold=70,
+        latency=get_latency('lognormal', 0.05, 0.02),
+        state_timeout=1,
+        max_batch_size=1,
+    )
+
+    # the node misses the messages of `init` and the proposer does not answer
+    # the requests, so they are fetched from the other senders of the digests
+    lagging = simulation.blockchains[3]
+    receive_frames = lagging.transport.receive_frames
+    lagging.transport.receive_frames = lambda frames: receive_frames(list(filter(
+        lambda x: not (isinstance(x, BallotMessage) and x.state == State.init),
+        frames,
+    )))
+    simulation.blockchains[0].consensus.handlers[MessageRequest.type_name] = lambda x: None
+
+    simulation.send(10)
+    result = simulation.run(until=60)
+    assert result['completed']
+
+    consensus = lagging.consensus
+    assert consensus.fetches.value > 10
+    assert len(consensus.fetching) == 0
+    assert len(consensus.fetch_timers) == 0
+
+    orders = list(map(lambda x: list(x.consensus.storage.message_ids), simulation.blockchains))
+    assert len(orders[0]) == 10
+    assert all(map(lambda x: x == orders[0], orders))
+
+    simulation.stop()
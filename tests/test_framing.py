@@ -0,0 +1,126 @@
+import struct
+
+import pytest
+
+from conftest import run_until
+from mfba.network import Endpoint, Message, get_codec
+from mfba.network import framing
+from mfba.network.framing import DelimiterFramer, FrameTooBigError, LengthPrefixFramer
+from mfba.network.local_transport import LocalTransport
+
+
+DELIMITER = b'\r\n\r\n'
+
+
+def prefixed(data):
+    return struct.pack('>I', len(data)) + data
+
+
+def test_delimiter_frames_in_chunk():
+    framer = DelimiterFramer(DELIMITER)
+
+    assert framer.feed(b'a' + DELIMITER + b'bc' + DELIMITER + b'de') == [b'a', b'bc']
+    assert bytes(framer.buf) == b'de'
+
+    assert framer.feed(b'f' + DELIMITER) == [b'def']
+    assert len(framer.buf) < 1
+
+    # the empty frame between the delimiters is also the frame
+    assert framer.feed(DELIMITER + b'g' + DELIMITER) == [b'', b'g']
+
+
+@pytest.mark.parametrize('split', range(1, len(DELIMITER)))
+def test_delimiter_split_across_chunks(split):
+    framer = DelimiterFramer(DELIMITER)
+
+    assert framer.feed(b'abc' + DELIMITER[:split]) == []
+    assert framer.feed(DELIMITER[split:] + b'd') == [b'abc']
+    assert bytes(framer.buf) == b'd'
+
+
+def test_delimiter_fed_by_byte():
+    framer = DelimiterFramer(DELIMITER)
+    data = b'first' + DELIMITER + b'second' + DELIMITER
+
+    frames = list()
+    for i in range(len(data)):
+        frames.extend(framer.feed(data[i:i + 1]))
+
+    assert frames == [b'first', b'second']
+    assert len(framer.buf) < 1
+    assert framer.scanned == 0
+
+
+def test_delimiter_frame_too_big(monkeypatch):
+    monkeypatch.setattr(framing, 'MAX_FRAME_SIZE', 8)
+    framer = DelimiterFramer(DELIMITER)
+
+    assert framer.feed(b'abcd') == []
+    with pytest.raises(FrameTooBigError):
+        framer.feed(b'efghi')
+
+    assert len(framer.buf) < 1
+    assert framer.feed(b'j' + DELIMITER) == [b'j']
+
+
+def test_length_prefix_frames_in_chunk():
+    framer = LengthPrefixFramer()
+    data = prefixed(b'a') + prefixed(b'') + prefixed(b'bcd')
+
+    frames = framer.feed(data)
+    assert list(map(bytes, frames)) == [b'a', b'', b'bcd']
+
+    # the frames of the complete chunk are not copied
+    assert all(map(lambda x: isinstance(x, memoryview) and x.obj is data, frames))
+
+
+@pytest.mark.parametrize('split', [1, 4, 6])
+def test_length_prefix_split_across_chunks(split):
+    framer = LengthPrefixFramer()
+    data = prefixed(b'abcdef') + prefixed(b'g')
+
+    # the split in the header and in the body
+    assert framer.feed(data[:split]) == []
+    assert list(map(bytes, framer.feed(data[split:]))) == [b'abcdef', b'g']
+    assert len(framer.buf) < 1
+
+
+def test_length_prefix_fed_by_byte():
+    framer = LengthPrefixFramer()
+    data = prefixed(b'first') + prefixed(b'second')
+
+    frames = list()
+    for i in range(len(data)):
+        frames.extend(map(bytes, framer.feed(data[i:i + 1])))
+
+    assert frames == [b'first', b'second']
+
+
+@pytest.mark.parametrize('codec', ['json', 'binary'])
+def test_local_transport(loop, codec):
+    codec = get_codec(codec)
+
+    received = list()
+    receiver = LocalTransport('receiver', 'local://receiver:0', loop, codec=codec)
+    sender = LocalTransport('sender', 'local://sender:0', loop, codec=codec)
+    receiver.start(received.extend)
+    sender.start(lambda x: None)
+
+    messages = list(map(lambda x: Message.new('data %d' % x, node='client0'), range(10)))
+    for message in messages:
+        sender.send(Endpoint.from_uri('local://receiver:0'), codec.encode(message))
+
+    run_until(loop, lambda: len(received) == 10)
+
+    # the frames to the same destination are written at once
+    assert sender.writes == 1
+    assert receiver.frames_in.value == 10
+    assert receiver.bytes_in.value == sender.bytes_sent
+
+    decoded = list(map(codec.decode, received))
+    assert list(map(lambda x: x.message_id, decoded)) == list(map(lambda x: x.message_id, messages))
+
+    for transport in (sender, receiver):
+        transport.stop()
+        transport.write_transport.close()
+        transport.protocol.transport.close()
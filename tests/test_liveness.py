@@ -0,0 +1,196 @@
+import logging
+
+import pytest
+
+from mfba.common import log
+from mfba.consensus import BallotMessage, BallotVoteResult, SlotRequest, State
+from mfba.network import Message, Node, get_codec
+from mfba.simulation import Simulation, get_latency
+
+
+log.set_level(logging.ERROR)
+
+
+def drop_slot(blockchain, slot, until):
+    '''
+    the node loses every message of the slot until the time
+    '''
+    transport = blockchain.transport
+    receive_frames = transport.receive_frames
+
+    def receive(frames):
+        if transport.loop.time() < until:
+            frames = list(filter(lambda x: getattr(x, 'slot', None) != slot, frames))
+
+        return receive_frames(frames)
+
+    transport.receive_frames = receive
+
+    return
+
+
+@pytest.mark.parametrize('codec', ['json', 'binary'])
+def test_slot_request_codec(codec):
+    codec = get_codec(codec)
+    request = SlotRequest(Node('n0', None, None), State.sign, slot=7, round=2)
+
+    decoded = codec.decode(codec.unframe(codec.encode(request)))
+    assert isinstance(decoded, SlotRequest)
+    assert decoded.node.name == 'n0'
+    assert (decoded.slot, decoded.round, decoded.state) == (7, 2, State.sign)
+
+
+def test_empty_ballot_is_watched():
+    simulation = Simulation(nodes=4, threshold=70, state_timeout=1)
+    consensus = simulation.blockchains[0].consensus
+    assert consensus.quorum.minimum_blocking == 2
+
+    # the single answer of the confirmed slot does not confirm it
+    answer = BallotMessage(
+        consensus.quorum.get('n1'),
+        State.all_confirm,
+        Message.new('a', node='client0'),
+        BallotVoteResult.agree,
+        slot=1,
+    )
+    consensus._handle_ballot_message(answer)
+
+    ballot = consensus.ballots[1]
+    assert ballot.is_empty()
+    assert ballot.timer is not None
+
+    # the ballot without the own vote asks the validators for the slot
+    simulation.loop.run(until=1.5)
+    assert consensus.queries.value == 1
+    assert consensus.resends.value == 0
+
+    simulation.stop()
+
+
+def test_lost_slot_is_asked():
+    simulation = Simulation(
+        nodes=4,
+        threshold=70,
+        latency=get_latency('lognormal', 0.05, 0.02),
+        state_timeout=1,
+        max_batch_size=1,
+    )
+    lagging = simulation.blockchains[3].consensus
+    drop_slot(simulation.blockchains[3], 1, 5)
+
+    simulation.send(2)
+    simulation.loop.run(until=2)
+
+    # the others committed both slots without the lagging node, which has no
+    # ballot message of slot 1
+    assert all(map(lambda x: x.consensus.committed_slot == 2, simulation.blockchains[:3]))
+    assert lagging.committed_slot == 0
+    assert lagging.ballots[1].is_empty()
+
+    result = simulation.run(until=60)
+    assert result['completed']
+    assert lagging.committed_slot == 2
+    assert lagging.queries.value > 0
+
+    orders = list(map(lambda x: list(x.consensus.storage.message_ids), simulation.blockchains))
+    assert all(map(lambda x: x == orders[0], orders))
+
+    simulation.stop()
+
+
+def record_sent(consensus):
+    '''
+    the names of the destinations of the frames, which are not sent
+    '''
+    sent = list()
+    names = dict(map(lambda x: (x.endpoint.uri, x.name), consensus.quorum.validators))
+    consensus.transport.send = lambda endpoint, data: sent.append(names.get(endpoint.uri))
+
+    return sent
+
+
+def test_resend_by_backoff():
+    simulation = Simulation(nodes=4, state_timeout=1, max_state_timeout=4, max_retries=5)
+    consensus = simulation.blockchains[0].consensus
+    sent = record_sent(consensus)
+
+    ballot = consensus.new_ballot(1)
+    consensus.set_ballot_message(ballot, Message.new('a', node='client0'))
+    ballot.node_result = BallotVoteResult.agree
+    ballot.vote(consensus.node, BallotVoteResult.agree, State.init)
+    ballot.vote(consensus.quorum.get('n1'), BallotVoteResult.agree, State.init)
+    consensus.watch(ballot)
+
+    # the wait is doubled up to `max_state_timeout`: 1, 2, 4, 4
+    resends = list()
+    for until in (0.9, 1.1, 2.9, 3.1, 6.9, 7.1, 10.9, 11.1):
+        simulation.loop.run(until=until)
+        resends.append(consensus.resends.value)
+    assert resends == [0, 1, 1, 2, 2, 3, 3, 4]
+    assert consensus.get_state_timeout(ballot) == 4
+
+    # the first resend skips the validator, which vote was received, the
+    # next ones go to all of them
+    assert sorted(sent[:2]) == ['n2', 'n3']
+    assert sorted(sent[2:5]) == ['n1', 'n2', 'n3']
+
+    # the new vote in the wait postpones the next resend to 4 seconds after
+    # the vote
+    simulation.loop.run(until=13)
+    ballot.vote(consensus.quorum.get('n2'), BallotVoteResult.agree, State.init)
+    consensus.watch(ballot)
+    simulation.loop.run(until=15.5)
+    assert consensus.resends.value == 4
+
+    simulation.loop.run(until=17.5)
+    assert consensus.resends.value == 5
+    assert ballot.round == 0
+
+    simulation.stop()
+
+
+def test_abandoned_proposal_is_proposed_again():
+    simulation = Simulation(nodes=4, state_timeout=1, max_retries=1)
+    consensus = simulation.blockchains[0].consensus
+    record_sent(consensus)
+
+    # nobody answers the proposal
+    message = Message.new('a', node='client0')
+    consensus._handle_message(message)
+    simulation.loop.run(until=0.5)
+
+    ballot = consensus.ballots[1]
+    assert ballot.proposal == message
+
+    # after the resend, the proposal is aborted and the message goes back to
+    # pending, which is proposed again in the free slot
+    simulation.loop.run(until=3.5)
+    assert consensus.resends.value == 1
+    assert consensus.aborts.value == 1
+    assert consensus.rounds.value == 0
+    assert ballot.timer is None
+
+    assert consensus.ballots[1] is not ballot
+    assert consensus.ballots[1].proposal == message
+    assert consensus.last_slot == 1
+    assert consensus.storage.count_pending() == 0
+
+    simulation.stop()
+
+
+def test_committed_ballot_is_unwatched():
+    simulation = Simulation(nodes=4, latency=get_latency('lognormal', 0.05, 0.02), state_timeout=1)
+
+    committed = list()
+    for blockchain in simulation.blockchains:
+        blockchain.consensus.register_commit_callback(lambda c, b: committed.append(b))
+
+    simulation.send(10)
+    result = simulation.run(until=60)
+    assert result['completed']
+
+    assert len(committed) > 0
+    assert all(map(lambda x: x.timer is None, committed))
+    assert all(map(lambda x: x.consensus.resends.value == 0, simulation.blockchains))
+
+    simulation.stop()
@@ -0,0 +1,67 @@
+import hashlib
+
+import pytest
+
+from mfba.network import Batch, Message, VerifiedHashes, get_codec
+
+
+def test_verify():
+    message = Message.new('data')
+    message.verify()
+    assert message.is_verified
+
+    broken = Message(None, message.message_id, message.hash_id, 'other data')
+    with pytest.raises(Message.InvalidMessageError):
+        broken.verify()
+
+
+def test_verified_hashes_of_node(monkeypatch):
+    hashed = list()
+    sha1 = hashlib.sha1
+
+    def counting_sha1(data):
+        hashed.append(data)
+
+        return sha1(data)
+
+    monkeypatch.setattr(hashlib, 'sha1', counting_sha1)
+
+    batch = Batch.new(list(map(lambda x: Message.new('data %d' % x), range(3))))
+    hashed.clear()
+
+    # every node hashes the shared message once
+    nodes = list(map(lambda x: VerifiedHashes(), range(4)))
+    for verified_hashes in nodes:
+        batch.verify(verified_hashes)
+        batch.verify(verified_hashes)
+
+    assert len(hashed) == 3 * 4
+    assert list(map(len, nodes)) == [3] * 4
+
+    # the other message of the same data
+    copied = Message(None, 'other', batch.messages[0].hash_id, batch.messages[0].data)
+    copied.verify(nodes[0])
+    assert len(hashed) == 3 * 4
+
+    # the same hash with the other data is hashed
+    broken = Message(None, 'broken', batch.messages[0].hash_id, 'other data')
+    with pytest.raises(Message.InvalidMessageError):
+        broken.verify(nodes[0])
+
+
+def test_verified_hashes_size():
+    verified_hashes = VerifiedHashes(max_size=2)
+    messages = list(map(lambda x: Message.new('data %d' % x), range(3)))
+    for message in messages:
+        message.verify(verified_hashes)
+
+    assert len(verified_hashes) == 2
+    assert not verified_hashes.is_verified(messages[0])
+    assert verified_hashes.is_verified(messages[2])
+
+
+@pytest.mark.parametrize('frame', [b'\xff\xfe\xfa{}', b'\xc3\x28', b'{"type_name": ', b'[1, 2]', b'{"a": 1}'])
+def test_json_decode_invalid_frame(frame):
+    codec = get_codec('json')
+    with pytest.raises(Message.InvalidMessageError):
+        codec.decode(frame)
@@ -0,0 +1,78 @@
+import pytest
+
+from mfba.network import Node, Quorum
+
+
+def new_validators(*names):
+    return list(map(lambda x: Node(x, 'sock://memory:%d' % (7000 + int(x[1:])), None), names))
+
+
+@pytest.fixture
+def quorum():
+    return Node('n0', 'sock://memory:7000', Quorum(80, new_validators('n3', 'n1', 'n2'))).quorum
+
+
+def test_members(quorum):
+    assert quorum.get('n2').name == 'n2'
+    assert quorum.get('n0') is None
+    assert quorum.get('n9') is None
+    assert quorum.is_inside(Node('n1', None, None))
+
+    # the indices are in the order of the names, not of the validators
+    assert quorum.names == ['n0', 'n1', 'n2', 'n3']
+    assert list(map(lambda x: quorum.index_of(Node(x, None, None)), quorum.names)) == [0, 1, 2, 3]
+    assert quorum.index_of(Node('n9', None, None)) is None
+    assert quorum.name_of(3) == 'n3'
+
+    # the quorums of the same members have the same indices
+    other = Node('n1', 'sock://memory:7001', Quorum(80, new_validators('n0', 'n2', 'n3'))).quorum
+    assert other.indices == quorum.indices
+    assert other.membership == quorum.membership
+
+
+def test_minimum_quorum_is_updated(quorum):
+    assert quorum.size == 4
+    assert quorum.minimum_quorum == 4
+    assert quorum._minimum_quorum == 4
+
+    quorum.insert(Node('n4', 'sock://memory:7004', None))
+    assert quorum._minimum_quorum is None
+    assert quorum.size == 5
+    assert quorum.minimum_quorum == 4
+    assert quorum.minimum_blocking == 2
+
+    membership = quorum.membership
+    quorum.remove(quorum.get('n1'))
+    quorum.remove(quorum.get('n2'))
+    assert quorum.size == 3
+    assert quorum.minimum_quorum == 3
+    assert quorum.minimum_blocking == 1
+
+    # the removed index is kept, so the bits of the votes do not move
+    assert quorum.membership == membership
+    assert quorum.member_indices == [0, 3, 4]
+
+    # the removed node gets back it's index
+    quorum.insert(Node('n2', 'sock://memory:7002', None))
+    assert quorum.index_of(quorum.get('n2')) == 2
+    assert quorum.member_indices == [0, 2, 3, 4]
+
+
+def test_remove_while_iterating(quorum):
+    # the validators are removed while the list is iterated, like the
+    # broadcast of the node, which finds the broken validators
+    validators = quorum.validators
+    visited = list()
+    for node in quorum.validators:
+        visited.append(node.name)
+        quorum.remove(node)
+
+    assert visited == ['n3', 'n1', 'n2']
+    assert list(map(lambda x: x.name, validators)) == ['n3', 'n1', 'n2']
+    assert quorum.validators == []
+    assert quorum.members == dict()
+    assert quorum.size == 1
+
+    # removing the node again does nothing
+    quorum.remove(validators[0])
+    assert quorum.size == 1
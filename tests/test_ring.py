@@ -0,0 +1,66 @@
+import os
+import random
+
+import pytest
+
+from mfba.network.ring import SharedMemoryRing
+
+
+@pytest.fixture
+def ring():
+    ring = SharedMemoryRing.create('mfba-test-%d' % os.getpid(), size=1024)
+    yield ring
+    ring.close()
+
+
+def read_all(ring):
+    frames, head = ring.read()
+    frames = list(map(bytes, frames))
+    ring.consume(head)
+
+    return frames
+
+
+def test_largest_frame_after_wraparound(ring):
+    assert ring.write([b'x' * 500]) == (1, True)
+    assert read_all(ring) == [b'x' * 500]
+
+    # the write position is past the middle of the ring
+    frame = b'y' * ring.max_frame_size
+    assert ring.write([frame]) == (1, True)
+    assert read_all(ring) == [frame]
+
+
+def test_frame_larger_than_ring(ring):
+    with pytest.raises(SharedMemoryRing.FrameTooLargeError):
+        ring.write([b'x' * (ring.max_frame_size + 1)])
+
+
+def test_wraparound(ring):
+    rng = random.Random(0)
+
+    sent = list()
+    received = list()
+    for i in range(2000):
+        frames = list(map(
+            lambda x: bytes([x % 256]) * rng.randint(0, ring.max_frame_size),
+            range(i, i + rng.randint(1, 4)),
+        ))
+
+        while len(frames) > 0:
+            written, _ = ring.write(frames)
+            sent.extend(frames[:written])
+            frames = frames[written:]
+
+            # the reader, which read everything, always makes the space
+            if len(frames) > 0:
+                received.extend(read_all(ring))
+                assert ring.write(frames[:1])[0] == 1
+                sent.append(frames.pop(0))
+
+        if rng.random() < 0.5:
+            received.extend(read_all(ring))
+
+    received.extend(read_all(ring))
+
+    assert received == sent
@@ -0,0 +1,141 @@
+import logging
+
+from mfba.common import log
+from mfba.consensus import BallotMessage, BallotVoteResult, State
+from mfba.consensus.ballot import proposal_key
+from mfba.network import Message
+from mfba.simulation import Simulation, get_latency
+
+
+log.set_level(logging.ERROR)
+
+
+def new_consensus(**options):
+    simulation = Simulation(nodes=4, **options)
+
+    return simulation, simulation.blockchains[0].consensus
+
+
+def new_message(data):
+    return Message.new(data, node='client0')
+
+
+def test_is_reachable_counts_votes_of_earlier_states():
+    _, consensus = new_consensus()
+    quorum = consensus.quorum
+
+    ballot = consensus.new_ballot(1)
+    consensus.set_ballot_message(ballot, new_message('a'))
+    ballot.change_state(State.sign)
+    ballot.vote(consensus.node, BallotVoteResult.agree, State.sign)
+    ballot.vote(quorum.get('n2'), BallotVoteResult.agree, State.sign)
+
+    # n1 signed the other message, so the message of the ballot can get
+    # only 3 of the 4 votes
+    ballot.vote_other(quorum.get('n1'), new_message('b'), BallotVoteResult.agree, State.sign)
+    assert quorum.minimum_quorum == 4
+    assert ballot.is_reachable() is False
+
+    # the vote of the other message in `init` could still change
+    ballot = consensus.new_ballot(2)
+    consensus.set_ballot_message(ballot, new_message('c'))
+    ballot.change_state(State.sign)
+    ballot.vote_other(quorum.get('n1'), new_message('d'), BallotVoteResult.agree, State.init)
+    assert ballot.is_reachable() is True
+
+    # the validator, which signed the other message, does not vote for the
+    # message in `accept`
+    ballot.vote_other(quorum.get('n3'), new_message('d'), BallotVoteResult.agree, State.sign)
+    ballot.change_state(State.accept)
+    ballot.vote(consensus.node, BallotVoteResult.agree, State.accept)
+    ballot.vote(quorum.get('n2'), BallotVoteResult.agree, State.accept)
+    assert ballot.is_reachable() is False
+
+
+def test_state_timeout_changes_round():
+    simulation, consensus = new_consensus(state_timeout=1, max_retries=1)
+    quorum = consensus.quorum
+
+    messages = sorted(map(new_message, ['a', 'b', 'c']), key=proposal_key)
+
+    ballot = consensus.new_ballot(1)
+    consensus.set_ballot_message(ballot, messages[2])
+    ballot.vote_other(quorum.get('n1'), messages[0], BallotVoteResult.agree, State.sign)
+    ballot.vote_other(quorum.get('n2'), messages[1], BallotVoteResult.agree, State.sign)
+    consensus.watch(ballot)
+
+    # without `aggregate`, the split votes of round 0 are never counted again
+    assert consensus.aggregate is False
+
+    simulation.loop.run(until=simulation.loop.time() + 1.5)
+    assert ballot.round == 0
+    assert ballot.retries == 1
+
+    # the next round starts from the lowest message and it is committed
+    simulation.loop.run(until=simulation.loop.time() + 2.5)
+    assert ballot.round == 1
+    assert ballot.message == messages[0]
+    assert consensus.rounds.value == 1
+    assert consensus.committed_slot == 1
+    assert consensus.storage.get_slot(1) == (messages[0], 1)
+
+    simulation.stop()
+
+
+def test_lowest_proposal_wins_in_init():
+    _, consensus = new_consensus()
+    quorum = consensus.quorum
+
+    low, proposal, high = sorted(map(new_message, ['a', 'b', 'c']), key=proposal_key)
+
+    ballot = consensus.new_ballot(1)
+    consensus.set_ballot_message(ballot, proposal)
+    ballot.proposal = proposal
+
+    # the higher proposal of the other validator is only counted
+    consensus.resolve_conflict(ballot, BallotMessage(quorum.get('n1'), State.init, high, BallotVoteResult.agree, slot=1))
+    assert ballot.message == proposal
+    assert high.message_id in ballot.others
+
+    # the lower one is taken, and the own proposal keeps it's votes aside
+    consensus.resolve_conflict(ballot, BallotMessage(quorum.get('n2'), State.init, low, BallotVoteResult.agree, slot=1))
+    assert ballot.message == low
+    assert ballot.proposal == proposal
+    assert proposal.message_id in ballot.others
+    assert ballot.round == 0
+
+
+def test_concurrent_proposals_commit_in_same_order():
+    simulation = Simulation(
+        nodes=4,
+        latency=get_latency('lognormal', 0.05, 0.02),
+        seed=1,
+        state_timeout=1,
+    )
+
+    # the proposals of the node, which lost the slot to the other proposal
+    lost = list()
+    for blockchain in simulation.blockchains:
+        blockchain.consensus.commit_callbacks.append(
+            lambda c, b: lost.append(b.proposal) if b.proposal is not None and b.proposal != b.message else None
+        )
+
+    simulation.send(40, proposers=4)
+    result = simulation.run(until=120)
+    assert result['completed']
+    assert len(lost) > 0
+
+    # every message, including the ones of the lost proposals, is committed
+    # once and in the same order on every node
+    orders = list(map(lambda x: list(x.consensus.storage.message_ids), simulation.blockchains))
+    assert len(orders[0]) == 40
+    assert len(set(orders[0])) == 40
+    assert all(map(lambda x: x == orders[0], orders))
+
+    committed = set(orders[0])
+    for proposal in lost:
+        assert all(map(lambda x: x.message_id in committed, proposal.get_messages()))
+
+    assert all(map(lambda x: x.consensus.storage.count_pending() == 0, simulation.blockchains))
+
+    simulation.stop()
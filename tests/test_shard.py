@@ -0,0 +1,35 @@
+import multiprocessing
+
+import pytest
+
+from mfba.simulation.shard import ShardedSimulation
+
+
+def test_expect_skips_done():
+    simulation = ShardedSimulation(nodes=4, workers=2)
+    control, worker_control = multiprocessing.Pipe()
+
+    # the worker finished after the deadline of the run
+    worker_control.send(('done', 1))
+    worker_control.send(('result', dict(shard=1)))
+
+    assert simulation._expect(control, 'result', 1, skip=('done',)) == dict(shard=1)
+    assert simulation._expect(control, 'result', 0.01) is None
+
+
+def test_expect_unexpected_command():
+    simulation = ShardedSimulation(nodes=4, workers=2)
+    control, worker_control = multiprocessing.Pipe()
+
+    worker_control.send(('done', 1))
+
+    with pytest.raises(ShardedSimulation.WorkerError):
+        simulation._expect(control, 'result', 1)
+
+
+def test_run_timeout():
+    simulation = ShardedSimulation(nodes=4, workers=2)
+    result = simulation.run(2000, rate=100, timeout=0.5)
+
+    assert not result['completed']
+    assert len(result['workers']) == 2
@@ -0,0 +1,55 @@
+import logging
+
+from mfba.common import log
+from mfba.consensus import Snapshot
+from mfba.simulation import Simulation, get_latency
+
+
+log.set_level(logging.ERROR)
+
+
+def new_simulation(directory):
+    return Simulation(
+        nodes=4,
+        latency=get_latency('lognormal', 0.05, 0.02),
+        log_directory=str(directory),
+        max_batch_size=1,
+    )
+
+
+def test_snapshot_with_ballots_in_flight(tmp_path):
+    simulation = new_simulation(tmp_path)
+    simulation.send(20)
+    simulation.run(until=0.1)
+
+    in_flight = list()
+    for blockchain in simulation.blockchains:
+        consensus = blockchain.consensus
+        slots = sorted(map(lambda x: x.slot, filter(lambda x: not x.is_empty(), consensus.ballots.values())))
+        assert len(slots) > 0
+
+        snapshot = consensus.snapshot()
+        assert sorted(map(lambda x: x.slot, snapshot.ballots)) == slots
+
+        loaded = Snapshot.load(consensus.get_snapshot_path())
+        assert sorted(map(lambda x: x.slot, loaded.ballots)) == slots
+
+        in_flight.append(slots)
+
+    simulation.stop()
+
+    restarted = new_simulation(tmp_path)
+    restarted.sent = 20
+
+    for blockchain, slots in zip(restarted.blockchains, in_flight):
+        ballots = blockchain.consensus.ballots
+        assert sorted(filter(lambda x: not ballots[x].is_empty(), ballots)) == slots
+
+    result = restarted.run(until=60)
+    assert result['completed']
+
+    orders = list(map(lambda x: list(x.consensus.storage.message_ids), restarted.blockchains))
+    assert len(orders[0]) == 20
+    assert all(map(lambda x: x == orders[0], orders))
+
+    restarted.stop()
@@ -0,0 +1,86 @@
+import pytest
+
+from mfba.consensus import Ballot, BallotVoteResult, State, Storage
+from mfba.network import Batch, Message, Node, Quorum
+
+
+@pytest.fixture
+def node():
+    return Node('n0', 'sock://memory:7000', Quorum(80, [Node('n1', 'sock://memory:7001', None)]))
+
+
+def new_message(data, message_id):
+    return Message.new(data, node='client0', message_id=message_id)
+
+
+def new_ballot(node, slot, message, round=0):
+    ballot = Ballot(node, State.all_confirm, BallotVoteResult.agree, slot=slot)
+    ballot.message = message
+    ballot.round = round
+
+    return ballot
+
+
+def test_pending_in_arrival_order(node):
+    storage = Storage(node)
+    messages = list(map(lambda x: new_message('data %d' % x, 'm%d' % x), range(4)))
+
+    assert all(map(storage.add_pending, messages))
+    assert storage.add_pending(messages[1]) is False
+    assert storage.count_pending() == 4
+    assert storage.pending_bytes == sum(map(lambda x: x.size, messages))
+    assert storage.is_exists_pending(messages[2])
+
+    # the message in the middle is removed without moving the others
+    assert storage.remove_pending(messages[1]) is messages[1]
+    assert storage.remove_pending(messages[1]) is None
+    assert list(storage.pending_ids) == ['m0', 'm2', 'm3']
+
+    assert storage.peek_pending() is messages[0]
+    assert storage.pop_pending() is messages[0]
+    assert storage.pop_pending() is messages[2]
+    assert storage.pop_pending() is messages[3]
+    assert storage.pop_pending() is None
+    assert storage.peek_pending() is None
+    assert storage.pending_bytes == 0
+    assert storage.pending_depth.value == 0
+
+
+def test_committed_messages_are_indexed(node):
+    storage = Storage(node)
+
+    # the same content by the other `message_id`s has the same `hash_id`
+    first = new_message('same', 'm0')
+    second = new_message('same', 'm1')
+    batch = Batch.new([second, new_message('other', 'm2')])
+    assert first.hash_id == second.hash_id
+
+    for message in (first, second, batch.get_messages()[1]):
+        storage.add_pending(message)
+
+    storage.add(new_ballot(node, 1, first))
+    storage.add(new_ballot(node, 2, batch, round=1))
+
+    # the committed messages do not wait anymore, and are not pending again
+    assert storage.count_pending() == 0
+    assert storage.add_pending(second) is False
+
+    assert len(storage) == 3
+    assert list(storage.message_ids) == ['m0', 'm1', 'm2']
+    assert all(map(storage.is_exists, [first, second, batch]))
+    assert not storage.is_exists(new_message('same', 'm3'))
+    assert storage.is_exists_hash(first.hash_id)
+
+    assert storage.get('m2').data == 'other'
+    assert sorted(map(lambda x: x.message_id, storage.get_by_hash(first.hash_id))) == ['m0', 'm1']
+    assert storage.get_by_hash('unknown') == []
+
+    assert storage.get_batch(batch.message_id).message_id == batch.message_id
+    assert storage.get_batch('m0') is None
+    assert storage.get_slot(1) == (first, 0)
+    assert storage.get_slot(2)[0].message_id == batch.message_id
+    assert storage.get_slot(2)[1] == 1
+    assert storage.get_slot(3) is None
+
+    assert storage.committed_slots.value == 2
+    assert storage.committed_messages.value == 3
@@ -0,0 +1,184 @@
+import asyncio
+import socket
+import struct
+
+import pytest
+
+from conftest import run_until
+from mfba.network import Endpoint, Message, get_codec
+from mfba.network.codec import JSONCodec
+from mfba.network.framing import MAX_FRAME_SIZE, FrameTooBigError, LengthPrefixFramer
+from mfba.network.tcp_transport import TcpConnection, TcpTransport
+
+
+DELIMITER = JSONCodec.delimiter
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+
+        return sock.getsockname()[1]
+
+
+def get_uri(port):
+    return 'tcp://127.0.0.1:%d' % port
+
+
+def get_frame(n):
+    return b'{"n": %d}' % n + DELIMITER
+
+
+def new_transport(loop, name, port):
+    frames = list()
+    transport = TcpTransport(name, get_uri(port), loop)
+    transport.start(frames.extend)
+
+    return transport, frames
+
+
+def test_connect(loop):
+    port = get_free_port()
+    receiver, received = new_transport(loop, 'receiver', port)
+    sender, _ = new_transport(loop, 'sender', get_free_port())
+
+    for n in range(10):
+        sender.send(Endpoint.from_uri(get_uri(port)), get_frame(n))
+
+    run_until(loop, lambda: len(received) == 10)
+    assert received == list(map(lambda x: get_frame(x)[:-len(DELIMITER)], range(10)))
+    assert sender.connections[get_uri(port)].is_connected()
+
+    sender.stop()
+    receiver.stop()
+
+
+def test_buffered_while_disconnected(loop):
+    port = get_free_port()
+    sender, _ = new_transport(loop, 'sender', get_free_port())
+    endpoint = Endpoint.from_uri(get_uri(port))
+
+    # the peer is not started yet
+    for n in range(5):
+        sender.send(endpoint, get_frame(n))
+
+    run_until(loop, lambda: sender.connections[endpoint.uri].backoff > TcpConnection.min_backoff)
+
+    connection = sender.connections[endpoint.uri]
+    assert not connection.is_connected()
+    assert bytes(connection.buf) == b''.join(map(get_frame, range(5)))
+
+    receiver, received = new_transport(loop, 'receiver', port)
+    run_until(loop, lambda: len(received) == 5)
+
+    assert received == list(map(lambda x: get_frame(x)[:-len(DELIMITER)], range(5)))
+    assert len(connection.buf) < 1
+    assert connection.backoff == TcpConnection.min_backoff
+
+    sender.stop()
+    receiver.stop()
+
+
+def test_reconnect(loop):
+    port = get_free_port()
+    receiver, received = new_transport(loop, 'receiver', port)
+    sender, _ = new_transport(loop, 'sender', get_free_port())
+    endpoint = Endpoint.from_uri(get_uri(port))
+
+    sender.send(endpoint, get_frame(0))
+    run_until(loop, lambda: len(received) == 1)
+
+    # the peer restarts
+    receiver.stop()
+    connection = sender.connections[endpoint.uri]
+    run_until(loop, lambda: not connection.is_connected())
+
+    sender.send(endpoint, get_frame(1))
+    run_until(loop, lambda: connection.backoff >= TcpConnection.min_backoff * 4)
+
+    receiver, received = new_transport(loop, 'receiver', port)
+    sender.send(endpoint, get_frame(2))
+    run_until(loop, lambda: len(received) == 2)
+
+    assert received == list(map(lambda x: get_frame(x)[:-len(DELIMITER)], range(1, 3)))
+
+    sender.stop()
+    receiver.stop()
+
+
+def test_frames_split_across_reads(loop):
+    port = get_free_port()
+    receiver, received = new_transport(loop, 'receiver', port)
+    receiver.read_size = 3
+
+    data = b''.join(map(get_frame, range(20)))
+
+    async def send():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+
+        # the frames are cut at the odd places, even in the delimiter
+        for i in range(0, len(data), 7):
+            writer.write(data[i:i + 7])
+            await writer.drain()
+            await asyncio.sleep(0)
+
+        return writer
+
+    writer = loop.run_until_complete(send())
+    run_until(loop, lambda: len(received) == 20)
+
+    assert received == list(map(lambda x: get_frame(x)[:-len(DELIMITER)], range(20)))
+
+    writer.close()
+    receiver.stop()
+
+
+@pytest.mark.parametrize('codec, garbage', [
+    ('json', b'\xff\xfe{"type_name": ' + DELIMITER),
+    ('binary', struct.pack('>I', MAX_FRAME_SIZE + 1) + b'garbage'),
+])
+def test_invalid_frame_is_dropped(loop, codec, garbage):
+    codec = get_codec(codec)
+    port = get_free_port()
+
+    # the frames are decoded by the callback, like the consensus does
+    received = list()
+    receiver = TcpTransport('receiver', get_uri(port), loop, codec=codec)
+    receiver.start(lambda frames: received.extend(map(codec.decode, frames)))
+
+    message = Message.new('data', node='client0')
+
+    async def send():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+
+        writer.write(garbage)
+        await writer.drain()
+        await asyncio.sleep(0.1)
+
+        writer.write(codec.encode(message))
+        await writer.drain()
+
+        return writer
+
+    writer = loop.run_until_complete(send())
+    run_until(loop, lambda: len(received) == 1)
+
+    assert received[0].message_id == message.message_id
+    assert len(receiver.peers) == 1
+
+    writer.close()
+    receiver.stop()
+
+
+def test_frames_before_broken_frame():
+    framer = LengthPrefixFramer()
+    data = struct.pack('>I', 3) + b'abc' + struct.pack('>I', MAX_FRAME_SIZE + 1) + b'garbage'
+
+    with pytest.raises(FrameTooBigError) as e:
+        framer.feed(data)
+
+    assert list(map(bytes, e.value.frames)) == [b'abc']
+    assert len(framer.buf) < 1
+
+    # the stream goes on after the dropped bytes
+    assert list(map(bytes, framer.feed(struct.pack('>I', 2) + b'de'))) == [b'de']
@@ -0,0 +1,89 @@
+import concurrent.futures
+
+from conftest import run_until
+from mfba.consensus import ValidationPool, Validator
+from mfba.network import Message
+
+
+class RejectingValidator(Validator):
+    def validate(self, message):
+        return not message.data.startswith('bad')
+
+
+class FailingValidator(RejectingValidator):
+    '''
+    the worker fails only at the first time
+    '''
+    failed = False
+
+    def validate(self, message):
+        if not self.failed:
+            self.failed = True
+
+            raise RuntimeError('worker failed')
+
+        return super(FailingValidator, self).validate(message)
+
+
+def test_without_executor(loop):
+    pool = ValidationPool(RejectingValidator(), loop)
+
+    assert pool.get_verdict(Message.new('good')) is True
+    assert pool.get_verdict(Message.new('bad')) is False
+
+
+def test_executor(loop):
+    validated = list()
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        pool = ValidationPool(RejectingValidator(), loop, executor=executor, batch_size=2, callback=validated.extend)
+        messages = list(map(lambda x: Message.new('good %d' % x), range(5))) + [Message.new('bad')]
+
+        assert list(map(pool.get_verdict, messages)) == [None] * 6
+
+        run_until(loop, lambda: len(validated) == 6)
+
+    assert list(map(pool.get_verdict, messages)) == [True] * 5 + [False]
+    assert len(pool.validating) < 1
+
+
+def test_cancelled(loop):
+    validated = list()
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        pool = ValidationPool(RejectingValidator(), loop, executor=executor, callback=validated.extend)
+        message = Message.new('good')
+
+        assert pool.get_verdict(message) is None
+        pool.queue = list()
+
+        # the validation of the workers was cancelled
+        future = loop.create_future()
+        future.cancel()
+        pool._done([message], future)
+
+        assert len(pool.validating) < 1
+
+        # the message is validated again
+        assert pool.get_verdict(message) is None
+        run_until(loop, lambda: len(validated) == 1)
+
+    assert pool.get_verdict(message) is True
+
+
+def test_failed(loop):
+    validated = list()
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        validator = FailingValidator()
+        pool = ValidationPool(validator, loop, executor=executor, callback=validated.extend)
+        message = Message.new('good')
+
+        assert pool.get_verdict(message) is None
+        run_until(loop, lambda: validator.failed and len(pool.validating) < 1)
+
+        # the failure is not cached as the invalid message
+        assert message.hash_id not in pool.verdicts
+        assert len(validated) < 1
+
+        assert pool.get_verdict(message) is None
+        run_until(loop, lambda: len(validated) == 1)
+
+    assert pool.get_verdict(message) is True
@@ -0,0 +1,123 @@
+import logging
+
+from mfba.common import log
+from mfba.consensus import BallotMessage, BallotVoteResult, State
+from mfba.network import Message
+from mfba.simulation import Simulation, get_latency
+
+
+log.set_level(logging.ERROR)
+
+
+def new_simulation():
+    return Simulation(nodes=4, latency=get_latency('lognormal', 0.05, 0.02), window=4)
+
+
+def faulty_ballot_message(consensus, slot):
+    faulty = consensus.quorum.get('n3')
+    message = Message.new('faulty', node=faulty.name)
+
+    return BallotMessage(faulty, State.init, message, BallotVoteResult.agree, slot=slot)
+
+
+def test_ballot_message_far_beyond_window():
+    simulation = new_simulation()
+    for blockchain in simulation.blockchains[:3]:
+        blockchain.consensus._handle_ballot_message(faulty_ballot_message(blockchain.consensus, 10 ** 9))
+
+    # the slot is held without the ballot, so the window does not move
+    for blockchain in simulation.blockchains[:3]:
+        consensus = blockchain.consensus
+        assert consensus.last_slot == 0
+        assert len(consensus.ballots) == 0
+        assert list(consensus.ahead.keys()) == [10 ** 9]
+
+    simulation.send(20)
+    result = simulation.run(until=60)
+    assert result['completed']
+
+    orders = list(map(lambda x: list(x.consensus.storage.message_ids), simulation.blockchains))
+    assert len(orders[0]) == 20
+    assert all(map(lambda x: x == orders[0], orders))
+
+
+def test_ballot_message_held_until_window():
+    simulation = new_simulation()
+    consensus = simulation.blockchains[0].consensus
+
+    ballot_message = faulty_ballot_message(consensus, 6)
+    consensus._handle_ballot_message(ballot_message)
+
+    assert 6 not in consensus.ballots
+    assert consensus.last_slot == 0
+    assert list(consensus.ahead.keys()) == [6]
+
+    # the window reaches the slot
+    consensus.committed_slot = 2
+    consensus.release()
+
+    assert len(consensus.ahead) == 0
+    assert consensus.ballots[6].message == ballot_message.message
+    assert consensus.last_slot == 6
+
+
+def test_ballot_messages_held_by_state():
+    simulation = new_simulation()
+    consensus = simulation.blockchains[0].consensus
+
+    ballot_message = faulty_ballot_message(consensus, 6)
+    consensus._handle_ballot_message(ballot_message)
+
+    # the later state of the same sender does not replace the message of `init`
+    signed = BallotMessage(
+        ballot_message.node,
+        State.sign,
+        ballot_message.message,
+        BallotVoteResult.agree,
+        slot=6,
+    )
+    consensus._handle_ballot_message(signed)
+
+    assert sorted(map(lambda x: x.state, consensus.ahead[6].values())) == [State.init, State.sign]
+
+    consensus.committed_slot = 2
+    consensus.release()
+
+    ballot = consensus.ballots[6]
+    assert ballot.message == ballot_message.message
+    assert ballot.is_voted(ballot_message.node, State.init)
+    assert ballot.is_voted(ballot_message.node, State.sign)
+
+
+def run_lossy(seed, **options):
+    simulation = Simulation(
+        nodes=7,
+        threshold=70,
+        latency=get_latency('lognormal', 0.05, 0.02),
+        seed=seed,
+        **options
+    )
+    simulation.send(200, proposers=7)
+    result = simulation.run(until=600)
+    orders = list(map(lambda x: list(x.consensus.storage.message_ids), simulation.blockchains))
+    simulation.stop()
+
+    return result, orders
+
+
+def test_lossy_aggregate_commits_every_message():
+    for seed in (3, 5, 6):
+        result, orders = run_lossy(seed, loss=0.01, aggregate=True)
+
+        assert result['completed']
+        assert len(orders[0]) == 200
+        assert all(map(lambda x: x == orders[0], orders))
+
+
+def test_lossy_binary_commits_every_message():
+    for seed in (0, 1, 8):
+        result, orders = run_lossy(seed, loss=0.05, codec='binary')
+
+        assert result['completed']
+        assert len(orders[0]) == 200
+        assert all(map(lambda x: x == orders[0], orders))